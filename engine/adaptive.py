@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+
+from .cancel import is_cancelled, cancelled_result
+
+
+# ─────────────────────────────────────────────────────────────
+#  SYSTEM SAMPLING
+# ─────────────────────────────────────────────────────────────
+def _read_proc_stat():
+    """
+    Returns (busy, total) jiffies from /proc/stat, or None (non-Linux).
+    """
+    try:
+        with open("/proc/stat", "r", encoding="ascii") as f:
+            fields = [int(x) for x in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)   # idle + iowait
+    total = sum(fields[:8])
+    return total - idle, total
+
+
+def run_queue_length():
+    """
+    Number of runnable tasks (Linux /proc/loadavg), else the 1-min load average.
+    None if neither is available (Windows).
+    """
+    try:
+        with open("/proc/loadavg", "r", encoding="ascii") as f:
+            running = f.read().split()[3].split("/")[0]
+        # minus this reading process
+        return max(0, int(running) - 1)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+class CpuSampler:
+    """
+    CPU utilization (0.0–1.0) since the previous sample.
+    """
+
+    def __init__(self):
+        self._last = _read_proc_stat()
+
+    def sample(self):
+        now = _read_proc_stat()
+        last, self._last = self._last, now
+        if now is None or last is None or now[1] == last[1]:
+            return None
+        return (now[0] - last[0]) / (now[1] - last[1])
+
+
+# ─────────────────────────────────────────────────────────────
+#  CONTROLLERS
+# ─────────────────────────────────────────────────────────────
+class FixedConcurrency:
+    """
+    Constant number of jobs; encoder threading left to ffmpeg.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = max(1, int(jobs))
+
+    def threads_per_job(self):
+        return None
+
+    def report_fps(self, job_key, fps):
+        pass
+
+    def job_finished(self, job_key):
+        pass
+
+    def tick(self):
+        pass
+
+
+class AdaptiveController:
+    """
+    Adjusts concurrent ffmpeg jobs and threads per job to maximise the
+    total encode fps of a batch.
+
+    Every `interval` seconds it samples CPU utilization, run-queue length
+    and the summed fps of running jobs (from ffmpeg progress lines):
+      - CPU not saturated and run queue short  → one more job
+      - run queue long (oversubscribed), or the last added job made the
+        total fps drop                          → one job less
+    Threads per job = cores // jobs, so few heavy encodes get many threads
+    and many light (I/O bound) encodes get few.
+    """
+
+    def __init__(self, min_jobs=1, max_jobs=None, interval=3.0,
+                 cpu_target=0.90, log=None):
+        self.cores = os.cpu_count() or 1
+        self.min_jobs = max(1, min_jobs)
+        # I/O-bound encodes may profit from more jobs than cores
+        self.max_jobs = max(self.min_jobs, max_jobs or self.cores * 2)
+        self.interval = interval
+        self.cpu_target = cpu_target
+        self.log = log
+
+        self.jobs = self.min_jobs
+        self._fps = {}
+        self._lock = threading.Lock()
+        self._cpu = CpuSampler()
+        self._last_tick = time.monotonic()
+        self._last_total = None
+        self._last_change = 0      # +1 / -1 / 0: direction of the previous step
+
+    def _log(self, msg):
+        if self.log:
+            self.log(msg)
+
+    def threads_per_job(self):
+        return max(1, self.cores // self.jobs)
+
+    def report_fps(self, job_key, fps):
+        if fps is None:
+            return
+        with self._lock:
+            self._fps[job_key] = fps
+
+    def job_finished(self, job_key):
+        with self._lock:
+            self._fps.pop(job_key, None)
+
+    def total_fps(self):
+        with self._lock:
+            return sum(self._fps.values())
+
+    def tick(self):
+        """
+        Called by the batch runner; re-evaluates at most every `interval` s.
+        """
+        now = time.monotonic()
+        if now - self._last_tick < self.interval:
+            return
+        self._last_tick = now
+
+        cpu = self._cpu.sample()
+        runq = run_queue_length()
+        total = self.total_fps()
+        old = self.jobs
+
+        oversubscribed = runq is not None and runq > self.cores * 1.5
+        regressed = (
+            self._last_change > 0 and self._last_total is not None
+            and total < self._last_total * 0.97
+        )
+        idle_cpu = cpu is not None and cpu < self.cpu_target
+        short_queue = runq is None or runq < self.cores
+
+        if (oversubscribed or regressed) and self.jobs > self.min_jobs:
+            self.jobs -= 1
+            self._last_change = -1
+        elif idle_cpu and short_queue and self.jobs < self.max_jobs and not regressed:
+            self.jobs += 1
+            self._last_change = +1
+        else:
+            self._last_change = 0
+
+        self._last_total = total
+
+        if self.jobs != old:
+            cpu_txt = f"{cpu:.0%}" if cpu is not None else "n/a"
+            self._log(f"[ADAPT] cpu={cpu_txt} runq={runq} fps={total:.1f} → "
+                      f"jobs {old}→{self.jobs}, threads/job {self.threads_per_job()}")
+
+
+def make_controller(concurrency, log=None):
+    """
+    concurrency: None/1 → sequential, int → fixed, "auto" → adaptive.
+    """
+    if concurrency == "auto":
+        return AdaptiveController(log=log)
+    return FixedConcurrency(concurrency or 1)
+
+
+# ─────────────────────────────────────────────────────────────
+#  BATCH RUNNER
+# ─────────────────────────────────────────────────────────────
+def run_batch(items, job_func, controller, cancel=None):
+    """
+    Runs job_func(item, threads, progress) for every item, keeping
+    `controller.jobs` of them running at once. progress(stats) forwards
+    ffmpeg stats to the controller. Results keep input order.
+    """
+    results = [None] * len(items)
+    pending = list(enumerate(items))
+    running = {}
+    cond = threading.Condition()
+
+    def _worker(idx, item):
+        def _progress(stats):
+            controller.report_fps(idx, stats.get("fps"))
+
+        try:
+            res = job_func(item, controller.threads_per_job(), _progress)
+        except Exception as e:
+            res = {"ok": False, "error": f"Job error: {e}", "data": None}
+        finally:
+            controller.job_finished(idx)
+
+        with cond:
+            results[idx] = res
+            running.pop(idx, None)
+            cond.notify()
+
+    with cond:
+        while pending or running:
+            while pending and len(running) < controller.jobs:
+                idx, item = pending.pop(0)
+                if is_cancelled(cancel):
+                    results[idx] = cancelled_result()
+                    continue
+                t = threading.Thread(target=_worker, args=(idx, item), daemon=True)
+                running[idx] = t
+                t.start()
+
+            if pending or running:
+                cond.wait(timeout=0.5)
+            controller.tick()
+
+    return results
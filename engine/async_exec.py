@@ -0,0 +1,199 @@
+import asyncio
+import os
+import shlex
+import time
+
+from .progress import parse_stats_line
+from .events import emit, PROGRESS_EVERY_SEC
+from . import cancel as cancel_mod
+
+
+# ─────────────────────────────────────────────────────────────
+#  STREAM READER
+# ─────────────────────────────────────────────────────────────
+async def _iter_lines(stream):
+    """
+    Yields decoded lines from a subprocess stream.
+    Splits on '\\r' as well as '\\n' so ffmpeg stats updates arrive live.
+    """
+    buf = b""
+    while True:
+        chunk = await stream.read(4096)
+        if not chunk:
+            break
+
+        buf += chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace").rstrip()
+
+    if buf:
+        yield buf.decode("utf-8", errors="replace").rstrip()
+
+
+async def _kill(process):
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+
+# ─────────────────────────────────────────────────────────────
+#  RUN COMMAND (async)
+# ─────────────────────────────────────────────────────────────
+async def run_command_async(cmd_list, desc="", log_callback=None,
+                            progress_callback=None, timeout=None, cancel=None):
+    """
+    Async equivalent of run_command: same universal result format.
+    - stdout/stderr are streamed without blocking the event loop
+    - progress_callback(stats_dict) receives every parsed ffmpeg stats line
+    - timeout (seconds) → the process is killed and ok=False is returned
+    - task cancellation kills the ffmpeg process, then re-raises
+    - cancel: optional CancelToken (same semantics as run_command)
+    """
+
+    def _log(msg):
+        if log_callback:
+            log_callback(msg)
+
+    cmd_str = " ".join(shlex.quote(part) for part in cmd_list)
+
+    # ─ Info log
+    if desc:
+        _log(f"[INFO] {desc}")
+    _log(f"[CMD]  {cmd_str}")
+
+    start_time = time.perf_counter()
+    stdout_lines = []
+    next_snapshot = [start_time + PROGRESS_EVERY_SEC]
+
+    def _result(ok, error, returncode, **flags):
+        elapsed = time.perf_counter() - start_time
+        emit("cmd_end", desc=desc, ok=ok, error=error, returncode=returncode,
+             elapsed_sec=round(elapsed, 3), **flags)
+        return {
+            "ok": ok,
+            "error": error,
+            "data": {
+                "command": cmd_str,
+                "elapsed_sec": round(elapsed, 6),
+                "returncode": returncode,
+                "stdout_lines": stdout_lines,
+                **flags,
+            }
+        }
+
+    if cancel_mod.is_cancelled(cancel):
+        return _result(False, "Cancelled", None, cancelled=True)
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd_list,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+    except Exception as e:
+        msg = f"Error while running command: {e}"
+        _log(f"[ERROR] {msg}")
+        return _result(False, msg, -1)
+
+    cancel_mod.track(process)
+    if cancel is not None:
+        cancel.register(process)
+    emit("cmd_start", desc=desc, command=cmd_str)
+
+    async def _pump():
+        async for line in _iter_lines(process.stdout):
+            stdout_lines.append(line)
+            _log(f"[FFMPEG] {line}")
+
+            if progress_callback:
+                stats = parse_stats_line(line)
+                if stats:
+                    progress_callback(stats)
+
+            # throttled progress snapshot for the event log
+            if line.startswith("frame=") and time.perf_counter() >= next_snapshot[0]:
+                next_snapshot[0] = time.perf_counter() + PROGRESS_EVERY_SEC
+                stats = parse_stats_line(line)
+                if stats:
+                    emit("progress", desc=desc, ffmpeg_pid=process.pid, **stats)
+
+        return await process.wait()
+
+    try:
+        returncode = await asyncio.wait_for(_pump(), timeout)
+
+    except asyncio.TimeoutError:
+        await _kill(process)
+        msg = f"Timed out after {timeout} seconds"
+        _log(f"[ERROR] {msg}")
+        return _result(False, msg, process.returncode, timed_out=True)
+
+    except asyncio.CancelledError:
+        await _kill(process)
+        _log("[INFO] Cancelled")
+        emit("cmd_end", desc=desc, ok=False, error="Cancelled", returncode=process.returncode,
+             elapsed_sec=round(time.perf_counter() - start_time, 3), cancelled=True)
+        raise
+
+    finally:
+        cancel_mod.untrack(process)
+        if cancel is not None:
+            cancel.unregister(process)
+
+    if returncode != 0 and cancel_mod.is_cancelled(cancel):
+        _log("[INFO] Cancelled")
+        return _result(False, "Cancelled", returncode, cancelled=True)
+
+    # ─ Finished
+    elapsed = time.perf_counter() - start_time
+    _log(f"[INFO] Finished in {round(elapsed, 3)} seconds")
+
+    return _result(
+        returncode == 0,
+        None if returncode == 0 else "Command returned returncode != 0",
+        returncode
+    )
+
+
+# ─────────────────────────────────────────────────────────────
+#  EXECUTOR
+# ─────────────────────────────────────────────────────────────
+class AsyncExecutor:
+    """
+    Runs ffmpeg jobs on one event loop with a concurrency limit.
+    Jobs beyond max_jobs wait on a semaphore (no thread per job).
+    """
+
+    def __init__(self, max_jobs=None, timeout=None):
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self._sem = None
+
+    def _semaphore(self):
+        # created lazily so it binds to the running loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_jobs)
+        return self._sem
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """
+        Runs a blocking engine call (e.g. a cached first pass) in a thread,
+        holding one executor slot like any other ffmpeg job.
+        """
+        async with self._semaphore():
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def run(self, cmd_list, desc="", log_callback=None,
+                  progress_callback=None, timeout=None, cancel=None):
+        async with self._semaphore():
+            return await run_command_async(
+                cmd_list, desc,
+                log_callback=log_callback,
+                progress_callback=progress_callback,
+                timeout=timeout if timeout is not None else self.timeout,
+                cancel=cancel,
+            )
@@ -0,0 +1,312 @@
+"""
+Closed-loop recipe selection: for every input a short proxy test runs
+against a candidate set, the smallest (or fastest) recipe meeting the
+quality / size constraints is picked and applied to the full file.
+Each decision is appended to <output_dir>/autoselect_log.jsonl.
+
+  python -m engine.autoselect a.mp4 b.mp4 --candidates x264-low,x264-medium,x265-balanced \\
+      --min-ssim 0.97 --objective size --outdir out
+"""
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from .events import emit, logged_job
+from .mediainfo import media_info
+from .pipeline import preflight, proxy_and_test, apply_file
+from .summary_csv import SUMMARY_HEADER, encoded_size, source_size
+from .utils import parse_list
+from .cancel import is_cancelled
+
+
+DECISION_LOG = "autoselect_log.jsonl"
+
+OBJECTIVES = ("size", "speed")
+
+DEFAULT_CLIPS = 3
+DEFAULT_CLIP_LEN = 5
+
+
+# ─────────────────────────────────────────────────────────────
+#  DECISION
+# ─────────────────────────────────────────────────────────────
+def recipe_stats(rows):
+    """
+    summary rows (SUMMARY_HEADER lists) → {recipe_id: stats}
+    stats: clips, psnr/ssim mean and worst clip, bitrate_kbps (mean),
+    ratio (encoded / proxy size), fps (frames / encode time).
+    """
+    by_recipe = {}
+    for row in rows:
+        d = dict(zip(SUMMARY_HEADER, row))
+        by_recipe.setdefault(d["recipe_id"], []).append(d)
+
+    def _mean(values):
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else None
+
+    stats = {}
+    for rid, clips in by_recipe.items():
+        psnr = [c["psnr"] for c in clips if c["psnr"] is not None]
+        ssim = [c["ssim"] for c in clips if c["ssim"] is not None]
+        size = sum(encoded_size(c) or 0 for c in clips)
+        orig = sum(source_size(c) or 0 for c in clips)
+        secs = sum(c["encode_time"] or 0 for c in clips)
+        frames = sum(c.get("frames") or 0 for c in clips)
+        stats[rid] = {
+            "clips": len(clips),
+            "psnr": _mean(psnr),
+            "psnr_min": min(psnr) if psnr else None,
+            "ssim": _mean(ssim),
+            "ssim_min": min(ssim) if ssim else None,
+            "bitrate_kbps": _mean([
+                encoded_size(c) * 8 / c["proxy_duration"] / 1000
+                for c in clips if encoded_size(c) and c["proxy_duration"]
+            ]),
+            "ratio": size / orig if orig else None,
+            "fps": frames / secs if frames and secs else None,
+            "encode_sec": secs,
+        }
+    return stats
+
+
+def _violations(s, constraints, worst_clip):
+    """
+    Constraint failures of one recipe's stats (empty list → passes).
+    worst_clip: quality limits apply to every clip, not the mean.
+    """
+    out = []
+    psnr = s["psnr_min"] if worst_clip else s["psnr"]
+    ssim = s["ssim_min"] if worst_clip else s["ssim"]
+
+    if constraints.get("min_psnr") is not None and (psnr is None or psnr < constraints["min_psnr"]):
+        out.append(f"PSNR {psnr} < {constraints['min_psnr']}")
+    if constraints.get("min_ssim") is not None and (ssim is None or ssim < constraints["min_ssim"]):
+        out.append(f"SSIM {ssim} < {constraints['min_ssim']}")
+    if constraints.get("max_kbps") is not None and \
+            (s["bitrate_kbps"] is None or s["bitrate_kbps"] > constraints["max_kbps"]):
+        out.append(f"bitrate {s['bitrate_kbps']} kbps > {constraints['max_kbps']}")
+    if constraints.get("max_ratio") is not None and \
+            (s["ratio"] is None or s["ratio"] > constraints["max_ratio"]):
+        out.append(f"size ratio {s['ratio']} > {constraints['max_ratio']}")
+    return out
+
+
+def choose_recipe(stats, constraints, objective="size", worst_clip=False):
+    """
+    Picks the passing recipe with the smallest bitrate (objective "size")
+    or highest fps ("speed"); the other value breaks ties.
+    Return: {"recipe_id" (None when nothing passes), "reason", "candidates": [...]}
+    """
+    candidates = []
+    for rid, s in stats.items():
+        v = _violations(s, constraints, worst_clip)
+        candidates.append({"recipe_id": rid, "passed": not v, "violations": v, **s})
+
+    passed = [c for c in candidates if c["passed"]]
+    if not passed:
+        return {"recipe_id": None, "reason": "No candidate meets the constraints.",
+                "candidates": candidates}
+
+    inf = float("inf")
+    if objective == "speed":
+        best = min(passed, key=lambda c: (-(c["fps"] or 0), c["bitrate_kbps"] or inf))
+        reason = f"fastest passing recipe ({best['fps'] and round(best['fps'], 1)} fps)"
+    else:
+        best = min(passed, key=lambda c: (c["bitrate_kbps"] or inf, -(c["fps"] or 0)))
+        reason = f"smallest passing recipe ({best['bitrate_kbps'] and round(best['bitrate_kbps'])} kbps)"
+
+    return {"recipe_id": best["recipe_id"], "reason": reason, "candidates": candidates}
+
+
+def test_starts(duration, clips, clip_len):
+    """
+    clips start times spread evenly over the input (middle of each part).
+    """
+    if not duration or duration <= clip_len:
+        return [0]
+    span = duration - clip_len
+    return [round(span * (i + 0.5) / clips, 3) for i in range(clips)]
+
+
+def _write_decision(output_dir, entry):
+    try:
+        with open(Path(output_dir) / DECISION_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+
+# ─────────────────────────────────────────────────────────────
+#  TEST → APPLY
+# ─────────────────────────────────────────────────────────────
+def auto_apply_file(input_file, candidates, recipes, recipes_json, output_dir, constraints,
+                    objective="size", clips=DEFAULT_CLIPS, clip_len=DEFAULT_CLIP_LEN,
+                    worst_clip=False, fallback=None, keep_tests=False, log=None,
+                    cancel=None, timeout=None, concurrency=None):
+    """
+    One input: proxy test of the candidates, decision, full apply with
+    the chosen recipe (recipes already preflighted).
+    Return data: apply result data + "decision".
+    """
+    input_file = Path(input_file)
+    output_dir = Path(output_dir)
+    info = media_info(input_file)
+    if not info["ok"]:
+        return info
+
+    starts = test_starts(info["data"]["duration"], clips, clip_len)
+    test_dir = output_dir / "_autoselect" / input_file.stem
+
+    if log:
+        log(f"[AUTO] {input_file.name}: testing {', '.join(candidates)} at {starts}")
+
+    test = proxy_and_test(input_file, ",".join(str(s) for s in starts), clip_len, recipes_json,
+                          pick=",".join(candidates), outdir=test_dir, log=log, cancel=cancel,
+                          timeout=timeout, concurrency=concurrency)
+    if not test["ok"]:
+        return test
+
+    stats = recipe_stats(test["data"]["summary_rows"])
+    decision = choose_recipe(stats, constraints, objective, worst_clip)
+    chosen = decision["recipe_id"]
+    if chosen is None and fallback:
+        chosen = fallback
+        decision["reason"] += f" Using fallback '{fallback}'."
+
+    entry = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "input": str(input_file),
+        "starts": starts,
+        "clip_len": clip_len,
+        "objective": objective,
+        "constraints": constraints,
+        "worst_clip": worst_clip,
+        "chosen": chosen,
+        **decision,
+    }
+    entry.pop("recipe_id")
+
+    if not keep_tests:
+        shutil.rmtree(test_dir, ignore_errors=True)
+        try:
+            test_dir.parent.rmdir()  # only when no other test is left
+        except OSError:
+            pass
+
+    if log:
+        for c in decision["candidates"]:
+            state = "ok" if c["passed"] else "; ".join(c["violations"])
+            log(f"[AUTO]   {c['recipe_id']}: {c['bitrate_kbps'] and round(c['bitrate_kbps'])} kbps, "
+                f"PSNR {c['psnr'] and round(c['psnr'], 2)}, SSIM {c['ssim'] and round(c['ssim'], 4)}, "
+                f"{c['fps'] and round(c['fps'], 1)} fps → {state}")
+        log(f"[AUTO] {input_file.name}: {chosen or 'nothing'} — {decision['reason']}")
+
+    if chosen is None:
+        entry["output"] = None
+        _write_decision(output_dir, entry)
+        emit("autoselect", input=str(input_file), chosen=None, reason=decision["reason"])
+        return {"ok": False, "error": f"{input_file.name}: {decision['reason']}",
+                "data": {"decision": entry}}
+
+    res = apply_file(input_file, chosen, recipes[chosen], output_dir, log=log,
+                     cancel=cancel, timeout=timeout)
+
+    entry["output"] = (res.get("data") or {}).get("output_file") if res["ok"] else None
+    entry["apply_ok"] = res["ok"]
+    entry["apply_error"] = res.get("error")
+    _write_decision(output_dir, entry)
+    emit("autoselect", input=str(input_file), chosen=chosen, reason=decision["reason"],
+         apply_ok=res["ok"])
+
+    if not res["ok"]:
+        return {"ok": False, "error": res["error"], "data": {"decision": entry}}
+    return {"ok": True, "error": None, "data": {**res["data"], "decision": entry}}
+
+
+@logged_job("auto_apply")
+def auto_apply(input_files, candidates, recipes_json, output_dir, constraints=None,
+               objective="size", clips=DEFAULT_CLIPS, clip_len=DEFAULT_CLIP_LEN,
+               worst_clip=False, fallback=None, keep_tests=False, log=None, cancel=None,
+               timeout=None, concurrency=None):
+    """
+    auto_apply_file for every input (one after another; each test already
+    runs its encodes in parallel).
+    candidates: "a,b,c" or list. constraints: {"min_psnr", "min_ssim",
+    "max_kbps", "max_ratio"} (None values are ignored).
+    Return data: one result per input (input order).
+    """
+    if objective not in OBJECTIVES:
+        return {"ok": False, "error": f"Unknown objective: {objective}", "data": None}
+
+    candidates = parse_list(candidates) if isinstance(candidates, str) else list(candidates or [])
+    if not candidates:
+        return {"ok": False, "error": "No candidate recipes given.", "data": None}
+
+    pf = preflight(recipes_json, candidates + ([fallback] if fallback else []))
+    if not pf["ok"]:
+        return pf
+    _, recipes = pf["data"]
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    constraints = {k: v for k, v in (constraints or {}).items() if v is not None}
+
+    results = []
+    for infile in input_files:
+        if is_cancelled(cancel):
+            results.append({"ok": False, "error": "Cancelled", "data": None})
+            continue
+        results.append(auto_apply_file(
+            infile, candidates, recipes, recipes_json, output_dir, constraints, objective,
+            clips, clip_len, worst_clip, fallback, keep_tests, log, cancel, timeout, concurrency
+        ))
+
+    all_ok = all(r["ok"] for r in results)
+    if is_cancelled(cancel):
+        return {"ok": False, "error": "Cancelled", "data": results}
+    return {
+        "ok": all_ok,
+        "error": None if all_ok else "One or more files failed.",
+        "data": results,
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.autoselect")
+    ap.add_argument("inputs", nargs="+")
+    ap.add_argument("--candidates", required=True, help="recipe IDs to test")
+    ap.add_argument("--recipes", default="recipes.json")
+    ap.add_argument("--outdir", default="output")
+    ap.add_argument("--objective", choices=OBJECTIVES, default="size")
+    ap.add_argument("--min-psnr", type=float)
+    ap.add_argument("--min-ssim", type=float)
+    ap.add_argument("--max-kbps", type=float, help="max mean bitrate of the test clips")
+    ap.add_argument("--max-ratio", type=float, help="max encoded/proxy size ratio")
+    ap.add_argument("--worst-clip", action="store_true",
+                    help="quality limits must hold for every clip, not the mean")
+    ap.add_argument("--clips", type=int, default=DEFAULT_CLIPS)
+    ap.add_argument("--clip-len", type=float, default=DEFAULT_CLIP_LEN)
+    ap.add_argument("--fallback", help="recipe used when no candidate passes")
+    ap.add_argument("--keep-tests", action="store_true")
+    ap.add_argument("--timeout", type=float)
+    args = ap.parse_args(argv)
+
+    constraints = {"min_psnr": args.min_psnr, "min_ssim": args.min_ssim,
+                   "max_kbps": args.max_kbps, "max_ratio": args.max_ratio}
+    res = auto_apply(args.inputs, args.candidates, args.recipes, args.outdir, constraints,
+                     objective=args.objective, clips=args.clips, clip_len=args.clip_len,
+                     worst_clip=args.worst_clip, fallback=args.fallback,
+                     keep_tests=args.keep_tests, log=print, timeout=args.timeout)
+    print("OK" if res["ok"] else f"ERROR: {res['error']}")
+    print(f"Decisions: {Path(args.outdir) / DECISION_LOG}")
+    return 0 if res["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
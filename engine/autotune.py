@@ -0,0 +1,289 @@
+"""
+Threading auto-tune: benchmarks each recipe on a short clip over a grid
+of encoder threading settings and saves the fastest per host.
+
+  python -m engine.autotune --input clip.mp4 [--pick x265-hq,vp9-hq] [--bitexact-only]
+  python -m engine.autotune --show
+
+encode_single / encode_multi / fan-out pick the saved settings up
+automatically (engine.tuning); FFSANDBOX_NO_TUNING=1 disables that.
+Every candidate's video stream hash is compared with the untuned encode:
+settings that change the output are stored with "bitexact": false.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .encode import recipe_args, select_recipes
+from .mediainfo import media_info
+from .pipeline import preflight
+from .progress import last_stats, parse_benchmark
+from .proxy import proxy_single
+from .run_command import run_command
+from .cancel import is_cancelled
+from .tuning import apply_settings, save_profile, load_profiles, host_key, PROFILE_FILE
+
+
+# candidates within this fps margin of the best count as equally fast;
+# among them the most CPU-efficient wins
+FPS_MARGIN = 0.03
+
+_HASH_RE = re.compile(r"^\d+,v,MD5=([0-9a-fA-F]+)")
+
+
+# ─────────────────────────────────────────────────────────────
+#  GRID
+# ─────────────────────────────────────────────────────────────
+def _thread_steps(cores):
+    return sorted({max(1, cores // 4), max(1, cores // 2), cores})
+
+
+def candidate_grid(codec, cores, width=None):
+    """
+    Threading settings to try. The first entry ({}) is the untuned
+    baseline every candidate is compared with.
+    """
+    steps = _thread_steps(cores)
+    grid = [{}]
+
+    if codec == "libx265":
+        # pools = WPP worker threads, frame-threads = frames encoded in parallel
+        grid += [{"x265-params": f"pools={p}:frame-threads={ft}"}
+                 for p in steps for ft in (1, 2, 4) if ft <= cores]
+    elif codec == "libvpx-vp9":
+        # tile columns (log2) need >= 256 px per tile
+        max_tiles = int(math.log2(max(1, (width or 1920) // 256))) if (width or 1920) >= 256 else 0
+        grid += [{"row-mt": 1, "tile-columns": tc, "threads": t}
+                 for tc in range(min(max_tiles, 4) + 1) for t in steps]
+    else:
+        grid += [{"threads": t} for t in steps]
+
+    return grid
+
+
+def _settings_label(settings):
+    return " ".join(f"{k}={v}" for k, v in settings.items()) or "default"
+
+
+# ─────────────────────────────────────────────────────────────
+#  BENCHMARK
+# ─────────────────────────────────────────────────────────────
+def stream_hash(path, log=None):
+    """
+    MD5 of the decoded-order video packets (container metadata ignored).
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-i", str(path), "-map", "0:v", "-c", "copy",
+           "-f", "streamhash", "-hash", "md5", "-"]
+    res = run_command(cmd, log_callback=log)
+    for line in (res.get("data") or {}).get("stdout_lines", []):
+        m = _HASH_RE.match(line.strip())
+        if m:
+            return m.group(1).lower()
+    return None
+
+
+def bench_candidate(proxy_file, recipe, settings, output_file, log=None,
+                    cancel=None, timeout=None):
+    """
+    One video-only encode with -benchmark.
+    Return data: {"settings", "fps", "cpu_sec", "cpu_efficiency", "maxrss_kb", "hash"}
+    """
+    argv = apply_settings(recipe_args(recipe), settings)
+    cmd = ["ffmpeg", "-y", "-benchmark", "-i", str(proxy_file), *argv, "-an", str(output_file)]
+
+    res = run_command(cmd, f"Autotune: {_settings_label(settings)}", log_callback=log,
+                      cancel=cancel, timeout=timeout)
+    if not res["ok"]:
+        return res
+
+    lines = res["data"]["stdout_lines"]
+    stats = last_stats(lines)
+    bench = parse_benchmark(lines) or {}
+    frames = stats["frame"] if stats else None
+    wall = bench.get("rtime") or res["data"]["elapsed_sec"]
+    cpu = (bench.get("utime") or 0.0) + (bench.get("stime") or 0.0) or None
+
+    return {
+        "ok": True,
+        "error": None,
+        "data": {
+            "settings": settings,
+            "fps": round(frames / wall, 3) if frames and wall else None,
+            "cpu_sec": cpu,
+            # frames per CPU-second: lower means threads spin/wait more
+            "cpu_efficiency": round(frames / cpu, 3) if frames and cpu else None,
+            "maxrss_kb": bench.get("maxrss_kb"),
+            "hash": stream_hash(output_file),
+        }
+    }
+
+
+def pick_best(candidates, bitexact_only=False):
+    """
+    Fastest candidate; near-ties (FPS_MARGIN) go to the better CPU efficiency.
+    """
+    pool = [c for c in candidates if c["fps"]]
+    if bitexact_only:
+        pool = [c for c in pool if c["bitexact"]]
+    if not pool:
+        return None
+
+    best_fps = max(c["fps"] for c in pool)
+    close = [c for c in pool if c["fps"] >= best_fps * (1 - FPS_MARGIN)]
+    return max(close, key=lambda c: (c["cpu_efficiency"] or 0, c["fps"]))
+
+
+def autotune_recipe(proxy_file, recipe_id, recipe, workdir, repeat=1, bitexact_only=False,
+                    log=None, cancel=None, timeout=None):
+    """
+    Benchmarks the grid for one recipe. Return data: profile entry.
+    """
+    info = media_info(proxy_file, cache=False)
+    width = info["data"]["width"] if info["ok"] else None
+    cores = os.cpu_count() or 1
+
+    candidates = []
+    baseline_hash = None
+
+    for n, settings in enumerate(candidate_grid(recipe["codec"], cores, width)):
+        runs = []
+        for _ in range(max(1, repeat)):
+            if is_cancelled(cancel):
+                return {"ok": False, "error": "Cancelled", "data": None}
+            out = Path(workdir) / f"{recipe_id}_{n:02d}.mp4"
+            res = bench_candidate(proxy_file, recipe, settings, out, log, cancel, timeout)
+            out.unlink(missing_ok=True)
+            if not res["ok"]:
+                # an unsupported option on this build: skip the candidate
+                if log:
+                    log(f"[AUTOTUNE] {recipe_id}: {_settings_label(settings)} failed, skipped")
+                break
+            runs.append(res["data"])
+
+        if not runs:
+            if n == 0:
+                return {"ok": False, "error": f"Baseline encode of '{recipe_id}' failed.", "data": None}
+            continue
+
+        # median run by fps
+        runs.sort(key=lambda r: r["fps"] or 0)
+        c = runs[len(runs) // 2]
+        if n == 0:
+            baseline_hash = c["hash"]
+        c["bitexact"] = (c["hash"] == baseline_hash) if c["hash"] and baseline_hash else None
+        candidates.append(c)
+
+        if log:
+            log(f"[AUTOTUNE] {recipe_id}: {_settings_label(settings)} → {c['fps']} fps, "
+                f"{c['cpu_efficiency']} frames/cpu-s, bitexact={c['bitexact']}")
+
+    best = pick_best(candidates, bitexact_only) or candidates[0]
+    baseline = candidates[0]
+
+    entry = {
+        "recipe_id": recipe_id,
+        "codec": recipe["codec"],
+        "settings": best["settings"],
+        "fps": best["fps"],
+        "baseline_fps": baseline["fps"],
+        "speedup": round(best["fps"] / baseline["fps"], 3) if best["fps"] and baseline["fps"] else None,
+        "cpu_efficiency": best["cpu_efficiency"],
+        "bitexact": best["bitexact"],
+        "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "candidates": [{k: c[k] for k in ("settings", "fps", "cpu_efficiency", "bitexact")}
+                       for c in candidates],
+    }
+
+    if log:
+        flag = "" if best["bitexact"] else "  (NOT bit-exact with the untuned encode)"
+        log(f"[AUTOTUNE] {recipe_id}: best {_settings_label(best['settings'])}, "
+            f"{entry['speedup']}x{flag}")
+
+    return {"ok": True, "error": None, "data": entry}
+
+
+def autotune(input_file, recipes_json, pick=None, start=0, clip_len=5, repeat=1,
+             bitexact_only=False, log=None, cancel=None, timeout=None):
+    """
+    Cuts one proxy from input_file, tunes every selected recipe on it and
+    saves the results as this host's profile.
+    Return data: {recipe_id: entry}
+    """
+    pf = preflight(recipes_json)
+    if not pf["ok"]:
+        return pf
+    caps, recipes = pf["data"]
+
+    picked = select_recipes(recipes, pick)
+    if not picked["ok"]:
+        return picked
+
+    workdir = Path(tempfile.mkdtemp(prefix="ffsandbox-autotune-"))
+    try:
+        proxy = workdir / "proxy.mp4"
+        pres = proxy_single(input_file, start, clip_len, proxy, log=log, cancel=cancel,
+                            timeout=timeout)
+        if not pres["ok"]:
+            return pres
+
+        entries = {}
+        results = {}
+        for rid, recipe in picked["data"].items():
+            res = autotune_recipe(proxy, rid, recipe, workdir, repeat, bitexact_only,
+                                  log, cancel, timeout)
+            if not res["ok"]:
+                return res
+            res["data"]["ffmpeg"] = caps.get("version")
+            entries[recipe.recipe_hash] = res["data"]
+            results[rid] = res["data"]
+
+        try:
+            save_profile(entries)
+        except OSError as e:
+            return {"ok": False, "error": f"Cannot save profile: {e}", "data": results}
+
+        return {"ok": True, "error": None, "data": results}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.autotune")
+    ap.add_argument("--input", help="source video (a clip is cut from it)")
+    ap.add_argument("--recipes", default="recipes.json")
+    ap.add_argument("--pick", help="recipe IDs (default: all)")
+    ap.add_argument("--start", default="0", help="clip start (seconds)")
+    ap.add_argument("--duration", default="5", help="clip length (seconds)")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per candidate (median)")
+    ap.add_argument("--bitexact-only", action="store_true",
+                    help="only accept settings that leave the output unchanged")
+    ap.add_argument("--show", action="store_true", help="print this host's profile")
+    args = ap.parse_args(argv)
+
+    if args.show:
+        print(f"{PROFILE_FILE} [{host_key()}]")
+        print(json.dumps(load_profiles().get(host_key(), {}), indent=2))
+        return 0
+
+    if not args.input:
+        ap.error("--input is required")
+
+    res = autotune(args.input, args.recipes, pick=args.pick, start=args.start,
+                   clip_len=args.duration, repeat=args.repeat,
+                   bitexact_only=args.bitexact_only, log=print)
+    print("OK" if res["ok"] else f"ERROR: {res['error']}")
+    return 0 if res["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
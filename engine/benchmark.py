@@ -0,0 +1,382 @@
+"""
+Pipeline benchmark on synthetic sources (no test media needed, runs offline).
+
+  python -m engine.benchmark --out bench.json
+  python -m engine.benchmark --baseline bench_base.json --save-baseline
+  python -m engine.benchmark --baseline bench_base.json --threshold 0.10
+
+Inputs are generated once with lavfi sources (testsrc2, mandelbrot, noise)
+and cached. Every scenario (proxy, encode, metrics, full proxy_and_test)
+runs in a fresh worker process so its CPU time and peak RSS come from
+that process's children only. Exit code 1 when a scenario regressed
+against the baseline by more than --threshold.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .capabilities import CACHE_DIR
+from .run_command import run_command
+
+
+# Generated sources (reused while the spec is unchanged)
+BENCH_DIR = CACHE_DIR / "bench"
+
+CASES = [
+    {"name": "testsrc2-360p-gop25", "source": "testsrc2", "size": "640x360",
+     "rate": 25, "gop": 25, "duration": 20},
+    {"name": "testsrc2-720p-gop250", "source": "testsrc2", "size": "1280x720",
+     "rate": 25, "gop": 250, "duration": 30},
+    {"name": "mandelbrot-540p-gop50", "source": "mandelbrot", "size": "960x540",
+     "rate": 25, "gop": 50, "duration": 20},
+    {"name": "noise-360p-gop12", "source": "noise", "size": "640x360",
+     "rate": 25, "gop": 12, "duration": 10},
+]
+
+SCENARIOS = ("proxy", "encode", "metrics", "full")
+
+CLIP_LEN = 4
+DEFAULT_RECIPE = "x264-medium"
+DEFAULT_THRESHOLD = 0.10
+
+# compared against the baseline (lower is better)
+COMPARED = ("wall_sec", "cpu_sec", "peak_rss_kb")
+
+
+# ─────────────────────────────────────────────────────────────
+#  SOURCES
+# ─────────────────────────────────────────────────────────────
+def lavfi_graph(case):
+    size, rate = case["size"], case["rate"]
+    if case["source"] == "noise":
+        # fixed seed: same frames on every run
+        return f"color=c=gray:size={size}:rate={rate},noise=alls=60:allf=t+u:all_seed=1"
+    return f"{case['source']}=size={size}:rate={rate}"
+
+
+def source_path(case):
+    digest = hashlib.sha256(json.dumps(case, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return BENCH_DIR / f"{case['name']}-{digest}.mp4"
+
+
+def generate_source(case, log=None):
+    """
+    Renders a case to H.264 (single-threaded, bitexact flags: identical
+    file on every run). Reuses the cached file.
+    """
+    out = source_path(case)
+    if out.is_file():
+        return {"ok": True, "error": None, "data": str(out)}
+
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name("tmp-" + out.name)
+    cmd = [
+        "ffmpeg", "-y", "-f", "lavfi", "-i", lavfi_graph(case),
+        "-t", str(case["duration"]),
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-threads", "1",
+        "-g", str(case["gop"]), "-keyint_min", str(case["gop"]), "-sc_threshold", "0",
+        "-pix_fmt", "yuv420p", "-map_metadata", "-1",
+        "-fflags", "+bitexact", "-flags:v", "+bitexact",
+        str(tmp),
+    ]
+    res = run_command(cmd, f"Generate {case['name']}", log_callback=log)
+    if not res["ok"] or not tmp.is_file():
+        tmp.unlink(missing_ok=True)
+        return {"ok": False, "error": f"Cannot generate {case['name']}: {res['error']}", "data": None}
+
+    tmp.replace(out)
+    return {"ok": True, "error": None, "data": str(out)}
+
+
+# ─────────────────────────────────────────────────────────────
+#  WORKER (one scenario per process)
+# ─────────────────────────────────────────────────────────────
+def _scenario(params):
+    from .pipeline import preflight, proxy_and_test
+    from .proxy import proxy_single
+    from .encode import encode_single
+    from .metrics import calc_psnr, calc_ssim
+
+    name = params["scenario"]
+    work = Path(params["workdir"])
+
+    # untimed setup
+    recipe = None
+    if name == "encode":
+        pf = preflight(params["recipes"], [params["recipe"]])
+        if not pf["ok"]:
+            return lambda: pf
+        recipe = pf["data"][1][params["recipe"]]
+
+    if name == "proxy":
+        return lambda: proxy_single(params["source"], params["start"], CLIP_LEN,
+                                    work / "proxy_bench.mp4")
+    if name == "encode":
+        return lambda: encode_single(params["proxy"], params["recipe"], recipe,
+                                     work / "encode_bench.mp4")
+    if name == "metrics":
+        def _metrics():
+            psnr = calc_psnr(params["proxy"], params["encoded"])
+            ssim = calc_ssim(params["proxy"], params["encoded"])
+            ok = psnr is not None and ssim is not None
+            return {"ok": ok, "error": None if ok else "Metric failed", "data": None}
+        return _metrics
+    return lambda: proxy_and_test(params["source"], params["starts"], CLIP_LEN,
+                                  params["recipes"], pick=params["recipe"],
+                                  outdir=work / "full_bench")
+
+
+def _worker(params):
+    """
+    Runs one scenario and prints its measurements as JSON (last line).
+    CPU time and peak RSS are of the ffmpeg children (+ this process's CPU).
+    """
+    func = _scenario(params)
+
+    self0 = resource.getrusage(resource.RUSAGE_SELF)
+    child0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    t0 = time.perf_counter()
+    res = func()
+    wall = time.perf_counter() - t0
+    self1 = resource.getrusage(resource.RUSAGE_SELF)
+    child1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu = sum(getattr(b, f) - getattr(a, f)
+              for a, b in ((self0, self1), (child0, child1))
+              for f in ("ru_utime", "ru_stime"))
+
+    print(json.dumps({
+        "ok": res["ok"],
+        "error": res.get("error"),
+        "wall_sec": round(wall, 4),
+        "cpu_sec": round(cpu, 4),
+        # KiB on Linux; largest single ffmpeg process
+        "peak_rss_kb": child1.ru_maxrss,
+    }))
+    return 0 if res["ok"] else 1
+
+
+def run_scenario(params, tuned=False):
+    """
+    Spawns a worker process for one scenario. Return: measurement dict.
+    """
+    env = dict(os.environ)
+    root = str(Path(__file__).resolve().parent.parent)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (root, env.get("PYTHONPATH")) if p)
+    if not tuned:
+        env["FFSANDBOX_NO_TUNING"] = "1"
+
+    proc = subprocess.run([sys.executable, "-m", "engine.benchmark", "--worker", json.dumps(params)],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {"ok": False, "error": proc.stderr.strip()[-500:] or "Worker failed"}
+
+
+# ─────────────────────────────────────────────────────────────
+#  SUITE
+# ─────────────────────────────────────────────────────────────
+def _median_run(runs):
+    runs = sorted(runs, key=lambda r: r["wall_sec"])
+    return runs[len(runs) // 2]
+
+
+def run_suite(recipes_json="recipes.json", recipe=DEFAULT_RECIPE, cases=None, scenarios=None,
+              repeat=3, tuned=False, log=None):
+    """
+    Return data: {"host", "python", "ffmpeg", "recipe", "cases": {case: {scenario: {...}}}}
+    Each scenario entry: wall_sec, cpu_sec, peak_rss_kb (median run by wall
+    time), frames and fps (frames processed / wall time).
+    """
+    from .pipeline import preflight
+    from .proxy import proxy_single
+    from .encode import encode_single
+
+    pf = preflight(recipes_json, [recipe])
+    if not pf["ok"]:
+        return pf
+    caps, recipes = pf["data"]
+
+    selected = [c for c in CASES if not cases or c["name"] in cases]
+    if cases and len(selected) != len(cases):
+        known = [c["name"] for c in CASES]
+        return {"ok": False, "error": f"Unknown case(s): {sorted(set(cases) - set(known))}", "data": None}
+    scenarios = scenarios or SCENARIOS
+
+    result = {
+        "host": socket.gethostname(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "ffmpeg": caps.get("version"),
+        "recipe": recipe,
+        "repeat": repeat,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "cases": {},
+    }
+
+    for case in selected:
+        src = generate_source(case, log)
+        if not src["ok"]:
+            return src
+
+        work = Path(tempfile.mkdtemp(prefix="ffsandbox-bench-"))
+        try:
+            # inputs for the encode/metrics scenarios (not timed)
+            mid = case["duration"] / 2
+            proxy = work / "proxy.mp4"
+            encoded = work / "encoded.mp4"
+            res = proxy_single(src["data"], mid, CLIP_LEN, proxy, log=log)
+            if res["ok"]:
+                res = encode_single(proxy, recipe, recipes[recipe], encoded, log=log)
+            if not res["ok"]:
+                return {"ok": False, "error": f"{case['name']}: {res['error']}", "data": None}
+
+            clip_frames = case["rate"] * CLIP_LEN
+            starts = [0, mid]
+            frames = {"proxy": clip_frames, "encode": clip_frames, "metrics": clip_frames * 2,
+                      "full": clip_frames * len(starts)}
+
+            entry = {}
+            for name in scenarios:
+                params = {
+                    "scenario": name, "workdir": str(work), "source": src["data"],
+                    "proxy": str(proxy), "encoded": str(encoded), "start": mid,
+                    "starts": ",".join(str(s) for s in starts),
+                    "recipes": str(Path(recipes_json).resolve()), "recipe": recipe,
+                }
+                runs = []
+                for _ in range(max(1, repeat)):
+                    m = run_scenario(params, tuned)
+                    if not m["ok"]:
+                        return {"ok": False, "error": f"{case['name']}/{name}: {m['error']}", "data": None}
+                    runs.append(m)
+
+                m = _median_run(runs)
+                m.pop("ok")
+                m.pop("error")
+                m["frames"] = frames[name]
+                m["fps"] = round(frames[name] / m["wall_sec"], 2) if m["wall_sec"] else None
+                entry[name] = m
+
+                if log:
+                    log(f"[BENCH] {case['name']} {name}: {m['wall_sec']}s wall, "
+                        f"{m['cpu_sec']}s cpu, {m['peak_rss_kb']} KiB, {m['fps']} fps")
+
+            result["cases"][case["name"]] = entry
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+    return {"ok": True, "error": None, "data": result}
+
+
+def compare(result, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Scenarios slower / heavier than the baseline by more than threshold
+    (relative). Cases or scenarios missing from either side are ignored.
+    Return: list of {"case", "scenario", "metric", "baseline", "current", "change"}
+    """
+    regressions = []
+    for case, scen in result["cases"].items():
+        for name, cur in scen.items():
+            base = baseline.get("cases", {}).get(case, {}).get(name)
+            if not base:
+                continue
+            for metric in COMPARED:
+                b, c = base.get(metric), cur.get(metric)
+                if not b or c is None:
+                    continue
+                change = (c - b) / b
+                if change > threshold:
+                    regressions.append({"case": case, "scenario": name, "metric": metric,
+                                        "baseline": b, "current": c, "change": round(change, 4)})
+    return regressions
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.benchmark")
+    ap.add_argument("--recipes", default="recipes.json")
+    ap.add_argument("--recipe", default=DEFAULT_RECIPE, help="recipe used for encodes")
+    ap.add_argument("--cases", help="case names (default: all)")
+    ap.add_argument("--scenarios", help=f"subset of {','.join(SCENARIOS)}")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per scenario (median)")
+    ap.add_argument("--tuned", action="store_true", help="use saved autotune profiles")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--baseline", help="baseline JSON to compare with")
+    ap.add_argument("--save-baseline", action="store_true", help="write results as --baseline")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="allowed relative slowdown (0.10 = 10%%)")
+    ap.add_argument("--list", action="store_true", help="list cases")
+    ap.add_argument("--worker", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.worker:
+        return _worker(json.loads(args.worker))
+
+    if args.save_baseline and not args.baseline:
+        ap.error("--save-baseline needs --baseline")
+
+    if args.list:
+        for c in CASES:
+            print(f"{c['name']:24} {lavfi_graph(c)}  gop={c['gop']} {c['duration']}s")
+        return 0
+
+    scenarios = [s.strip() for s in args.scenarios.split(",")] if args.scenarios else None
+    bad = [s for s in scenarios or [] if s not in SCENARIOS]
+    if bad:
+        ap.error(f"unknown scenario(s): {bad}")
+
+    res = run_suite(args.recipes, args.recipe,
+                    cases=[c.strip() for c in args.cases.split(",")] if args.cases else None,
+                    scenarios=scenarios, repeat=args.repeat, tuned=args.tuned, log=print)
+    if not res["ok"]:
+        print(f"ERROR: {res['error']}")
+        return 1
+    result = res["data"]
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    elif not args.save_baseline:
+        print(text)
+
+    if args.baseline and args.save_baseline:
+        Path(args.baseline).write_text(text, encoding="utf-8")
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+
+    if args.baseline:
+        try:
+            baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"ERROR: cannot read baseline: {e}")
+            return 1
+        if (baseline.get("host"), baseline.get("ffmpeg")) != (result["host"], result["ffmpeg"]):
+            print(f"[WARN] Baseline is from {baseline.get('host')} / ffmpeg {baseline.get('ffmpeg')}")
+
+        regressions = compare(result, baseline, args.threshold)
+        for r in regressions:
+            print(f"[REGRESSION] {r['case']} {r['scenario']} {r['metric']}: "
+                  f"{r['baseline']} → {r['current']} (+{r['change']:.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions (threshold {args.threshold:.0%}).")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import atexit
+import threading
+import weakref
+from pathlib import Path
+
+
+# Grace period between terminate() and kill()
+TERMINATE_GRACE_SEC = 3.0
+
+# every ffmpeg process started by the engine and still running
+_LIVE = set()
+_LIVE_LOCK = threading.Lock()
+
+
+def _running(process):
+    # subprocess.Popen has poll(); asyncio processes only expose returncode
+    poll = getattr(process, "poll", None)
+    return (poll() if poll else process.returncode) is None
+
+
+def _stop(process, grace=TERMINATE_GRACE_SEC):
+    """
+    Terminates a process, escalating to kill() if it ignores the request.
+    Never blocks the caller for longer than a terminate() call.
+    """
+    if not _running(process):
+        return
+
+    try:
+        process.terminate()
+    except OSError:
+        return
+
+    def _escalate():
+        if _running(process):
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    t = threading.Timer(grace, _escalate)
+    t.daemon = True
+    t.start()
+
+
+# ─────────────────────────────────────────────────────────────
+#  LIVE PROCESS REGISTRY (no orphaned encoders)
+# ─────────────────────────────────────────────────────────────
+def track(process):
+    with _LIVE_LOCK:
+        _LIVE.add(process)
+
+
+def untrack(process):
+    with _LIVE_LOCK:
+        _LIVE.discard(process)
+
+
+def kill_all():
+    """
+    Kills every engine process still running (used on application exit).
+    """
+    with _LIVE_LOCK:
+        procs = list(_LIVE)
+        _LIVE.clear()
+
+    for p in procs:
+        if _running(p):
+            try:
+                p.kill()
+            except OSError:
+                pass
+
+
+atexit.register(kill_all)
+
+
+# ─────────────────────────────────────────────────────────────
+#  CANCEL TOKEN
+# ─────────────────────────────────────────────────────────────
+class CancelToken:
+    """
+    Shared between the caller (GUI) and a running job.
+    cancel() stops every registered ffmpeg process right away; loops in
+    the engine check `cancelled` before starting queued work.
+    cancel_after() sets a wall-clock deadline for everything using the token.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._procs = set()
+        self._children = weakref.WeakSet()
+        self.timed_out = False
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            procs = list(self._procs)
+            children = list(self._children)
+
+        for p in procs:
+            _stop(p)
+        for c in children:
+            c.cancel()
+
+    def child(self):
+        """
+        A token cancelled together with this one (but not the other way
+        round), e.g. one per file of a long-running watcher.
+        """
+        token = CancelToken()
+        with self._lock:
+            if not self._event.is_set():
+                self._children.add(token)
+                return token
+        token.cancel()
+        return token
+
+    def cancel_after(self, seconds):
+        """
+        Deadline: cancels the token after `seconds` and marks it timed_out.
+        Return: the started Timer (cancel() it once the work is done).
+        """
+        def _expire():
+            self.timed_out = True
+            self.cancel()
+
+        timer = threading.Timer(seconds, _expire)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def register(self, process):
+        """
+        Attaches a running process. If the token is already cancelled the
+        process is stopped immediately.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._procs.add(process)
+                return
+
+        _stop(process)
+
+    def unregister(self, process):
+        with self._lock:
+            self._procs.discard(process)
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+
+def is_cancelled(cancel):
+    return cancel is not None and cancel.cancelled
+
+
+def timed_out_result(seconds):
+    """
+    Universal result for work stopped by a cancel_after() deadline.
+    """
+    return {
+        "ok": False,
+        "error": f"Timed out after {seconds:g} seconds",
+        "data": {"timed_out": True}
+    }
+
+
+def cancelled_result(desc=""):
+    """
+    Universal result for work skipped or stopped by a cancel token.
+    """
+    return {
+        "ok": False,
+        "error": "Cancelled",
+        "data": {"cancelled": True, "desc": desc}
+    }
+
+
+def discard_partial(result, *paths):
+    """
+    Deletes half-written outputs of a job that was cancelled or timed out.
+    """
+    data = result.get("data") or {}
+    if not (data.get("cancelled") or data.get("timed_out")):
+        return
+
+    for path in paths:
+        try:
+            Path(path).unlink()
+        except OSError:
+            pass
@@ -0,0 +1,213 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+
+
+# Where probe results are cached between runs
+CACHE_DIR = Path(os.environ.get("FFSANDBOX_CACHE_DIR",
+                                Path.home() / ".cache" / "ffmpeg-proxy-sandbox"))
+CACHE_FILE = CACHE_DIR / "capabilities.json"
+
+# in-process memo: key → capabilities dict
+_MEMO = {}
+_LOCK = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────────
+#  PARSERS  (ffmpeg -version / -encoders / -filters / -pix_fmts)
+# ─────────────────────────────────────────────────────────────
+def _parse_version(text):
+    version = None
+    configuration = ""
+
+    for line in text.splitlines():
+        if line.startswith("ffmpeg version "):
+            version = line.split()[2]
+        elif line.startswith("configuration:"):
+            configuration = line.split(":", 1)[1].strip()
+
+    return version, configuration
+
+
+def _parse_encoders(text):
+    """
+    " V....D libx264   libx264 H.264 / AVC ..." → {"libx264": "video", ...}
+    """
+    kinds = {"V": "video", "A": "audio", "S": "subtitle"}
+    encoders = {}
+    started = False
+
+    for line in text.splitlines():
+        if line.strip().startswith("------"):
+            started = True
+            continue
+        if not started:
+            continue
+
+        parts = line.split()
+        if len(parts) >= 2 and parts[0][:1] in kinds:
+            encoders[parts[1]] = kinds[parts[0][0]]
+
+    return encoders
+
+
+def _parse_filters(text):
+    """
+    " ... psnr   VV->V   Calculate the PSNR ..." → ["psnr", ...]
+    """
+    filters = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 3 and "->" in parts[2]:
+            filters.append(parts[1])
+    return sorted(filters)
+
+
+def _parse_pix_fmts(text):
+    """
+    "IO... yuv420p   3   12   8-8-8" → ["yuv420p", ...]
+    """
+    fmts = []
+    started = False
+
+    for line in text.splitlines():
+        if line.strip().startswith("-----"):
+            started = True
+            continue
+        parts = line.split()
+        if started and len(parts) >= 2:
+            fmts.append(parts[1])
+
+    return sorted(fmts)
+
+
+# ─────────────────────────────────────────────────────────────
+#  PROBE
+# ─────────────────────────────────────────────────────────────
+def _run(binary, *args):
+    result = subprocess.run(
+        [binary, "-hide_banner", *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        check=True
+    )
+    return result.stdout
+
+
+def probe_capabilities(binary="ffmpeg"):
+    """
+    Runs the binary once per listing and returns the parsed capabilities.
+    Does not use the cache.
+    """
+    path = shutil.which(binary)
+    if not path:
+        return {"ok": False, "error": "FFmpeg not found in PATH.", "data": None}
+
+    try:
+        version, configuration = _parse_version(_run(path, "-version"))
+        data = {
+            "binary": str(Path(path).resolve()),
+            "version": version,
+            "configuration": configuration,
+            "encoders": _parse_encoders(_run(path, "-encoders")),
+            "filters": _parse_filters(_run(path, "-filters")),
+            "pix_fmts": _parse_pix_fmts(_run(path, "-pix_fmts")),
+        }
+    except subprocess.CalledProcessError:
+        return {"ok": False, "error": "FFmpeg found, but could not be executed.", "data": None}
+    except Exception as e:
+        return {"ok": False, "error": f"Error while running FFmpeg: {e}", "data": None}
+
+    return {"ok": True, "error": None, "data": data}
+
+
+# ─────────────────────────────────────────────────────────────
+#  CACHE
+# ─────────────────────────────────────────────────────────────
+def _cache_key(binary):
+    path = shutil.which(binary)
+    if not path:
+        return None
+
+    real = Path(path).resolve()
+    st = real.stat()
+    return f"{real}|{st.st_mtime_ns}|{st.st_size}"
+
+
+def _read_disk_cache():
+    try:
+        with CACHE_FILE.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_disk_cache(entries):
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = CACHE_FILE.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp, CACHE_FILE)
+    except OSError:
+        # cache is an optimisation only
+        pass
+
+
+def get_capabilities(binary="ffmpeg", refresh=False):
+    """
+    Returns the capabilities of the ffmpeg binary.
+    Probed once per (binary path, mtime, size); later calls only stat the binary.
+    refresh=True → probe again and overwrite the cache.
+    """
+    try:
+        key = _cache_key(binary)
+    except OSError as e:
+        return {"ok": False, "error": f"Error while running FFmpeg: {e}", "data": None}
+
+    if key is None:
+        return {"ok": False, "error": "FFmpeg not found in PATH.", "data": None}
+
+    with _LOCK:
+        if not refresh and key in _MEMO:
+            return {"ok": True, "error": None, "data": _MEMO[key]}
+
+        # imported here: engine.events takes CACHE_DIR from this module
+        from .events import emit
+
+        entries = _read_disk_cache()
+        if not refresh and key in entries:
+            _MEMO[key] = entries[key]
+            emit("cache", cache="capabilities", hit=True, binary=key.split("|", 1)[0])
+            return {"ok": True, "error": None, "data": entries[key]}
+
+        emit("cache", cache="capabilities", hit=False, binary=key.split("|", 1)[0])
+        res = probe_capabilities(binary)
+        if not res["ok"]:
+            return res
+
+        # keep only the current build of this binary path
+        path = key.split("|", 1)[0]
+        entries = {k: v for k, v in entries.items() if not k.startswith(path + "|")}
+        entries[key] = res["data"]
+        _write_disk_cache(entries)
+
+        _MEMO[key] = res["data"]
+        return res
+
+
+def has_encoder(caps, name):
+    return name in caps.get("encoders", {})
+
+
+def has_filter(caps, name):
+    return name in caps.get("filters", [])
+
+
+def missing_filters(caps, names):
+    return [n for n in names if not has_filter(caps, n)]
@@ -0,0 +1,758 @@
+"""
+Coordinator / worker mode: spreads proxy, encode and metrics tasks of a
+test or apply run over several machines.
+
+  coordinator:  python -m engine.cluster coordinator --input in.mp4 --starts 0,60 ...
+  worker:       python -m engine.cluster worker --url http://coordinator:8765
+  one machine:  python -m engine.cluster local --workers 3 --input in.mp4 ...
+
+Workers pull tasks over HTTP, run them with the normal engine functions,
+upload output files and push results back. A task whose worker stops
+heart-beating is handed to another worker.
+"""
+import argparse
+import json
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .cancel import CancelToken, TERMINATE_GRACE_SEC
+from .proxy import proxy_single
+from .encode import encode_single, select_recipes
+from .metrics import calc_psnr, calc_ssim, get_size, video_size, metric_scale, size_label
+from .pipeline import preflight, summary_row, proxy_duration
+from .summary_csv import write_summary_csv
+from .mediainfo import validate_starts
+from .utils import parse_list
+
+
+LEASE_SEC = 60          # a task is re-queued if not heart-beaten for this long
+HEARTBEAT_SEC = 10
+MAX_ATTEMPTS = 3
+POLL_SEC = 1.0
+
+# result keys that are not sent back over the wire (can be huge)
+_DROP_KEYS = ("stdout_lines",)
+
+
+# ─────────────────────────────────────────────────────────────
+#  COORDINATOR
+# ─────────────────────────────────────────────────────────────
+class Coordinator:
+    """
+    Task table + file store for one run.
+    Tasks: {"id", "kind", "params", "deps", "status", "attempts", ...}
+    status: pending → leased → done | failed
+    Files are addressed by keys relative to outdir ("input/*" = run inputs).
+    """
+
+    def __init__(self, outdir, lease_sec=LEASE_SEC, max_attempts=MAX_ATTEMPTS, log=None):
+        self.outdir = Path(outdir)
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.lease_sec = lease_sec
+        self.max_attempts = max_attempts
+        self.log = log
+
+        self.tasks = {}
+        self.order = []
+        self.inputs = {}        # "input/<name>" → local path
+        self.expected = set()   # output keys workers may upload
+        self.layout = []        # test mode: (idx, proxy_key, proxy, encode, metrics task IDs)
+        self.keep_proxy = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _log(self, msg):
+        if self.log:
+            self.log(msg)
+
+    # ─ Planning ─────────────────────────────────────────────
+    def add_input(self, path):
+        path = Path(path)
+        key = f"input/{len(self.inputs):03d}_{path.name}"
+        self.inputs[key] = path
+        return key
+
+    def add_task(self, kind, params, deps=(), outputs=()):
+        task_id = f"{kind}-{len(self.order) + 1:04d}"
+        self.tasks[task_id] = {
+            "id": task_id,
+            "kind": kind,
+            "params": params,
+            "deps": list(deps),
+            "status": "pending",
+            "attempts": 0,
+            "worker": None,
+            "lease_until": 0.0,
+            "result": None,
+        }
+        self.order.append(task_id)
+        self.expected.update(outputs)
+        return task_id
+
+    def plan_test(self, input_file, starts, duration, recipes, keep_proxy=False):
+        """
+        One proxy task per start, one encode task per proxy × recipe and
+        one metrics task per encode.
+        """
+        in_key = self.add_input(input_file)
+        self.keep_proxy = keep_proxy
+
+        for idx, start in enumerate(starts, start=1):
+            proxy_key = f"proxy_{idx:02d}.mp4"
+            # test proxies and encodes are video-only (see pipeline.proxy_and_test)
+            p_id = self.add_task("proxy", {
+                "input": in_key, "start": start, "duration": duration, "output": proxy_key,
+                "video_only": True,
+            }, outputs=[proxy_key])
+
+            for rid, recipe in recipes.items():
+                enc_key = f"proxy_{idx:02d}/{rid}.mp4"
+                e_id = self.add_task("encode", {
+                    "input": proxy_key, "recipe_id": rid,
+                    "recipe": _plain(recipe), "output": enc_key, "video_only": True,
+                }, deps=[p_id], outputs=[enc_key])
+
+                m_id = self.add_task("metrics", {
+                    "original": proxy_key, "encoded": enc_key,
+                }, deps=[p_id, e_id])
+
+                self.layout.append((idx, proxy_key, p_id, e_id, m_id))
+
+    def plan_apply(self, input_files, recipe_id, recipe):
+        for infile in input_files:
+            in_key = self.add_input(infile)
+            out_key = f"{Path(infile).stem}_{recipe_id}.mp4"
+            self.add_task("encode", {
+                "input": in_key, "recipe_id": recipe_id,
+                "recipe": _plain(recipe), "output": out_key,
+            }, outputs=[out_key])
+
+    # ─ Leasing ──────────────────────────────────────────────
+    def _expire_leases(self, now):
+        for t in self.tasks.values():
+            if t["status"] == "leased" and t["lease_until"] < now:
+                self._log(f"[CLUSTER] Lease expired: {t['id']} (worker {t['worker']})")
+                self._release(t, "Worker stopped responding")
+
+    def _release(self, t, error):
+        if t["attempts"] >= self.max_attempts:
+            self._finish(t, {"ok": False, "error": f"{error} (after {t['attempts']} attempts)", "data": None})
+        else:
+            t["status"] = "pending"
+            t["worker"] = None
+
+    def _finish(self, t, result):
+        t["status"] = "done" if result.get("ok") else "failed"
+        t["result"] = result
+        t["worker"] = None
+
+        # dependents of a failed task can never run
+        if t["status"] == "failed":
+            for other in self.tasks.values():
+                if other["status"] == "pending" and t["id"] in other["deps"]:
+                    self._finish(other, {"ok": False, "error": f"Dependency failed: {t['id']}", "data": None})
+
+        if all(x["status"] in ("done", "failed") for x in self.tasks.values()):
+            self._done.set()
+
+    def lease(self, worker):
+        now = time.time()
+        with self._lock:
+            self._expire_leases(now)
+            for task_id in self.order:
+                t = self.tasks[task_id]
+                if t["status"] != "pending":
+                    continue
+                if not all(self.tasks[d]["status"] == "done" for d in t["deps"]):
+                    continue
+
+                t["status"] = "leased"
+                t["worker"] = worker
+                t["attempts"] += 1
+                t["lease_until"] = now + self.lease_sec
+                self._log(f"[CLUSTER] {task_id} → {worker} (attempt {t['attempts']})")
+                return {"id": task_id, "kind": t["kind"], "params": t["params"]}
+        return None
+
+    def heartbeat(self, task_id, worker):
+        with self._lock:
+            t = self.tasks.get(task_id)
+            if not t or t["status"] != "leased" or t["worker"] != worker:
+                return False
+            t["lease_until"] = time.time() + self.lease_sec
+            return True
+
+    def complete(self, task_id, worker, result):
+        with self._lock:
+            t = self.tasks.get(task_id)
+            if not t or t["status"] != "leased" or t["worker"] != worker:
+                return False
+            self._log(f"[CLUSTER] {task_id} finished on {worker}: ok={result.get('ok')}")
+            self._finish(t, result)
+        return True
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None, cancel=None):
+        deadline = time.time() + timeout if timeout else None
+        while not self._done.wait(POLL_SEC):
+            with self._lock:
+                self._expire_leases(time.time())
+            if cancel is not None and cancel.cancelled:
+                return False
+            if deadline and time.time() > deadline:
+                return False
+        return True
+
+    def status(self):
+        with self._lock:
+            counts = {}
+            for t in self.tasks.values():
+                counts[t["status"]] = counts.get(t["status"], 0) + 1
+            return {"finished": self.finished, "tasks": counts}
+
+    # ─ Files ────────────────────────────────────────────────
+    def file_path(self, key, for_upload=False):
+        """
+        Maps a file key → local path; None if the key is not part of this run.
+        """
+        if key in self.inputs and not for_upload:
+            return self.inputs[key]
+
+        if for_upload and key not in self.expected:
+            return None
+
+        path = (self.outdir / key).resolve()
+        if self.outdir.resolve() not in path.parents:
+            return None
+        return path
+
+    # ─ Results ──────────────────────────────────────────────
+    def test_report(self):
+        """
+        Builds summary rows (like proxy_and_test) and removes temporary proxies.
+        """
+        rows = []
+        for idx, proxy_key, p_id, e_id, m_id in self.layout:
+            proxy_path = self.outdir / proxy_key
+            enc = self.tasks[e_id]["result"] or {}
+            met = (self.tasks[m_id]["result"] or {}).get("data") or {}
+
+            enc_data = dict(enc.get("data") or {})
+            if enc_data.get("output_file"):
+                enc_data["output_file"] = str(self.outdir / self.tasks[e_id]["params"]["output"])
+
+            rows.append(summary_row(idx, get_size(proxy_path), enc_data,
+                                    met.get("psnr"), met.get("ssim"),
+                                    proxy_duration(proxy_path), met.get("resolution")))
+
+        if not self.keep_proxy:
+            for _, proxy_key, *_ in self.layout:
+                (self.outdir / proxy_key).unlink(missing_ok=True)
+
+        return rows
+
+    def apply_report(self):
+        """
+        Task results in input order, output paths pointing into outdir
+        (the worker's copy is deleted after upload).
+        """
+        results = []
+        for task_id in self.order:
+            t = self.tasks[task_id]
+            res = t["result"]
+            if res and isinstance(res.get("data"), dict) and res["data"].get("output_file"):
+                res = {**res, "data": {**res["data"], "output_file": str(self.outdir / t["params"]["output"])}}
+            results.append(res)
+        return results
+
+
+def _plain(recipe):
+    # CompiledRecipe → JSON-able dict
+    return recipe.to_dict() if hasattr(recipe, "to_dict") else dict(recipe)
+
+
+# ─────────────────────────────────────────────────────────────
+#  HTTP API
+# ─────────────────────────────────────────────────────────────
+def _make_handler(coord):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _json(self, code, payload=None):
+            if code == 204:
+                # no body allowed
+                self.send_response(code)
+                self.end_headers()
+                return
+            body = json.dumps(payload or {}).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def do_GET(self):
+            if self.path == "/status":
+                return self._json(200, coord.status())
+
+            if self.path.startswith("/files/"):
+                path = coord.file_path(urllib.parse.unquote(self.path[len("/files/"):]))
+                if path is None or not Path(path).is_file():
+                    return self._json(404, {"error": "file not found"})
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(Path(path).stat().st_size))
+                self.end_headers()
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, self.wfile)
+                return
+
+            self._json(404, {"error": "not found"})
+
+        def do_PUT(self):
+            if not self.path.startswith("/files/"):
+                return self._json(404, {"error": "not found"})
+
+            path = coord.file_path(urllib.parse.unquote(self.path[len("/files/"):]), for_upload=True)
+            if path is None:
+                return self._json(403, {"error": "unexpected file"})
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            remaining = int(self.headers.get("Content-Length") or 0)
+            tmp = path.with_name(path.name + ".part")
+            with open(tmp, "wb") as f:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            if remaining:
+                # connection dropped mid-upload: keep no truncated output
+                tmp.unlink(missing_ok=True)
+                return self._json(400, {"error": "incomplete upload"})
+            tmp.replace(path)
+            self._json(200)
+
+        def do_POST(self):
+            body = self._body()
+            worker = body.get("worker", "?")
+
+            if self.path == "/lease":
+                if coord.finished:
+                    return self._json(410, {"finished": True})
+                task = coord.lease(worker)
+                return self._json(200, task) if task else self._json(204)
+
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 3 and parts[0] == "tasks":
+                if coord.finished:
+                    return self._json(410, {"finished": True})
+                _, task_id, action = parts
+                if action == "heartbeat":
+                    ok = coord.heartbeat(task_id, worker)
+                elif action == "complete":
+                    ok = coord.complete(task_id, worker, body.get("result") or {})
+                else:
+                    return self._json(404, {"error": "not found"})
+                return self._json(200 if ok else 409)
+
+            self._json(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(coord, host="127.0.0.1", port=8765):
+    """
+    Starts the coordinator HTTP server in a background thread.
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(coord))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ─────────────────────────────────────────────────────────────
+#  WORKER
+# ─────────────────────────────────────────────────────────────
+class Worker:
+    """
+    Pulls tasks from a coordinator and runs them with the engine functions.
+    Inputs are downloaded once into workdir and reused by later tasks.
+    cancel: stops the worker and its running ffmpeg (set on 410, when the
+    coordinator stays unreachable, or by the CLI on SIGTERM).
+    """
+
+    def __init__(self, url, workdir=None, name=None, log=None, cancel=None):
+        self.url = url.rstrip("/")
+        self.name = name or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.workdir = Path(workdir or tempfile.mkdtemp(prefix="ffsandbox-worker-"))
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self.log = log
+        self.cancel = cancel or CancelToken()
+
+    def _log(self, msg):
+        if self.log:
+            self.log(f"[{self.name}] {msg}")
+
+    def _post(self, path, payload):
+        req = urllib.request.Request(
+            self.url + path,
+            data=json.dumps({"worker": self.name, **payload}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            raw = resp.read()
+            return resp.status, (json.loads(raw) if raw else None)
+
+    def _local(self, key):
+        return self.workdir / key.replace("/", "__")
+
+    def _download(self, key):
+        local = self._local(key)
+        if not local.is_file():
+            tmp = local.with_name(local.name + ".part")
+            with urllib.request.urlopen(f"{self.url}/files/{urllib.parse.quote(key)}", timeout=60) as resp, \
+                    open(tmp, "wb") as f:
+                shutil.copyfileobj(resp, f)
+            tmp.replace(local)
+        return local
+
+    def _upload(self, key, local):
+        with open(local, "rb") as f:
+            req = urllib.request.Request(
+                f"{self.url}/files/{urllib.parse.quote(key)}",
+                data=f,
+                headers={"Content-Length": str(Path(local).stat().st_size)},
+                method="PUT",
+            )
+            urllib.request.urlopen(req, timeout=300).close()
+
+    # ─ Task execution ───────────────────────────────────────
+    def run_task(self, task, cancel=None):
+        kind, p = task["kind"], task["params"]
+
+        if kind == "proxy":
+            out = self._local(p["output"])
+            res = proxy_single(self._download(p["input"]), p["start"], p["duration"], out,
+                               cancel=cancel, video_only=p.get("video_only", False))
+            if res["ok"]:
+                self._upload(p["output"], out)
+            return res
+
+        if kind == "encode":
+            out = self._local(p["output"])
+            res = encode_single(self._download(p["input"]), p["recipe_id"], p["recipe"], out,
+                                cancel=cancel, video_only=p.get("video_only", False))
+            if res["ok"]:
+                self._upload(p["output"], out)
+                out.unlink(missing_ok=True)
+            return res
+
+        if kind == "metrics":
+            original = self._download(p["original"])
+            encoded = self._download(p["encoded"])
+            # ladder rungs are compared at the proxy resolution
+            enc_size = video_size(encoded)
+            scale_to = metric_scale(video_size(original), enc_size)
+            return {
+                "ok": True,
+                "error": None,
+                "data": {
+                    "psnr": calc_psnr(original, encoded, cancel=cancel, size=scale_to),
+                    "ssim": calc_ssim(original, encoded, cancel=cancel, size=scale_to),
+                    "resolution": size_label(enc_size),
+                },
+            }
+
+        return {"ok": False, "error": f"Unknown task kind: {kind}", "data": None}
+
+    def _heartbeat_loop(self, task_id, stop, cancel):
+        """
+        Keeps the lease alive; cancels the task once the lease is lost
+        (409), the run is over (410) or no heartbeat got through for a
+        whole lease period (the task is handed to another worker by then).
+        """
+        last_ok = time.time()
+        while not stop.wait(HEARTBEAT_SEC):
+            try:
+                self._post(f"/tasks/{task_id}/heartbeat", {})
+                last_ok = time.time()
+            except urllib.error.HTTPError as e:
+                if e.code == 410:
+                    self.cancel.cancel()
+                    return
+                if e.code == 409:
+                    cancel.cancel()
+                    return
+            except (OSError, urllib.error.URLError):
+                if time.time() - last_ok > LEASE_SEC:
+                    self._log(f"Coordinator unreachable, dropping {task_id}")
+                    cancel.cancel()
+                    return
+
+    def run(self, max_idle_errors=30):
+        """
+        Main loop. Returns when the coordinator reports the run finished
+        (or stays unreachable).
+        """
+        errors = 0
+        self._log(f"Worker started (coordinator {self.url})")
+
+        while not self.cancel.cancelled:
+            try:
+                status, task = self._post("/lease", {})
+                errors = 0
+            except urllib.error.HTTPError as e:
+                if e.code == 410:
+                    self.cancel.cancel()
+                    break
+                errors += 1
+                if errors >= max_idle_errors:
+                    self.cancel.cancel()
+                    break
+                task = None
+            except (OSError, urllib.error.URLError):
+                errors += 1
+                if errors >= max_idle_errors:
+                    self.cancel.cancel()
+                    break
+                self.cancel.wait(POLL_SEC)
+                continue
+
+            if not task:
+                self.cancel.wait(POLL_SEC)
+                continue
+
+            cancel = self.cancel.child()
+            stop = threading.Event()
+            threading.Thread(target=self._heartbeat_loop, args=(task["id"], stop, cancel),
+                             daemon=True).start()
+            try:
+                result = self.run_task(task, cancel)
+            except Exception as e:
+                result = {"ok": False, "error": f"Worker error: {e}", "data": None}
+            finally:
+                stop.set()
+
+            if cancel.cancelled:
+                # lease lost or worker stopping: the coordinator re-queues the task
+                self._log(f"Dropped {task['id']}")
+                continue
+
+            data = result.get("data")
+            if isinstance(data, dict):
+                result["data"] = {k: v for k, v in data.items() if k not in _DROP_KEYS}
+
+            try:
+                self._post(f"/tasks/{task['id']}/complete", {"result": result})
+            except (OSError, urllib.error.URLError) as e:
+                self._log(f"Could not report {task['id']}: {e}")
+
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        self._log("Worker stopped")
+
+
+# ─────────────────────────────────────────────────────────────
+#  RUNS
+# ─────────────────────────────────────────────────────────────
+def cluster_test(input_file, start_list, duration, recipes_json, pick=None,
+                 outdir="test_out", log=None, keep_proxy=False,
+                 host="127.0.0.1", port=8765, local_workers=0, cancel=None):
+    """
+    Distributed proxy_and_test. Serves tasks until every task is done;
+    local_workers > 0 also starts that many worker processes on this machine.
+    """
+    pf = preflight(recipes_json, parse_list(pick, allow_none=True), ["psnr", "ssim"])
+    if not pf["ok"]:
+        return pf
+    _, recipes_dict = pf["data"]
+
+    input_file = Path(input_file)
+    if not input_file.is_file():
+        return {"ok": False, "error": f"Input not found: {input_file}"}
+
+    starts = parse_list(start_list)
+    if not starts:
+        return {"ok": False, "error": "At least one start value is required.", "data": None}
+
+    check = validate_starts(input_file, starts, duration)
+    if not check["ok"]:
+        return {"ok": False, "error": check["error"], "data": None}
+
+    coord = Coordinator(outdir, log=log)
+    coord.plan_test(input_file, starts, duration, select_recipes(recipes_dict, pick)["data"],
+                    keep_proxy=keep_proxy)
+
+    finished = _run_coordinator(coord, host, port, local_workers, log, cancel)
+
+    rows = coord.test_report()
+    try:
+        write_summary_csv(rows, outdir)
+    except:
+        pass
+
+    failed = [t for t in coord.tasks.values() if t["status"] != "done"]
+    return {
+        "ok": finished and not failed,
+        "error": None if finished and not failed else f"{len(failed)} task(s) failed or did not finish.",
+        "data": {"tasks": coord.tasks, "output_folder": str(outdir)},
+    }
+
+
+def cluster_apply(input_files, recipe_id, recipes_json, output_dir, log=None,
+                  host="127.0.0.1", port=8765, local_workers=0, cancel=None):
+    """
+    Distributed apply_multi: one encode task per input file.
+    """
+    pf = preflight(recipes_json, [recipe_id])
+    if not pf["ok"]:
+        return pf
+    _, recipes = pf["data"]
+
+    missing = [f for f in input_files if not Path(f).is_file()]
+    if missing:
+        return {"ok": False, "error": f"Input not found: {missing}", "data": None}
+
+    coord = Coordinator(output_dir, log=log)
+    coord.plan_apply(input_files, recipe_id, recipes[recipe_id])
+
+    finished = _run_coordinator(coord, host, port, local_workers, log, cancel)
+
+    results = coord.apply_report()
+    all_ok = finished and all(r and r.get("ok") for r in results)
+    return {
+        "ok": all_ok,
+        "data": results,
+        "error": None if all_ok else "Some files failed to process.",
+    }
+
+
+def _run_coordinator(coord, host, port, local_workers, log, cancel):
+    server = serve(coord, host, port)
+    port = server.server_address[1]
+    url = f"http://127.0.0.1:{port}"
+    if log:
+        log(f"[CLUSTER] Coordinator on port {port}, {len(coord.tasks)} tasks")
+
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "engine.cluster", "worker",
+                          "--url", url, "--name", f"local-{i + 1}"],
+                         cwd=str(Path(__file__).resolve().parent.parent))
+        for i in range(local_workers)
+    ]
+
+    finished = False
+    try:
+        finished = coord.wait(cancel=cancel)
+        if finished:
+            # let polling workers see 410 and exit
+            time.sleep(POLL_SEC * 2)
+    finally:
+        server.shutdown()
+        server.server_close()
+        # SIGTERM first: workers stop their ffmpeg and clean their workdir
+        for p in procs:
+            try:
+                p.wait(timeout=5 if finished else 0)
+            except subprocess.TimeoutExpired:
+                p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=TERMINATE_GRACE_SEC * 2)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+    return finished
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.cluster")
+    sub = ap.add_subparsers(dest="mode", required=True)
+
+    w = sub.add_parser("worker", help="pull and run tasks from a coordinator")
+    w.add_argument("--url", required=True)
+    w.add_argument("--workdir")
+    w.add_argument("--name")
+
+    for name in ("coordinator", "local"):
+        c = sub.add_parser(name, help="serve a run" if name == "coordinator"
+                           else "serve a run with local worker processes")
+        c.add_argument("--input", nargs="+", required=True)
+        c.add_argument("--recipes", default="recipes.json")
+        c.add_argument("--starts", help="test mode: start list, e.g. 0,60,120")
+        c.add_argument("--duration", default="5")
+        c.add_argument("--pick", help="test mode: recipe IDs")
+        c.add_argument("--recipe", help="apply mode: recipe ID")
+        c.add_argument("--outdir", default="test_out")
+        c.add_argument("--keep-proxy", action="store_true")
+        if name == "coordinator":
+            # file GET/PUT is unauthenticated: listen beyond loopback only on request
+            c.add_argument("--host", required=True, help="interface to serve on, e.g. 0.0.0.0")
+        else:
+            c.add_argument("--host", default="127.0.0.1")
+        c.add_argument("--port", type=int, default=8765)
+        if name == "local":
+            c.add_argument("--workers", type=int, default=2)
+
+    args = ap.parse_args(argv)
+
+    if args.mode == "worker":
+        worker = Worker(args.url, args.workdir, args.name, log=print)
+
+        def _on_signal(signum, frame):
+            worker.cancel.cancel()
+
+        signal.signal(signal.SIGINT, _on_signal)
+        signal.signal(signal.SIGTERM, _on_signal)
+        worker.run()
+        return 0
+
+    if not args.recipe and len(args.input) > 1:
+        ap.error("test mode takes a single --input (several only with --recipe)")
+
+    workers = getattr(args, "workers", 0)
+    if args.recipe:
+        res = cluster_apply(args.input, args.recipe, args.recipes, args.outdir, log=print,
+                            host=args.host, port=args.port, local_workers=workers)
+    else:
+        res = cluster_test(args.input[0], args.starts, args.duration, args.recipes,
+                           pick=args.pick, outdir=args.outdir, log=print,
+                           keep_proxy=args.keep_proxy, host=args.host, port=args.port,
+                           local_workers=workers)
+
+    print("OK" if res["ok"] else f"ERROR: {res['error']}")
+    return 0 if res["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
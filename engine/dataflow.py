@@ -0,0 +1,84 @@
+import queue
+import threading
+
+
+# end-of-stream marker passed between stages
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a dataflow: func(item, emit) is called for every input
+    item by `workers` threads; emit(x) hands x to the next stage and blocks
+    while the next stage's queue (maxsize items) is full.
+    """
+
+    def __init__(self, name, func, workers=1, maxsize=0):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.maxsize = maxsize
+
+
+def run_stages(items, stages, log=None):
+    """
+    Streams items through the stages; all stages run at the same time,
+    bounded queues between them give backpressure.
+    An exception in func is logged and the item dropped (funcs are
+    expected to return error results rather than raise).
+    Return: list of items emitted by the last stage (arrival order).
+    """
+    queues = [queue.Queue(maxsize=s.maxsize) for s in stages]
+    results = []
+    results_lock = threading.Lock()
+
+    def _collect(x):
+        with results_lock:
+            results.append(x)
+
+    threads = []
+
+    for n, stage in enumerate(stages):
+        in_q = queues[n]
+        if n + 1 < len(stages):
+            emit = queues[n + 1].put
+        else:
+            emit = _collect
+
+        # last worker of a stage to finish closes the next stage
+        remaining = [stage.workers]
+        lock = threading.Lock()
+
+        def _worker(stage=stage, in_q=in_q, emit=emit, remaining=remaining, lock=lock, n=n):
+            while True:
+                item = in_q.get()
+                if item is _DONE:
+                    break
+                try:
+                    stage.func(item, emit)
+                except Exception as e:
+                    if log:
+                        log(f"[ERROR] Stage '{stage.name}' failed: {e}")
+
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and n + 1 < len(stages):
+                for _ in range(stages[n + 1].workers):
+                    queues[n + 1].put(_DONE)
+
+        for i in range(stage.workers):
+            t = threading.Thread(target=_worker, name=f"{stage.name}-{i}", daemon=True)
+            threads.append(t)
+            t.start()
+
+    # feed the first stage (blocks while its queue is full)
+    for item in items:
+        queues[0].put(item)
+    for _ in range(stages[0].workers):
+        queues[0].put(_DONE)
+
+    for t in threads:
+        t.join()
+
+    return results
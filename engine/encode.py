@@ -1,7 +1,15 @@
 from pathlib import Path
 from .utils import ensure_folder
-from .utils import parse_list
+from .utils import parse_list, parse_scale
 from .run_command import run_command
+from .progress import parse_bench_stages, output_encode_seconds, last_stats, bench_breakdown
+from .progress import parse_stream_sizes
+from .proxy import VIDEO_ONLY_ARGS
+from .cancel import is_cancelled, discard_partial
+from .adaptive import make_controller, run_batch
+from .twopass import is_two_pass, ensure_first_pass, with_pass
+from .tuning import tuned_args
+from .events import emit
 
 
 # Mapping key → ffmpeg option output
@@ -11,13 +19,112 @@ RECIPE_MAP = {
     "preset": ("-preset",),
     "b:v": ("-b:v",),
     "deadline": ("-deadline",),
+    "maxrate": ("-maxrate",),
+    "bufsize": ("-bufsize",),
 }
 
+# ladder recipes without "scaler" (ffmpeg's own default)
+DEFAULT_SCALER = "bicubic"
+
+# instrumented encodes: stats line interval (seconds) for the fps timeline
+STATS_PERIOD_SEC = 1.0
+
+# global options of an instrumented encode: process totals, per-stage
+# times and stats lines at a fixed interval (see progress.bench_breakdown)
+INSTRUMENT_ARGS = ["-benchmark", "-benchmark_all", "-stats_period", str(STATS_PERIOD_SEC)]
+
+
+def scale_filter(recipe_dict):
+    """
+    Ladder recipe ("scale", optional "scaler") → "scale=W:H:flags=...";
+    None for recipes encoding at source resolution.
+    """
+    size = parse_scale(recipe_dict.get("scale")) if "scale" in recipe_dict else None
+    if size is None:
+        return None
+    return f"scale={size[0]}:{size[1]}:flags={recipe_dict.get('scaler', DEFAULT_SCALER)}"
+
+
+def recipe_args(recipe_dict):
+    """
+    Converts a recipe → list of ffmpeg video options.
+    Compiled recipes (engine.recipes) already carry their argv.
+    Known keys go through RECIPE_MAP, "options" is passed through as
+    -key value, "scale"/"scaler" become -vf scale=..., other keys are
+    ignored.
+    """
+    argv = getattr(recipe_dict, "argv", None)
+    if argv is not None:
+        return list(argv)
+
+    args = []
+    vf = scale_filter(recipe_dict)
+    if vf:
+        args.extend(["-vf", vf])
+
+    for key, val in recipe_dict.items():
+        if key in RECIPE_MAP:
+            args.extend([RECIPE_MAP[key][0], str(val)])
+
+    for key, val in (recipe_dict.get("options") or {}).items():
+        args.extend(["-" + str(key).lstrip("-"), str(val)])
+
+    return args
+
+
+def without_vf(args):
+    """
+    argv minus its -vf (fan-out applies the recipe's scale in its own graph).
+    """
+    args = list(args)
+    if "-vf" in args:
+        i = args.index("-vf")
+        del args[i:i + 2]
+    return args
+
+
+def video_args(recipe_dict, threads=None):
+    """
+    Recipe argv plus this host's auto-tuned threading settings
+    (engine.autotune). threads given → the caller's -threads wins.
+    """
+    return tuned_args(recipe_dict, recipe_args(recipe_dict), threads)
+
+
+def select_recipes(recipes_dict, pick_raw=None):
+    """
+    Filters recipes by a pick list ('a,b,c'). No pick list → all recipes.
+    """
+    picks = parse_list(pick_raw, allow_none=True)
+
+    if not picks:
+        return {"ok": True, "data": recipes_dict.copy()}
+
+    invalid = [x for x in picks if x not in recipes_dict]
+    if invalid:
+        return {
+            "ok": False,
+            "error": f"Recipe ID not found: {invalid}",
+            "data": None
+        }
+
+    return {"ok": True, "data": {rid: recipes_dict[rid] for rid in picks}}
+
 
 # ─────────────────────────────────────────────────────────────
 #  ENCODE (single)
 # ─────────────────────────────────────────────────────────────
-def encode_single(proxy_file, recipe_id, recipe_dict, output_file, log=None):
+def prepare_encode(proxy_file, recipe_dict, output_file, threads=None, passlog=None,
+                   instrument=False, video_only=False):
+    """
+    Validates paths and builds the encode command (shared by the sync and
+    async executors). threads → -threads N for the encoder.
+    passlog: first-pass stats prefix → this command is pass 2.
+    instrument: add INSTRUMENT_ARGS (per-stage timing, see finish_encode).
+    video_only: encode the first video stream only (tests); otherwise
+    ffmpeg's default stream selection with audio copied (apply).
+    Return: {"ok": True, "data": cmd_list} or {"ok": False, "error": "..."}
+    """
     proxy_file = Path(proxy_file)
     output_file = Path(output_file)
 
@@ -39,25 +146,42 @@ def encode_single(proxy_file, recipe_id, recipe_dict, output_file, log=None):
         }
 
     # 3. Build encode command
-    cmd = ["ffmpeg", "-y", "-i", str(proxy_file)]
+    cmd = ["ffmpeg", "-y"]
+    if instrument:
+        cmd.extend(INSTRUMENT_ARGS)
+    cmd.extend(["-i", str(proxy_file)])
+    if video_only:
+        cmd.extend(["-map", "0:v:0"])
+    args = video_args(recipe_dict, threads)
+    if passlog:
+        args = with_pass(args, recipe_dict["codec"], 2, passlog)
+    cmd.extend(args)
+    if threads:
+        cmd.extend(["-threads", str(threads)])
 
-    for key, val in recipe_dict.items():
-        if key in RECIPE_MAP:
-            cmd.extend([RECIPE_MAP[key][0], str(val)])
-        else:
-            # ignore unknown keys
-            continue
+    # apply: always copy audio
+    cmd.extend(VIDEO_ONLY_ARGS if video_only else ["-c:a", "copy"])
+    cmd.append(str(output_file))
 
-    # always copy audio
-    cmd.extend(["-c:a", "copy", str(output_file)])
+    return {"ok": True, "data": cmd}
 
-    desc = f"Encode using recipe '{recipe_id}'"
-    result = run_command(cmd, desc, log_callback=log)
 
-    # If failed → return directly
+def finish_encode(result, output_file, recipe_id, first_pass=None, instrument=False):
+    """
+    Adds output metadata to a run_command result.
+    first_pass: data of ensure_first_pass() for two-pass recipes.
+    instrument: the command had INSTRUMENT_ARGS → data["bench"]
+    (progress.bench_breakdown).
+    """
+    # If failed → drop partial output (cancel/timeout) and return directly
     if not result["ok"]:
+        discard_partial(result, output_file)
+        emit("encode", recipe_id=recipe_id, ok=False, error=result["error"],
+             output=str(output_file), elapsed_sec=(result.get("data") or {}).get("elapsed_sec"))
         return result
 
+    output_file = Path(output_file)
+
     # 4. Calculate size
     size_kb = output_file.stat().st_size / 1024 if output_file.exists() else None
 
@@ -65,14 +189,77 @@ def encode_single(proxy_file, recipe_id, recipe_dict, output_file, log=None):
     result["data"]["output_file"] = str(output_file)
     result["data"]["size_kb"] = round(size_kb, 2) if size_kb else None
     result["data"]["recipe_id"] = recipe_id
+
+    stats = last_stats(result["data"].get("stdout_lines"))
+    result["data"]["frames"] = stats["frame"] if stats else None
+
+    # video bitstream alone (size_kb also counts audio and container)
+    sizes = parse_stream_sizes(result["data"].get("stdout_lines"))
+    result["data"]["video_kb"] = sizes["video_kb"] if sizes else None
+
+    if instrument:
+        result["data"]["bench"] = bench_breakdown(result["data"].get("stdout_lines"),
+                                                  stats_period=STATS_PERIOD_SEC)
+
+    if first_pass:
+        result["data"]["first_pass"] = first_pass["key"]
+        result["data"]["first_pass_sec"] = first_pass["elapsed_sec"]
+
+    emit("encode", recipe_id=recipe_id, ok=True, output=str(output_file),
+         frames=result["data"]["frames"], elapsed_sec=result["data"]["elapsed_sec"],
+         size_kb=result["data"]["size_kb"], first_pass_sec=result["data"].get("first_pass_sec"))
     return result
 
 
+def first_pass_for(proxy_file, recipe_dict, log=None, cancel=None, timeout=None, threads=None):
+    """
+    Pass 1 (cached, shared by recipes with the same first-pass argv) for
+    two-pass recipes. Single-pass recipes / missing input → data None.
+    """
+    if not is_two_pass(recipe_dict) or not Path(proxy_file).is_file():
+        return {"ok": True, "error": None, "data": None}
+
+    return ensure_first_pass(proxy_file, recipe_dict["codec"], video_args(recipe_dict, threads),
+                             log=log, cancel=cancel, timeout=timeout, threads=threads)
+
+
+def encode_single(proxy_file, recipe_id, recipe_dict, output_file, log=None,
+                  cancel=None, timeout=None, threads=None, progress=None, instrument=False,
+                  video_only=False):
+    fp = first_pass_for(proxy_file, recipe_dict, log, cancel, timeout, threads)
+    if not fp["ok"]:
+        return fp
+    first_pass = fp["data"]
+
+    prep = prepare_encode(proxy_file, recipe_dict, output_file, threads,
+                          passlog=first_pass["prefix"] if first_pass else None,
+                          instrument=instrument, video_only=video_only)
+    if not prep["ok"]:
+        return prep
+
+    desc = f"Encode using recipe '{recipe_id}'"
+    if first_pass:
+        desc += " (pass 2)"
+    result = run_command(prep["data"], desc, log_callback=log,
+                         cancel=cancel, timeout=timeout, progress_callback=progress)
+
+    return finish_encode(result, output_file, recipe_id, first_pass, instrument)
+
+
 
 # ─────────────────────────────────────────────────────────────
 #  ENCODE (multi)
 # ─────────────────────────────────────────────────────────────
-def encode_multi(proxy_file, recipes_dict, pick_raw=None, outdir="out", log=None):
+def encode_multi(proxy_file, recipes_dict, pick_raw=None, outdir="out", log=None,
+                 cancel=None, timeout=None, concurrency=None, instrument=False,
+                 video_only=False):
+    """
+    concurrency: None/1 → one encode at a time, int → that many at once,
+    "auto" → adaptive controller (jobs and threads per job follow CPU load
+    and observed fps).
+    instrument: per-stage timing in each result's data["bench"].
+    video_only: see prepare_encode.
+    """
     outdir = Path(outdir)
 
     # 1. Ensure output folder exists
@@ -85,40 +272,193 @@ def encode_multi(proxy_file, recipes_dict, pick_raw=None, outdir="out", log=None
         }
 
     # 2. Filter recipes if pick list is provided
-    picks = parse_list(pick_raw, allow_none=True)
+    picked = select_recipes(recipes_dict, pick_raw)
+    if not picked["ok"]:
+        return picked
+    selected_recipes = picked["data"]
+
+    # 3. Run all recipes (queued work is skipped once cancelled)
+    def _job(item, threads, progress):
+        recipe_id, recipe = item
+        return encode_single(
+            proxy_file=proxy_file,
+            recipe_id=recipe_id,
+            recipe_dict=recipe,
+            output_file=outdir / f"{recipe_id}.mp4",
+            log=log,
+            cancel=cancel,
+            timeout=timeout,
+            threads=threads,
+            progress=progress,
+            instrument=instrument,
+            video_only=video_only
+        )
 
-    if picks:
-        # Take only selected recipes
-        invalid = [x for x in picks if x not in recipes_dict]
-        if invalid:
-            return {
-                "ok": False,
-                "error": f"Recipe ID not found: {invalid}",
-                "data": None
-            }
-        selected_recipes = {rid: recipes_dict[rid] for rid in picks}
+    results = run_batch(list(selected_recipes.items()), _job,
+                        make_controller(concurrency, log), cancel)
+
+    # 4. Combine OK state
+    all_ok = all(r["ok"] for r in results)
+
+    if is_cancelled(cancel):
+        return {"ok": False, "error": "Cancelled", "data": results}
+
+    return {
+        "ok": all_ok,
+        "error": None if all_ok else "One or more encode operations failed.",
+        "data": results
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+#  ENCODE (fan-out: one decode, one output per recipe)
+# ─────────────────────────────────────────────────────────────
+def fanout_graph(filters):
+    """
+    Filtergraph feeding every output from one decode of [0:v].
+    filters: per output, its scale filter or None (source size). The
+    decoded video is split once per distinct scale and each scaled branch
+    again per output, so ladder rungs sharing a size are scaled once.
+    Return: (graph, [output label, ...])
+    """
+    labels = [f"[v{i}]" for i in range(len(filters))]
+    groups = {}
+    for i, vf in enumerate(filters):
+        groups.setdefault(vf, []).append(labels[i])
+
+    if len(groups) == 1:
+        sources = ["[0:v]"]
+        parts = []
     else:
-        selected_recipes = recipes_dict.copy()
+        sources = [f"[s{g}]" for g in range(len(groups))]
+        parts = [f"[0:v]split={len(groups)}" + "".join(sources)]
 
-    results = []
+    for src, (vf, outs) in zip(sources, groups.items()):
+        chain = f"{vf}," if vf else ""
+        parts.append(f"{src}{chain}split={len(outs)}" + "".join(outs))
+
+    return ";".join(parts), labels
 
-    # 3. Loop through all recipes
+
+def encode_fanout(proxy_file, recipes_dict, pick_raw=None, outdir="out", log=None,
+                  cancel=None, timeout=None, instrument=False, video_only=False):
+    """
+    Encodes all selected recipes in ONE ffmpeg process.
+    The proxy is demuxed/decoded once and fed to every encoder through a
+    'split' filter. elapsed_sec is the shared wall time; with instrument,
+    encode_sec is each output's encoder time from the -benchmark_all
+    stage lines (None otherwise).
+    Two-pass recipes run their (shared, cached) first pass beforehand;
+    their outputs in the fan-out command are pass 2.
+    Ladder recipes ("scale") are scaled inside the shared graph.
+    instrument: data["bench"] per output (decode and process totals are
+    those of the shared process).
+    video_only: outputs carry the video branch only (no audio copy).
+    Returns the same shape as encode_multi.
+    """
+    proxy_file = Path(proxy_file)
+    outdir = Path(outdir)
+
+    if not proxy_file.is_file():
+        return {
+            "ok": False,
+            "error": f"Proxy file not found: {proxy_file}",
+            "data": None
+        }
+
+    folder_ok = ensure_folder(outdir)
+    if not folder_ok["ok"]:
+        return {
+            "ok": False,
+            "error": f"Failed to create output folder: {folder_ok['error']}",
+            "data": None
+        }
+
+    picked = select_recipes(recipes_dict, pick_raw)
+    if not picked["ok"]:
+        return picked
+    selected_recipes = picked["data"]
+
+    if not selected_recipes:
+        return {"ok": False, "error": "No recipes selected.", "data": None}
+
+    # 1. First passes of two-pass recipes
+    first_passes = {}
     for recipe_id, recipe in selected_recipes.items():
+        fp = first_pass_for(proxy_file, recipe, log, cancel, timeout)
+        if not fp["ok"]:
+            return {"ok": False, "error": fp["error"], "data": [fp]}
+        first_passes[recipe_id] = fp["data"]
+
+    # 2. Build one command: split the decoded video into N branches
+    n = len(selected_recipes)
+    graph, labels = fanout_graph([scale_filter(r) for r in selected_recipes.values()])
+
+    cmd = ["ffmpeg", "-y"] + (INSTRUMENT_ARGS if instrument else [])
+    cmd.extend(["-i", str(proxy_file), "-filter_complex", graph])
+
+    outputs = []
+    for i, (recipe_id, recipe) in enumerate(selected_recipes.items()):
         out_file = outdir / f"{recipe_id}.mp4"
+        cmd.extend(["-map", labels[i]] if video_only else ["-map", labels[i], "-map", "0:a?"])
+        args = without_vf(video_args(recipe))
+        if first_passes[recipe_id]:
+            args = with_pass(args, recipe["codec"], 2, first_passes[recipe_id]["prefix"])
+        cmd.extend(args)
+        cmd.extend(VIDEO_ONLY_ARGS if video_only else ["-c:a", "copy"])
+        cmd.append(str(out_file))
+        outputs.append((recipe_id, out_file))
 
-        res = encode_single(
-            proxy_file=proxy_file,
-            recipe_id=recipe_id,
-            recipe_dict=recipe,
-            output_file=out_file,
-            log=log
+    desc = f"Fan-out encode ({n} recipes): {', '.join(selected_recipes)}"
+    result = run_command(cmd, desc, log_callback=log, cancel=cancel, timeout=timeout)
+    discard_partial(result, *[out for _, out in outputs])
+
+    run_data = result.get("data") or {}
+    stdout_lines = run_data.get("stdout_lines", [])
+    stages = parse_bench_stages(stdout_lines) if instrument else None
+    stats = last_stats(stdout_lines)
+    frames = stats["frame"] if stats else None
+
+    # 3. Split the shared result into one result per recipe
+    results = []
+    for i, (recipe_id, out_file) in enumerate(outputs):
+        size_kb = out_file.stat().st_size / 1024 if out_file.exists() else None
+        encode_sec = output_encode_seconds(stages, i) if stages else None
+
+        data = dict(run_data)
+        data["output_file"] = str(out_file)
+        data["size_kb"] = round(size_kb, 2) if size_kb else None
+        data["recipe_id"] = recipe_id
+        data["output_index"] = i
+        data["frames"] = frames
+        sizes = parse_stream_sizes(stdout_lines, i if n > 1 else None)
+        data["video_kb"] = sizes["video_kb"] if sizes else None
+        data["encode_sec"] = encode_sec
+        data["encode_fps"] = (
+            round(frames / encode_sec, 3) if frames and encode_sec else None
         )
+        if first_passes[recipe_id]:
+            data["first_pass"] = first_passes[recipe_id]["key"]
+            data["first_pass_sec"] = first_passes[recipe_id]["elapsed_sec"]
+        if instrument:
+            data["bench"] = bench_breakdown(stdout_lines, i, STATS_PERIOD_SEC)
 
-        results.append(res)
+        # fan-out: attributed encoder time when measured, else the shared wall time
+        emit("encode", recipe_id=recipe_id, ok=result["ok"], error=result["error"],
+             output=str(out_file), frames=frames, elapsed_sec=encode_sec or data.get("elapsed_sec"),
+             size_kb=data["size_kb"], fanout=True)
+
+        results.append({
+            "ok": result["ok"],
+            "error": result["error"],
+            "data": data
+        })
 
-    # 4. Combine OK state
     all_ok = all(r["ok"] for r in results)
 
+    if is_cancelled(cancel):
+        return {"ok": False, "error": "Cancelled", "data": results}
+
     return {
         "ok": all_ok,
         "error": None if all_ok else "One or more encode operations failed.",
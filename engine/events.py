@@ -0,0 +1,302 @@
+"""
+Structured event log: every engine event as one JSON line in a rotating
+file per process (<cache dir>/logs/events-<pid>.jsonl, 10 MB x 5 backups;
+GUI, service, watcher and cluster workers may run at once, and rotation is
+only safe with one writer per file). Files untouched for 30 days are removed.
+
+emit() only puts the record on an in-memory queue; a QueueListener
+thread serialises and writes it, so callers never wait on disk I/O.
+Set FFSANDBOX_NO_EVENTS=1 to turn it off.
+
+  python -m engine.events stats [--since 2026-01-01] [--json]
+  python -m engine.events tail [-n 20]
+"""
+import argparse
+import atexit
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+from .capabilities import CACHE_DIR
+
+
+EVENTS_DIR = CACHE_DIR / "logs"
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+# logs of processes that have not written for this long are removed
+MAX_AGE_SEC = 30 * 24 * 3600
+
+# progress snapshots per command at most this often
+PROGRESS_EVERY_SEC = 5.0
+
+ENABLED = not os.environ.get("FFSANDBOX_NO_EVENTS")
+
+_LOGGER = logging.getLogger("ffsandbox.events")
+_LOGGER.propagate = False
+_LOGGER.setLevel(logging.INFO)
+
+_STATE = {"listener": None, "failed": False}
+_LOCK = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────────
+#  WRITER
+# ─────────────────────────────────────────────────────────────
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues the record untouched: JSON encoding happens on the
+    listener thread, not in the caller.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        entry.update(record.msg)
+        return json.dumps(entry, default=str)
+
+
+def events_file(pid=None):
+    """
+    This process's log file (another process's with pid).
+    """
+    return EVENTS_DIR / f"events-{pid or os.getpid()}.jsonl"
+
+
+def prune_logs(max_age=MAX_AGE_SEC):
+    """
+    Removes log files (and backups) not written for max_age seconds.
+    """
+    limit = time.time() - max_age
+    for f in EVENTS_DIR.glob("events*.jsonl*"):
+        try:
+            if f.stat().st_mtime < limit:
+                f.unlink()
+        except OSError:
+            pass
+
+
+def _start():
+    """
+    Attaches the queue handler and starts the writer thread (first emit).
+    """
+    with _LOCK:
+        if _STATE["listener"] is not None:
+            return True
+        if _STATE["failed"]:
+            return False
+        try:
+            EVENTS_DIR.mkdir(parents=True, exist_ok=True)
+            prune_logs()
+            file_handler = logging.handlers.RotatingFileHandler(
+                events_file(), maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8"
+            )
+        except OSError:
+            _STATE["failed"] = True  # no log dir: stay silent
+            return False
+
+        file_handler.setFormatter(_JsonFormatter())
+        q = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(q, file_handler)
+        listener.start()
+        _LOGGER.addHandler(_QueueHandler(q))
+        _STATE["listener"] = listener
+        atexit.register(stop)
+        return True
+
+
+def stop():
+    """
+    Flushes queued events and stops the writer thread.
+    """
+    with _LOCK:
+        listener = _STATE["listener"]
+        _STATE["listener"] = None
+    if listener is None:
+        return
+    listener.stop()
+    for h in listener.handlers:
+        h.close()
+    for h in list(_LOGGER.handlers):
+        _LOGGER.removeHandler(h)
+
+
+def emit(event, **fields):
+    """
+    emit("cmd_end", returncode=0, elapsed_sec=1.2)
+    Never raises; values that are not JSON types are written as str().
+    """
+    if not ENABLED:
+        return
+    if _STATE["listener"] is None and not _start():
+        return
+    fields["event"] = event
+    _LOGGER.info(fields)
+
+
+def logged_job(kind):
+    """
+    Decorator for top-level engine entry points: job_start / job_end
+    events (with ok, error and elapsed time) around the call.
+    """
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            job_id = uuid.uuid4().hex[:12]
+            emit("job_start", job=job_id, kind=kind, func=func.__name__)
+            t0 = time.perf_counter()
+            try:
+                res = func(*args, **kwargs)
+            except Exception as e:
+                emit("job_end", job=job_id, kind=kind, ok=False, error=f"{type(e).__name__}: {e}",
+                     elapsed_sec=round(time.perf_counter() - t0, 3))
+                raise
+            ok = isinstance(res, dict) and res.get("ok")
+            emit("job_end", job=job_id, kind=kind, ok=bool(ok),
+                 error=None if ok else (res or {}).get("error"),
+                 elapsed_sec=round(time.perf_counter() - t0, 3))
+            return res
+        return inner
+    return wrap
+
+
+# ─────────────────────────────────────────────────────────────
+#  READING
+# ─────────────────────────────────────────────────────────────
+def log_files():
+    """
+    Every process's file and rotated backups, oldest first (by last write).
+    """
+    files = []
+    for f in EVENTS_DIR.glob("events*.jsonl*"):
+        try:
+            files.append((f.stat().st_mtime, f))
+        except OSError:
+            pass  # pruned or rotated meanwhile
+    return [f for _, f in sorted(files)]
+
+
+def read_events(files=None, since=None, event=None):
+    """
+    Yields event dicts, file by file (processes interleave: sort by "ts"
+    for a timeline). since: ISO date/time prefix ("2026-01-01"); broken
+    lines (e.g. a crash mid-write) are skipped.
+    """
+    for path in files or log_files():
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue
+                if since and e.get("time", "") < since:
+                    continue
+                if event and e.get("event") != event:
+                    continue
+                yield e
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def recipe_stats(events):
+    """
+    Per-recipe throughput from "encode" events.
+    Return: {recipe_id: {"encodes", "failed", "frames", "encode_sec",
+    "fps", "fps_median", "fps_p10", "mb_out"}}
+    """
+    acc = {}
+    for e in events:
+        if e.get("event") != "encode":
+            continue
+        a = acc.setdefault(e.get("recipe_id"), {"encodes": 0, "failed": 0, "frames": 0,
+                                                 "encode_sec": 0.0, "kb": 0.0, "fps": []})
+        if not e.get("ok"):
+            a["failed"] += 1
+            continue
+        a["encodes"] += 1
+        frames, sec = e.get("frames") or 0, e.get("elapsed_sec") or 0
+        a["frames"] += frames
+        a["encode_sec"] += sec
+        a["kb"] += e.get("size_kb") or 0
+        if frames and sec:
+            a["fps"].append(frames / sec)
+
+    out = {}
+    for rid, a in sorted(acc.items(), key=lambda kv: str(kv[0])):
+        out[rid] = {
+            "encodes": a["encodes"],
+            "failed": a["failed"],
+            "frames": a["frames"],
+            "encode_sec": round(a["encode_sec"], 3),
+            "fps": round(a["frames"] / a["encode_sec"], 2) if a["encode_sec"] else None,
+            "fps_median": round(_percentile(a["fps"], 0.5), 2) if a["fps"] else None,
+            # slow tail: 10% of encodes were slower than this
+            "fps_p10": round(_percentile(a["fps"], 0.1), 2) if a["fps"] else None,
+            "mb_out": round(a["kb"] / 1024, 2),
+        }
+    return out
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.events")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_stats = sub.add_parser("stats", help="per-recipe throughput")
+    p_stats.add_argument("--since", help="ISO date/time, e.g. 2026-01-01")
+    p_stats.add_argument("--json", action="store_true")
+
+    p_tail = sub.add_parser("tail", help="last events")
+    p_tail.add_argument("-n", type=int, default=20)
+    p_tail.add_argument("--event", help="only this event type")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "tail":
+        last = sorted(read_events(event=args.event), key=lambda e: e.get("ts", 0))[-args.n:]
+        for e in last:
+            print(json.dumps(e))
+        return 0
+
+    stats = recipe_stats(read_events(since=args.since))
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return 0
+
+    if not stats:
+        print(f"No encode events in {EVENTS_DIR}")
+        return 0
+    print(f"{'recipe':20} {'encodes':>7} {'failed':>6} {'frames':>10} {'sec':>10} "
+          f"{'fps':>8} {'median':>8} {'p10':>8} {'MB out':>9}")
+    for rid, s in stats.items():
+        print(f"{str(rid):20} {s['encodes']:7} {s['failed']:6} {s['frames']:10} "
+              f"{s['encode_sec']:10.1f} {s['fps'] or 0:8.1f} {s['fps_median'] or 0:8.1f} "
+              f"{s['fps_p10'] or 0:8.1f} {s['mb_out']:9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,36 +1,16 @@
-import subprocess
+from .capabilities import get_capabilities
 
-def check_ffmpeg():
+
+def check_ffmpeg(refresh=False):
     """
     Checks whether 'ffmpeg' can be executed from PATH.
     Does not handle logs, does not display anything.
     Only returns ok/error for the GUI.
+    Backed by the capability registry: the binary is probed once and
+    cached (refresh=True forces a new probe).
     """
-    try:
-        # Run ffmpeg -version (discard output)
-        subprocess.run(
-            ["ffmpeg", "-version"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=True
-        )
-        return {"ok": True}
-
-    except FileNotFoundError:
-        return {
-            "ok": False,
-            "error": "FFmpeg not found in PATH."
-        }
-
-    except subprocess.CalledProcessError:
-        # ffmpeg found but error occurred (rare case)
-        return {
-            "ok": False,
-            "error": "FFmpeg found, but could not be executed."
-        }
+    res = get_capabilities(refresh=refresh)
+    if not res["ok"]:
+        return {"ok": False, "error": res["error"]}
 
-    except Exception as e:
-        return {
-            "ok": False,
-            "error": f"Error while running FFmpeg: {e}"
-        }
+    return {"ok": True, "version": res["data"].get("version")}
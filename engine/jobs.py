@@ -0,0 +1,314 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import deque
+
+from .cancel import CancelToken, timed_out_result
+from .progress import parse_stats_line
+
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# events kept per job (older ones are dropped; streams resume from what is left)
+MAX_EVENTS = 500
+
+# finished jobs kept for status queries
+KEEP_FINISHED = 200
+
+
+# ─────────────────────────────────────────────────────────────
+#  JOB
+# ─────────────────────────────────────────────────────────────
+class Job:
+    """
+    One queued pipeline call.
+    func(log, cancel) → result dict ({"ok", "error", "data"}).
+    Log lines and parsed ffmpeg stats are recorded as numbered events.
+    """
+
+    def __init__(self, kind, func, priority=0, label="", meta=None, cost=1, key=None,
+                 timeout=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label or kind
+        self.priority = priority
+        self.cost = max(1, cost)        # budget slots held while running
+        self.key = key                  # jobs with the same key never run together
+        self.timeout = timeout          # wall-clock limit (s) once running
+        self.func = func
+        self.meta = dict(meta or {})    # caller data shown in info()
+        self.cancel = CancelToken()
+
+        self.state = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.progress = None        # last ffmpeg stats
+        self.step = None            # last [INFO] description
+
+        self._events = deque(maxlen=MAX_EVENTS)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def _event(self, kind, payload):
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, kind, payload))
+            self._cond.notify_all()
+
+    def log(self, line):
+        """
+        log callback handed to the pipeline: keeps the line, extracts
+        progress from ffmpeg stats lines and the current step from [INFO].
+        """
+        if line.startswith("[FFMPEG] "):
+            stats = parse_stats_line(line[len("[FFMPEG] "):])
+            if stats:
+                self.progress = stats
+                self._event("progress", {"step": self.step, **stats})
+                return
+        elif line.startswith("[INFO] ") and not line.startswith("[INFO] Finished"):
+            self.step = line[len("[INFO] "):]
+
+        self._event("log", {"line": line})
+
+    def set_state(self, state):
+        self.state = state
+        if state == RUNNING:
+            self.started = time.time()
+        elif state in FINISHED_STATES:
+            self.finished = time.time()
+        self._event("state", {"state": state})
+
+    def events_after(self, seq, timeout=None):
+        """
+        Events with a number > seq; waits up to timeout for new ones.
+        Return: (events, finished)
+        """
+        with self._cond:
+            if self._seq <= seq and self.state not in FINISHED_STATES:
+                self._cond.wait(timeout)
+            events = [e for e in self._events if e[0] > seq]
+            return events, self.state in FINISHED_STATES
+
+    def info(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "priority": self.priority,
+            "cost": self.cost,
+            "state": self.state,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "step": self.step,
+            "progress": self.progress,
+            "error": (self.result or {}).get("error"),
+            **self.meta,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+#  QUEUE
+# ─────────────────────────────────────────────────────────────
+class JobQueue:
+    """
+    Bounded worker pool over a priority queue (higher priority first,
+    FIFO within a priority). submit() refuses work once max_queued jobs
+    are waiting and returns a retry hint instead.
+    budget: resource slots shared by running jobs (None → only the worker
+    count limits). The next job starts once its cost fits; it is never
+    overtaken by cheaper lower-priority jobs, and a job costing more than
+    the whole budget runs alone.
+    key: jobs sharing a key (e.g. an output folder) run one at a time;
+    a queued job whose key is busy is passed over, not waited on.
+    """
+
+    def __init__(self, workers=2, max_queued=16, log=None, budget=None):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.log = log
+        self.budget = budget
+
+        self._heap = []
+        self._jobs = {}
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._running = 0
+        self._used = 0
+        self._keys = set()      # keys of running jobs
+        self._durations = deque(maxlen=20)
+        self._closed = False
+
+        for i in range(self.workers):
+            threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True).start()
+
+    def _log(self, msg):
+        if self.log:
+            self.log(msg)
+
+    def retry_after(self):
+        """
+        Seconds until a queue slot is likely free (avg job time × queue / workers).
+        """
+        with self._cond:
+            avg = sum(self._durations) / len(self._durations) if self._durations else 30.0
+            waiting = len(self._heap)
+        return max(1, int(avg * max(1, waiting - self.max_queued + 1) / self.workers))
+
+    def set_budget(self, budget):
+        """
+        Changes the slot budget; waiting jobs start at once if they now fit.
+        """
+        with self._cond:
+            self.budget = budget
+            self._cond.notify_all()
+
+    def submit(self, kind, func, priority=0, label="", meta=None, cost=1, key=None, timeout=None):
+        """
+        cost: budget slots the job holds while running. key: see class doc.
+        timeout: wall-clock seconds from start; the job is then cancelled
+        and fails as timed out.
+        Return: {"ok": True, "data": Job} or
+                {"ok": False, "error": "Queue full", "data": {"retry_after": s}}
+        """
+        with self._cond:
+            full = self._closed or len(self._heap) >= self.max_queued
+
+        if full:
+            return {"ok": False, "error": "Queue full", "data": {"retry_after": self.retry_after()}}
+
+        job = Job(kind, func, priority, label, meta, cost, key, timeout)
+        with self._cond:
+            self._jobs[job.id] = job
+            self._log(f"[JOBS] Queued {job.label} ({job.id}, priority {priority})")
+            heapq.heappush(self._heap, (-priority, next(self._order), job))
+            self._cond.notify_all()
+        return {"ok": True, "error": None, "data": job}
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """
+        Queued → dropped at once; running → its ffmpeg processes are stopped.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False
+
+        job.cancel.cancel()
+        with self._cond:
+            if job.state == QUEUED:
+                self._heap = [e for e in self._heap if e[2] is not job]
+                heapq.heapify(self._heap)
+                job.result = {"ok": False, "error": "Cancelled", "data": None}
+                job.set_state(CANCELLED)
+                self._cond.notify_all()     # the next job may fit now
+        return True
+
+    def stats(self):
+        with self._cond:
+            states = [j.state for j in self._jobs.values()]
+            return {
+                "workers": self.workers,
+                "budget": self.budget,
+                "used": self._used,
+                "running": self._running,
+                "queued": len(self._heap),
+                "max_queued": self.max_queued,
+                "done": states.count(DONE),
+                "failed": states.count(FAILED),
+                "cancelled": states.count(CANCELLED),
+            }
+
+    def close(self, cancel_running=False):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if cancel_running:
+            for job in self.jobs():
+                if job.state in (QUEUED, RUNNING):
+                    self.cancel(job.id)
+
+    def _prune(self):
+        # caller holds self._cond
+        finished = [j for j in self._jobs.values() if j.state in FINISHED_STATES]
+        for job in sorted(finished, key=lambda j: j.finished)[:-KEEP_FINISHED]:
+            self._jobs.pop(job.id, None)
+
+    def _fits(self, job):
+        # caller holds self._cond
+        return self.budget is None or self._used == 0 or self._used + job.cost <= self.budget
+
+    def _next(self):
+        """
+        Heap entry to start now, or None. Jobs whose key is busy are
+        skipped; the first other job must fit the budget.
+        """
+        # caller holds self._cond
+        for entry in sorted(self._heap):
+            job = entry[2]
+            if job.key is not None and job.key in self._keys:
+                continue
+            return entry if self._fits(job) else None
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                entry = self._next()
+                while entry is None:
+                    if self._closed and not self._heap:
+                        return
+                    # closing still drains through _next(): keys and budget hold
+                    self._cond.wait()
+                    entry = self._next()
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                job = entry[2]
+                self._running += 1
+                self._used += job.cost
+                if job.key is not None:
+                    self._keys.add(job.key)
+                job.set_state(RUNNING)
+
+            self._log(f"[JOBS] Started {job.label} ({job.id})")
+            timer = job.cancel.cancel_after(job.timeout) if job.timeout else None
+            try:
+                result = job.func(job.log, job.cancel)
+            except Exception as e:
+                result = {"ok": False, "error": f"Job error: {e}", "data": None}
+            finally:
+                if timer:
+                    timer.cancel()
+
+            if job.cancel.timed_out:
+                result = timed_out_result(job.timeout)
+            job.result = result
+            if job.cancel.timed_out:
+                state = FAILED
+            elif job.cancel.cancelled:
+                state = CANCELLED
+            else:
+                state = DONE if result.get("ok") else FAILED
+
+            with self._cond:
+                self._running -= 1
+                self._used -= job.cost
+                self._keys.discard(job.key)
+                self._durations.append(time.time() - job.started)
+                job.set_state(state)
+                self._prune()
+                self._cond.notify_all()     # freed slots
+            self._log(f"[JOBS] {state.capitalize()} {job.label} ({job.id})")
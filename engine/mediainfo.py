@@ -0,0 +1,298 @@
+import bisect
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .capabilities import CACHE_DIR
+from .progress import time_to_seconds
+from .events import emit
+
+
+# One JSON file per probed input (keyed by path + mtime + size)
+MEDIAINFO_DIR = CACHE_DIR / "mediainfo"
+
+# bumped when the probed fields change: older entries are then ignored
+# (2: per-stream bit_rate)
+CACHE_VERSION = 2
+
+# in-process memo: identity key → info dict (least recently used dropped)
+MEMO_MAX = 256
+_MEMO = OrderedDict()
+_LOCK = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────────
+#  FFPROBE
+# ─────────────────────────────────────────────────────────────
+def _rate(value):
+    """
+    "30000/1001" → 29.97, "0/0" → None
+    """
+    try:
+        num, den = str(value).split("/")
+        return float(num) / float(den) if float(den) else None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _num(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _ffprobe(args):
+    """
+    Runs ffprobe → {"ok": True, "data": stdout} or {"ok": False, "error": "..."}
+    """
+    try:
+        result = subprocess.run(["ffprobe", "-v", "error", *args], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True, check=True)
+    except FileNotFoundError:
+        return {"ok": False, "error": "ffprobe not found in PATH.", "data": None}
+    except subprocess.CalledProcessError as e:
+        return {"ok": False, "error": f"ffprobe failed: {e.stderr.strip()}", "data": None}
+    return {"ok": True, "error": None, "data": result.stdout}
+
+
+def _stream_info(s):
+    info = {
+        "index": s.get("index"),
+        "type": s.get("codec_type"),
+        "codec": s.get("codec_name"),
+        "language": (s.get("tags") or {}).get("language"),
+        "bit_rate": _num(s.get("bit_rate"), int),
+    }
+    if s.get("codec_type") == "video":
+        info.update({
+            "width": _num(s.get("width"), int),
+            "height": _num(s.get("height"), int),
+            "pix_fmt": s.get("pix_fmt"),
+            "fps": _rate(s.get("avg_frame_rate")) or _rate(s.get("r_frame_rate")),
+        })
+    elif s.get("codec_type") == "audio":
+        info.update({
+            "sample_rate": _num(s.get("sample_rate"), int),
+            "channels": _num(s.get("channels"), int),
+        })
+    return info
+
+
+def probe_format(path):
+    """
+    One ffprobe call: container + streams. The first video stream's values
+    are also copied to the top level (fps, frames, width, height, codec, pix_fmt).
+    """
+    res = _ffprobe(["-print_format", "json", "-show_format", "-show_streams", str(path)])
+    if not res["ok"]:
+        return res
+    try:
+        info = json.loads(res["data"])
+    except ValueError as e:
+        return {"ok": False, "error": f"Invalid ffprobe output: {e}", "data": None}
+
+    fmt = info.get("format", {})
+    raw_streams = info.get("streams", [])
+    video = next((s for s in raw_streams if s.get("codec_type") == "video"), {})
+
+    duration = _num(fmt.get("duration")) or _num(video.get("duration"))
+    fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate"))
+    frames = _num(video.get("nb_frames"), int)
+    if not frames and duration and fps:
+        frames = int(round(duration * fps))
+
+    size = _num(fmt.get("size"), int) or Path(path).stat().st_size
+    bit_rate = _num(fmt.get("bit_rate"), int)
+    if not bit_rate and duration:
+        bit_rate = int(size * 8 / duration)
+
+    return {
+        "ok": True,
+        "error": None,
+        "data": {
+            "path": str(path),
+            "duration": duration,
+            "size": size,
+            "bit_rate": bit_rate,
+            "fps": fps,
+            "frames": frames,
+            "width": _num(video.get("width"), int),
+            "height": _num(video.get("height"), int),
+            "codec": video.get("codec_name"),
+            "pix_fmt": video.get("pix_fmt"),
+            "streams": [_stream_info(s) for s in raw_streams],
+        }
+    }
+
+
+def probe_keyframes(path):
+    """
+    Keyframe timestamps (s) of the first video stream, from packet flags
+    (demux only, no decoding).
+    """
+    res = _ffprobe(["-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+                    "-of", "csv=p=0", str(path)])
+    if not res["ok"]:
+        return res
+
+    times = []
+    for line in res["data"].splitlines():
+        pts, _, flags = line.partition(",")
+        t = _num(pts)
+        if t is not None and "K" in flags:
+            times.append(t)
+
+    return {"ok": True, "error": None, "data": sorted(times)}
+
+
+# ─────────────────────────────────────────────────────────────
+#  CACHE
+# ─────────────────────────────────────────────────────────────
+def _identity(path):
+    st = Path(path).stat()
+    return f"{CACHE_VERSION}|{os.path.realpath(path)}|{st.st_mtime_ns}|{st.st_size}"
+
+
+def _cache_file(key):
+    return MEDIAINFO_DIR / (hashlib.sha256(key.encode("utf-8")).hexdigest()[:24] + ".json")
+
+
+def _read_cache(key):
+    try:
+        entry = json.loads(_cache_file(key).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return entry.get("data") if entry.get("key") == key else None
+
+
+def _write_cache(key, data):
+    try:
+        MEDIAINFO_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = _cache_file(key).with_suffix(".tmp")
+        tmp.write_text(json.dumps({"key": key, "data": data}), encoding="utf-8")
+        tmp.replace(_cache_file(key))
+    except OSError:
+        pass  # cache is best effort
+
+
+def media_info(path, keyframes=False, cache=True, refresh=False):
+    """
+    Probes an input once and reuses the result while the file is unchanged
+    (same path, mtime and size): in-process memo + one JSON per file in
+    the cache dir. keyframes=True also fills data["keyframes"] (probed
+    on first request). cache=False probes without caching (temp files).
+    Return: {"ok": True, "data": {...}} or {"ok": False, "error": "..."}
+    """
+    path = Path(path)
+    if not path.is_file():
+        return {"ok": False, "error": f"Input not found: {path}", "data": None}
+
+    key = _identity(path)
+
+    data = None
+    if cache and not refresh:
+        with _LOCK:
+            data = _MEMO.get(key)
+            if data is not None:
+                _MEMO.move_to_end(key)
+    if data is None and cache and not refresh:
+        data = _read_cache(key)
+        if data is not None:
+            emit("cache", cache="mediainfo", hit=True, path=str(path))
+
+    changed = False
+    if data is None:
+        emit("cache", cache="mediainfo", hit=False, path=str(path))
+        res = probe_format(path)
+        if not res["ok"]:
+            return res
+        data = res["data"]
+        changed = True
+
+    if keyframes and data.get("keyframes") is None:
+        res = probe_keyframes(path)
+        if not res["ok"]:
+            return res
+        data = {**data, "keyframes": res["data"]}
+        changed = True
+
+    if cache:
+        with _LOCK:
+            _MEMO[key] = data
+            _MEMO.move_to_end(key)
+            while len(_MEMO) > MEMO_MAX:
+                _MEMO.popitem(last=False)
+        if changed:
+            _write_cache(key, data)
+
+    return {"ok": True, "error": None, "data": data}
+
+
+def probe_media(path, cache=True):
+    """
+    Duration, size, bitrate, streams and the first video stream's
+    frame rate / frame count / resolution (cached, see media_info).
+    """
+    return media_info(path, cache=cache)
+
+
+# ─────────────────────────────────────────────────────────────
+#  HELPERS
+# ─────────────────────────────────────────────────────────────
+def keyframe_before(keyframes, t):
+    """
+    Last keyframe time <= t (where a stream-copy cut starting at t begins).
+    """
+    if not keyframes:
+        return None
+    i = bisect.bisect_right(keyframes, t)
+    return keyframes[i - 1] if i else keyframes[0]
+
+
+def validate_starts(input_file, starts, duration=None):
+    """
+    Checks start times against the input's duration before any ffmpeg runs.
+    Inputs ffprobe cannot read are not checked (ffmpeg reports errors then).
+    Return: {"ok": True} or {"ok": False, "error": "..."}
+    """
+    info = media_info(input_file)
+    total = info["data"]["duration"] if info["ok"] else None
+
+    for start in starts:
+        sec = time_to_seconds(start)
+        if sec is None or sec < 0:
+            return {"ok": False, "error": f"Invalid start time: {start}"}
+        if total and sec >= total:
+            return {
+                "ok": False,
+                "error": f"Start {start} is beyond the end of {Path(input_file).name} ({total:.2f}s)."
+            }
+
+    dur = time_to_seconds(duration) if duration is not None else None
+    if duration is not None and (dur is None or dur <= 0):
+        return {"ok": False, "error": f"Invalid duration: {duration}"}
+
+    return {"ok": True}
+
+
+def sort_by_workload(paths):
+    """
+    Longest inputs first (duration, else file size): with several jobs at
+    once the batch then ends with short files instead of one long straggler.
+    Return: list of indexes into paths.
+    """
+    def _weight(i):
+        info = media_info(paths[i])
+        if info["ok"] and info["data"]["duration"]:
+            return (1, info["data"]["duration"])
+        try:
+            return (0, Path(paths[i]).stat().st_size)
+        except OSError:
+            return (0, 0)
+
+    return sorted(range(len(paths)), key=_weight, reverse=True)
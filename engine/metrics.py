@@ -1,7 +1,11 @@
-import subprocess
-import shlex
 import time
 from pathlib import Path
+from .run_command import run_command
+from .mediainfo import probe_media
+
+
+# ladder rungs are scaled back to the reference size with this before PSNR/SSIM
+METRIC_SCALER = "bicubic"
 
 
 # ======================
@@ -15,40 +19,97 @@ def get_size(path):
 
 
 # ======================
-# PSNR
+# RESOLUTION
 # ======================
-def calc_psnr(original, encoded):
-    cmd = [
+def video_size(path):
+    """
+    (width, height) of the first video stream, or None.
+    """
+    info = probe_media(path, cache=False)
+    if not info["ok"] or not info["data"].get("width"):
+        return None
+    return info["data"]["width"], info["data"]["height"]
+
+
+def metric_scale(ref_size, enc_size):
+    """
+    Size the encode is scaled to before comparing: the reference size when
+    the encode has another resolution (ladder rung), else None.
+    """
+    return ref_size if ref_size and enc_size and ref_size != enc_size else None
+
+
+def size_label(size):
+    return f"{size[0]}x{size[1]}" if size else None
+
+
+# ======================
+# COMMAND / PARSERS
+# ======================
+def build_metric_cmd(original, encoded, metric, size=None):
+    """
+    metric: "psnr" or "ssim" (any two-input lavfi filter).
+    size: (w, h) → the encode is scaled to it first (see metric_scale).
+    """
+    lavfi = metric
+    if size:
+        lavfi = f"[1:v]scale={size[0]}:{size[1]}:flags={METRIC_SCALER}[enc];[0:v][enc]{metric}"
+    return [
         "ffmpeg",
         "-i", str(original),
         "-i", str(encoded),
-        "-lavfi", "psnr",
+        "-lavfi", lavfi,
         "-f", "null", "-"
     ]
 
-    try:
-        result = subprocess.run(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-        log = result.stderr
-
-        for line in log.splitlines():
-
-            # Format lama: "average:36.18"
-            if "average:" in line:
-                try:
-                    return float(line.split("average:")[-1].split()[0])
-                except:
-                    pass
-
-            # Format baru: "psnr_avg:36.18"
-            if "psnr_avg:" in line:
-                try:
-                    return float(line.split("psnr_avg:")[-1].split()[0])
-                except:
-                    pass
-
-        # jika tetap tidak ketemu
-        return None
 
+def parse_psnr(lines):
+    for line in lines:
+
+        # Format lama: "average:36.18"
+        if "average:" in line:
+            try:
+                return float(line.split("average:")[-1].split()[0])
+            except:
+                pass
+
+        # Format baru: "psnr_avg:36.18"
+        if "psnr_avg:" in line:
+            try:
+                return float(line.split("psnr_avg:")[-1].split()[0])
+            except:
+                pass
+
+    # jika tetap tidak ketemu
+    return None
+
+
+def parse_ssim(lines):
+    """
+    Output format: "All:0.992..."
+    """
+    for line in lines:
+        if "All:" in line:
+            part = line.split("All:")[-1]
+            try:
+                return float(part.split()[0].strip())
+            except:
+                return None
+    return None
+
+
+def _run_metric(original, encoded, metric, cancel=None, timeout=None, size=None):
+    cmd = build_metric_cmd(original, encoded, metric, size)
+    result = run_command(cmd, cancel=cancel, timeout=timeout)
+    return (result.get("data") or {}).get("stdout_lines", [])
+
+
+# ======================
+# PSNR
+# ======================
+def calc_psnr(original, encoded, cancel=None, timeout=None, size=None):
+    try:
+        return parse_psnr(_run_metric(original, encoded, "psnr", cancel, timeout, size))
     except:
         return None
 
@@ -57,32 +118,16 @@ def calc_psnr(original, encoded):
 # ======================
 # SSIM
 # ======================
-def calc_ssim(original, encoded):
+def calc_ssim(original, encoded, cancel=None, timeout=None, size=None):
     """
     Menghitung SSIM menggunakan ffmpeg
     Output format: "All:0.992..."
     """
-    cmd = [
-        "ffmpeg",
-        "-i", str(original),
-        "-i", str(encoded),
-        "-lavfi", "ssim",
-        "-f", "null", "-"
-    ]
-
     try:
-        result = subprocess.run(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-        log = result.stderr
-
-        for line in log.splitlines():
-            if "All:" in line:
-                part = line.split("All:")[-1]
-                return float(part.split()[0].strip())
+        return parse_ssim(_run_metric(original, encoded, "ssim", cancel, timeout, size))
     except:
         return None
 
-    return None
-
 
 # ======================
 # MEASURE ENCODE TIME
@@ -1,25 +1,163 @@
+import threading
 from pathlib import Path
-from .proxy import proxy_multi
-from .encode import encode_multi, encode_single
-from .validator import load_and_validate_recipes
-from .utils import ensure_folder
-from .ffmpeg_check import check_ffmpeg
-from .metrics import get_size, calc_psnr, calc_ssim
-from .summary_csv import write_summary_csv
+from .proxy import proxy_single
+from .encode import encode_multi, encode_single, encode_fanout, select_recipes
+from .validator import check_recipes_supported
+from .recipes import load_and_validate_recipes
+from .utils import ensure_folder, parse_list
+from .capabilities import get_capabilities, missing_filters
+from .metrics import get_size, calc_psnr, calc_ssim, video_size, metric_scale, size_label
+from .summary_csv import write_summary_csv, write_bench_csv, bench_by_recipe, BENCH_COLUMNS
+from .mediainfo import probe_media, sort_by_workload, validate_starts
+from .cancel import is_cancelled, cancelled_result
+from .adaptive import make_controller, run_batch
+from .dataflow import Stage, run_stages
+from .events import logged_job
+
+
+# threads per test stage (proxy cutting is I/O bound, metrics decode twice)
+STAGE_WORKERS = {"proxy": 1, "encode": 1, "metrics": 2}
+
+# items waiting between stages (bounds proxies on disk)
+STAGE_QUEUE = 2
+
+
+# ───────────────────────────────────────────────
+# 0. SHARED ENTRY CHECKS
+# ───────────────────────────────────────────────
+def preflight(recipes_json, recipe_ids=None, filters=()):
+    """
+    Checks done before any work starts (shared by the sync and async
+    pipelines): cached ffmpeg capabilities, required filters, recipes
+    loaded/validated, selected recipes known and supported by the build.
+    Return: {"ok": True, "data": (capabilities, recipes)} or {"ok": False, "error": "..."}
+    """
+    # 1. CHECK FFMPEG FIRST (cached capability probe)
+    ff = get_capabilities()
+    if not ff["ok"]:
+        return {"ok": False, "error": ff["error"], "data": None}
+    caps = ff["data"]
+
+    missing = missing_filters(caps, filters)
+    if missing:
+        return {"ok": False, "error": f"FFmpeg build lacks filters: {missing}", "data": None}
+
+    # Load & validate recipes
+    v = load_and_validate_recipes(recipes_json, caps)
+    if not v["ok"]:
+        return {"ok": False, "error": v["error"], "data": None}
+
+    recipes = v["data"]
+
+    for rid in recipe_ids or []:
+        if rid not in recipes:
+            return {"ok": False, "error": f"Recipe '{rid}' not found", "data": None}
+
+    # Reject unsupported encoders before any work starts
+    sup = check_recipes_supported(recipes, caps, recipe_ids)
+    if not sup["ok"]:
+        return {"ok": False, "error": sup["error"], "data": None}
+
+    return {"ok": True, "error": None, "data": (caps, recipes)}
+
+
+def proxy_duration(proxy_file):
+    """
+    Actual proxy length in seconds (stream-copy cuts snap to keyframes), or None.
+    """
+    info = probe_media(proxy_file, cache=False)
+    return info["data"]["duration"] if info["ok"] else None
+
+
+def summary_row(idx, size_original, enc_data, psnr, ssim, duration=None, resolution=None):
+    """
+    One summary.csv row for an encode result's data dict.
+    resolution: "WxH" of the encode.
+    """
+    d = enc_data or {}
+    encoded_file = d.get("output_file")
+    bench = d.get("bench") or {}
+
+    return [
+        idx,                                             # proxy_index
+        d.get("recipe_id", "UNKNOWN"),                   # recipe_id
+        size_original,                                   # original proxy size (bytes)
+        get_size(encoded_file) if encoded_file else None,  # encoded file size (bytes)
+        # fan-out runs share one process → prefer the per-output encode time
+        d.get("encode_sec") or d.get("elapsed_sec"),     # encode duration (seconds)
+        psnr,
+        ssim,
+        duration,                                        # proxy duration (seconds)
+        d.get("frames"),                                 # frames encoded
+        resolution,                                      # encoded resolution ("WxH")
+        *(bench.get(key) for key in BENCH_COLUMNS),      # instrumented runs: per-stage timing
+        # video bitstream alone (bytes, from ffmpeg's final report)
+        round(d["video_kb"] * 1024) if d.get("video_kb") is not None else None,
+    ]
+
+
+def _merge_encodes(parts):
+    """
+    Several encode_multi/encode_fanout results for one proxy → one.
+    """
+    results = [r for part in parts for r in (part.get("data") or [])]
+    if any(part.get("error") == "Cancelled" for part in parts):
+        return {"ok": False, "error": "Cancelled", "data": results}
+    all_ok = all(part["ok"] for part in parts)
+    return {
+        "ok": all_ok,
+        "error": None if all_ok else "One or more encode operations failed.",
+        "data": results
+    }
 
 
 # ───────────────────────────────────────────────
 # 1. PROXY AND TEST
 # ───────────────────────────────────────────────
+@logged_job("test")
 def proxy_and_test(input_file, start_list, duration, recipes_json,
-                   pick=None, outdir="test_out", log=None, keep_proxy=False):
-
+                   pick=None, outdir="test_out", log=None, keep_proxy=False,
+                   fanout=False, cancel=None, timeout=None, concurrency=None,
+                   stage_workers=None, instrument=False, video_only=True):
+    """
+    cancel: optional CancelToken (stops running ffmpeg, skips queued work).
+    timeout: optional wall-clock limit per ffmpeg job (seconds).
+    concurrency: encodes per proxy run at once (int or "auto"), see encode_multi.
+    stage_workers: {"proxy", "encode", "metrics"} → threads per stage
+    (defaults: STAGE_WORKERS).
+    Ladder recipes ("scale") are always encoded together in one fan-out
+    (one decode scaled into every rung); their PSNR/SSIM is measured
+    after scaling the rung back to the proxy resolution.
+    instrument: run encodes with ffmpeg's -benchmark/-benchmark_all/
+    -stats_period; per-stage times go into summary.csv and per-recipe
+    totals into bench.csv.
+    video_only: proxies and encodes carry the first video stream only
+    (-map 0:v:0 -an -sn -dn), so sizes and I/O are not inflated by tracks
+    the metrics ignore. Apply always keeps audio.
+
+    Runs as a dataflow: proxy → encode → metrics → summary. Stages work
+    at the same time (clip 2 is cut while clip 1 encodes, PSNR/SSIM of
+    one encode run while the next encodes); bounded queues keep only a
+    few proxies on disk. Each proxy is deleted once its last metric is done.
+    """
+
+
+    # 1. CHECK FFMPEG + RECIPES FIRST
+    # metrics (and fan-out) need these filters in the local build
+    needed = ["psnr", "ssim"] + (["split"] if fanout else [])
+    pf = preflight(recipes_json, parse_list(pick, allow_none=True), needed)
+    if not pf["ok"]:
+        return pf
+    caps, recipes_dict = pf["data"]
+
+    # ladder rungs share one decode + scale graph even without fanout
+    selected = select_recipes(recipes_dict, pick)["data"]
+    ladder = [rid for rid, r in selected.items() if r.get("scale") is not None]
+    if len(ladder) > 1 and not fanout:
+        missing = missing_filters(caps, ["split", "scale"])
+        if missing:
+            return {"ok": False, "error": f"FFmpeg build lacks filters: {missing}", "data": None}
 
-    # 1. CHECK FFMPEG FIRST
-    ff = check_ffmpeg()
-    if not ff["ok"]:
-        return {"ok": False, "error": ff["error"], "data": None}
-    
     input_file = Path(input_file)
     outdir = Path(outdir)
 
@@ -27,88 +165,183 @@ def proxy_and_test(input_file, start_list, duration, recipes_json,
     if not input_file.is_file():
         return {"ok": False, "error": f"Input not found: {input_file}"}
 
-    # Load & validate recipes
-    v = load_and_validate_recipes(recipes_json)
-    if not v["ok"]:
-        return {"ok": False, "error": v["error"]}
+    starts = parse_list(start_list)
+    if not starts:
+        return {"ok": False, "error": "At least one start value is required.", "data": None}
 
-    recipes_dict = v["data"]
+    # every start is checked before the first ffmpeg runs
+    check = validate_starts(input_file, starts, duration)
+    if not check["ok"]:
+        return {"ok": False, "error": check["error"], "data": None}
 
     # Ensure output folder
     outdir.mkdir(parents=True, exist_ok=True)
 
-    # PROXY MULTI
-    proxy_pattern = outdir / "proxy.mp4"
-    proxy_res = proxy_multi(input_file, start_list, duration, proxy_pattern, log=log)
+    workers = {**STAGE_WORKERS, **(stage_workers or {})}
+    recipe_order = {rid: n for n, rid in enumerate(selected)}
 
-    if not proxy_res["ok"]:
-        return proxy_res  # pass-through error
+    proxy_list = {}
+    all_results = {}
+    outstanding = {}        # proxy index → metric items still to measure
+    lock = threading.Lock()
 
-    proxy_list = proxy_res["data"]
-
-    # TEST ENCODE FOR EACH PROXY
-    summary_rows = []
-    all_results = []
-
-    for p in proxy_list:
-        pdata = p["data"]
+    def _drop_proxy(proxy_file):
+        # remove the temporary proxy file after all tests for this proxy
+        if not keep_proxy:
+            Path(proxy_file).unlink(missing_ok=True)
+
+    # ─ stage 1: cut proxies
+    def _proxy(item, emit):
+        idx, start = item
+        output_file = outdir / f"proxy_{idx:02d}.mp4"
+
+        # queued work is skipped once cancelled
+        if is_cancelled(cancel):
+            res = cancelled_result(f"proxy {idx}")
+        else:
+            res = proxy_single(input_file, start, duration, output_file,
+                               log=log, cancel=cancel, timeout=timeout, video_only=video_only)
+        res["data"] = res.get("data") or {}
+        res["data"]["index"] = idx
+        proxy_list[idx] = res
+
+        if res["ok"]:
+            emit(res["data"])
+
+    # ─ stage 2: encode every recipe for one proxy
+    def _encode(pdata, emit):
         proxy_file = pdata["output_file"]
         idx = pdata["index"]
 
-        # get original proxy size (in bytes)
+        if is_cancelled(cancel):
+            _drop_proxy(proxy_file)
+            return
+
+        # get original proxy size (in bytes), length (seconds) and resolution
         size_original = get_size(proxy_file)
+        duration_original = proxy_duration(proxy_file)
+        ref_size = video_size(proxy_file)
 
         # create a dedicated output folder for this proxy index
         each_out = outdir / f"proxy_{idx:02d}"
         each_out.mkdir(parents=True, exist_ok=True)
 
         # run all recipes for this proxy clip
-        enc_res = encode_multi(
+        # (fanout → one ffmpeg process decodes the proxy once for all recipes;
+        #  ladder rungs always share one)
+        encode_args = dict(
             proxy_file=proxy_file,
-            recipes_dict=recipes_dict,
-            pick_raw=pick,
             outdir=each_out,
             log=log,
+            cancel=cancel,
+            timeout=timeout,
+            instrument=instrument,
+            video_only=video_only,
         )
-        all_results.append(enc_res)
-
-        for item in enc_res.get("data", []):
-            d = item.get("data", {})
-
-            recipe_id = d.get("recipe_id", "UNKNOWN")
-            encoded_file = d.get("output_file")
-            size_encoded = get_size(encoded_file) if encoded_file else None
-            encode_time = d.get("elapsed_sec")
-
-            # compute PSNR & SSIM between original proxy and encoded result
-            psnr = calc_psnr(proxy_file, encoded_file)
-            ssim = calc_ssim(proxy_file, encoded_file)
-
-            summary_rows.append([
-                idx,            # proxy_index
-                recipe_id,      # recipe_id
-                size_original,  # original proxy size (bytes)
-                size_encoded,   # encoded file size (bytes)
-                encode_time,    # encode duration (seconds)
-                psnr,
-                ssim,
-            ])
-
-        # remove the temporary proxy file after all tests for this proxy
-        if not keep_proxy:
+        if fanout:
+            enc_res = encode_fanout(recipes_dict=selected, **encode_args)
+        elif len(ladder) > 1:
+            parts = [encode_fanout(recipes_dict={rid: selected[rid] for rid in ladder}, **encode_args)]
+            rest = {rid: r for rid, r in selected.items() if rid not in ladder}
+            if rest:
+                parts.append(encode_multi(recipes_dict=rest, **encode_args, concurrency=concurrency))
+            enc_res = _merge_encodes(parts)
+        else:
+            enc_res = encode_multi(recipes_dict=selected, **encode_args, concurrency=concurrency)
+        all_results[idx] = enc_res
+
+        items = enc_res.get("data") or []
+        if not items:
+            _drop_proxy(proxy_file)
+            return
+
+        with lock:
+            outstanding[idx] = len(items)
+        for item in items:
+            emit((idx, proxy_file, size_original, duration_original, ref_size, item.get("data") or {}))
+
+    # ─ stage 3: PSNR & SSIM between original proxy and encoded result
+    def _metrics(work, emit):
+        idx, proxy_file, size_original, duration_original, ref_size, d = work
+
+        try:
+            if is_cancelled(cancel):
+                return
             try:
-                Path(proxy_file).unlink()
-            except OSError:
-                pass
-
+                encoded_file = d.get("output_file")
+                # rungs are compared at the proxy resolution
+                recipe = selected.get(d.get("recipe_id")) or {}
+                enc_size = video_size(encoded_file) if encoded_file and recipe.get("scale") is not None \
+                    else ref_size
+                scale_to = metric_scale(ref_size, enc_size)
+                psnr = calc_psnr(proxy_file, encoded_file, cancel, timeout, scale_to)
+                ssim = calc_ssim(proxy_file, encoded_file, cancel, timeout, scale_to)
+                row = summary_row(idx, size_original, d, psnr, ssim, duration_original,
+                                  size_label(enc_size))
+            except Exception as e:
+                # keep the encode in summary.csv, without metrics
+                if log:
+                    log(f"[ERROR] Metrics failed for {d.get('recipe_id')} (proxy {idx}): {e}")
+                row = summary_row(idx, size_original, d, None, None, duration_original)
+            if not is_cancelled(cancel):
+                emit((idx, recipe_order.get(d.get("recipe_id"), 0), row))
+        finally:
+            # the proxy goes once its last metric item is through, whatever happened
+            with lock:
+                outstanding[idx] -= 1
+                last = outstanding[idx] == 0
+            if last:
+                _drop_proxy(proxy_file)
+
+    # ─ stage 4: summary (rows collected in a fixed order)
+    def _summary(row, emit):
+        emit(row)
+
+    rows = run_stages(
+        list(enumerate(starts, start=1)),
+        [
+            Stage("proxy", _proxy, workers["proxy"], maxsize=STAGE_QUEUE),
+            Stage("encode", _encode, workers["encode"], maxsize=STAGE_QUEUE),
+            Stage("metrics", _metrics, workers["metrics"], maxsize=STAGE_QUEUE * 4),
+            Stage("summary", _summary, 1),
+        ],
+        log=log,
+    )
+    summary_rows = [row for _, _, row in sorted(rows, key=lambda r: r[:2])]
 
-    
     # Generate CSV (fail-safe)
     try:
         write_summary_csv(summary_rows, outdir)
     except:
         pass
 
+    bench = bench_by_recipe(summary_rows) if instrument else {}
+    if bench:
+        try:
+            write_bench_csv(bench, outdir)
+        except OSError:
+            pass
+        if log:
+            for rid, t in bench.items():
+                if not t["rtime"]:
+                    continue
+                log(f"[BENCH] {rid}: decode {t['decode_share']:.0%}, encode {t['encode_share']:.0%}, "
+                    f"other {t['other_share']:.0%} of {t['rtime']:.2f}s | user {t['utime']:.2f}s, "
+                    f"sys {t['stime']:.2f}s, peak RSS {(t['maxrss_kb'] or 0) / 1024:.0f} MB, "
+                    f"min fps {t['fps_min']}")
+
+    all_results = [all_results[i] for i in sorted(all_results)]
+    proxy_list = [proxy_list[i] for i in sorted(proxy_list)]
+
+    if is_cancelled(cancel):
+        return {"ok": False, "error": "Cancelled", "data": {"results": all_results}}
+
+    if not all(p["ok"] for p in proxy_list):
+        return {
+            "ok": False,
+            "error": "One or more proxies failed to be created.",
+            "data": proxy_list
+        }
 
     return {
         "ok": True,
@@ -116,6 +349,8 @@ def proxy_and_test(input_file, start_list, duration, recipes_json,
             "input": str(input_file),
             "proxies": proxy_list,
             "results": all_results,
+            "summary_rows": summary_rows,
+            "bench": bench,
             "output_folder": str(outdir),
         }
     }
@@ -124,29 +359,22 @@ def proxy_and_test(input_file, start_list, duration, recipes_json,
 # ───────────────────────────────────────────────
 # 2. APPLY SINGLE
 # ───────────────────────────────────────────────
+@logged_job("apply")
 def apply_single(input_file, recipe_id, recipes_json,
-                 output_file, log=None):
+                 output_file, log=None, cancel=None, timeout=None):
+
+    # 1. CHECK FFMPEG + RECIPE FIRST
+    pf = preflight(recipes_json, [recipe_id])
+    if not pf["ok"]:
+        return pf
+    _, recipes = pf["data"]
 
-    # 1. CHECK FFMPEG FIRST
-    ff = check_ffmpeg()
-    if not ff["ok"]:
-        return {"ok": False, "error": ff["error"], "data": None}
-    
     input_file = Path(input_file)
     output_file = Path(output_file)
 
     if not input_file.is_file():
         return {"ok": False, "error": f"Input not found: {input_file}"}
 
-    # Load recipes
-    v = load_and_validate_recipes(recipes_json)
-    if not v["ok"]:
-        return {"ok": False, "error": v["error"]}
-
-    recipes = v["data"]
-    if recipe_id not in recipes:
-        return {"ok": False, "error": f"Recipe '{recipe_id}' not found"}
-
     recipe = recipes[recipe_id]
 
     # encode full video
@@ -155,63 +383,84 @@ def apply_single(input_file, recipe_id, recipes_json,
         recipe_id=recipe_id,
         recipe_dict=recipe,
         output_file=output_file,
-        log=log
+        log=log,
+        cancel=cancel,
+        timeout=timeout
     )
 
 
 # ───────────────────────────────────────────────
 # 3. APPLY MULTI
 # ───────────────────────────────────────────────
-def apply_multi(input_files, recipe_id, recipes_json,
-                output_dir, log=None):
-
-    # 1. CHECK FFMPEG FIRST
-    ff = check_ffmpeg()
-    if not ff["ok"]:
-        return {"ok": False, "error": ff["error"], "data": None}
-    
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    # Load recipe
-    v = load_and_validate_recipes(recipes_json)
-    if not v["ok"]:
-        return v
+def apply_file(infile, recipe_id, recipe, output_dir, log=None, cancel=None, timeout=None,
+               threads=None, progress=None):
+    """
+    One file of a batch apply (recipe already preflighted):
+    <output_dir>/<stem>_<recipe_id>.mp4
+    """
+    infile_path = Path(infile)
+
+    if not infile_path.is_file():
+        return {
+            "ok": False,
+            "error": f"Input not found: {infile_path}",
+            "data": None
+        }
 
-    recipes = v["data"]
-    if recipe_id not in recipes:
-        return {"ok": False, "error": f"Recipe '{recipe_id}' not found"}
+    out_name = infile_path.stem + "_" + recipe_id + ".mp4"
+    out_file = Path(output_dir) / out_name
 
-    recipe = recipes[recipe_id]
+    return encode_single(
+        proxy_file=infile_path,
+        recipe_id=recipe_id,
+        recipe_dict=recipe,
+        output_file=out_file,
+        log=log,
+        cancel=cancel,
+        timeout=timeout,
+        threads=threads,
+        progress=progress
+    )
 
-    results = []
 
-    for infile in input_files:
-        infile_path = Path(infile)
+@logged_job("apply_multi")
+def apply_multi(input_files, recipe_id, recipes_json,
+                output_dir, log=None, cancel=None, timeout=None, concurrency=None):
+    """
+    concurrency: None/1 → one file at a time, int → fixed, "auto" → adaptive.
+    """
 
-        if not infile_path.is_file():
-            results.append({
-                "ok": False,
-                "error": f"Input not found: {infile_path}",
-                "data": None
-            })
-            continue
+    # 1. CHECK FFMPEG + RECIPE FIRST
+    pf = preflight(recipes_json, [recipe_id])
+    if not pf["ok"]:
+        return pf
+    _, recipes = pf["data"]
 
-        out_name = infile_path.stem + "_" + recipe_id + ".mp4"
-        out_file = output_dir / out_name
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
 
-        res = encode_single(
-            proxy_file=infile_path,
-            recipe_id=recipe_id,
-            recipe_dict=recipe,
-            output_file=out_file,
-            log=log
-        )
+    recipe = recipes[recipe_id]
 
-        results.append(res)
+    def _job(infile, threads, progress):
+        return apply_file(infile, recipe_id, recipe, output_dir, log=log, cancel=cancel,
+                          timeout=timeout, threads=threads, progress=progress)
+
+    # longest files first (cached ffprobe info) so the batch does not end
+    # on one long straggler; results keep input order.
+    # queued files are skipped once cancelled
+    input_files = list(input_files)
+    order = sort_by_workload(input_files)
+    ordered = run_batch([input_files[i] for i in order], _job,
+                        make_controller(concurrency, log), cancel)
+    results = [None] * len(input_files)
+    for i, res in zip(order, ordered):
+        results[i] = res
 
     all_ok = all(r["ok"] for r in results)
 
+    if is_cancelled(cancel):
+        return {"ok": False, "data": results, "error": "Cancelled"}
+
     return {
         "ok": all_ok,
         "data": results,
@@ -0,0 +1,301 @@
+import asyncio
+from pathlib import Path
+
+from .async_exec import AsyncExecutor
+from .proxy import prepare_proxy, finish_proxy
+from .encode import prepare_encode, finish_encode, select_recipes, first_pass_for, encode_fanout
+from .capabilities import missing_filters
+from .metrics import build_metric_cmd, parse_psnr, parse_ssim, get_size
+from .metrics import video_size, metric_scale, size_label
+from .pipeline import preflight, summary_row, proxy_duration
+from .summary_csv import write_summary_csv
+from .utils import parse_list, parse_output_pattern
+from .mediainfo import validate_starts, sort_by_workload
+
+
+# ───────────────────────────────────────────────
+# JOB HELPERS (one ffmpeg process each)
+# ───────────────────────────────────────────────
+def _progress_for(progress, label):
+    if not progress:
+        return None
+    return lambda stats: progress(label, stats)
+
+
+async def proxy_single_async(executor, input_file, start, duration, output_file,
+                             log=None, progress=None, video_only=False, cancel=None):
+    prep = prepare_proxy(input_file, start, duration, output_file, video_only)
+    if not prep["ok"]:
+        return prep
+
+    desc = f"Create proxy: start={start}, duration={duration}"
+    result = await executor.run(prep["data"], desc, log_callback=log,
+                                progress_callback=_progress_for(progress, desc), cancel=cancel)
+    return finish_proxy(result, output_file)
+
+
+async def encode_single_async(executor, proxy_file, recipe_id, recipe_dict, output_file,
+                              log=None, progress=None, video_only=False, cancel=None):
+    # pass 1 of two-pass recipes (blocking, shared/cached) off the event loop,
+    # counted against the executor's limit
+    fp = await executor.run_blocking(first_pass_for, proxy_file, recipe_dict, log,
+                                     cancel, executor.timeout)
+    if not fp["ok"]:
+        return fp
+    first_pass = fp["data"]
+
+    prep = prepare_encode(proxy_file, recipe_dict, output_file,
+                          passlog=first_pass["prefix"] if first_pass else None,
+                          video_only=video_only)
+    if not prep["ok"]:
+        return prep
+
+    desc = f"Encode using recipe '{recipe_id}'"
+    result = await executor.run(prep["data"], desc, log_callback=log,
+                                progress_callback=_progress_for(progress, desc), cancel=cancel)
+    return finish_encode(result, output_file, recipe_id, first_pass)
+
+
+async def calc_metric_async(executor, original, encoded, metric, size=None, cancel=None):
+    """
+    metric: "psnr" or "ssim". Returns the value or None (like calc_psnr/calc_ssim).
+    """
+    if not encoded:
+        return None
+
+    result = await executor.run(build_metric_cmd(original, encoded, metric, size), cancel=cancel)
+    lines = (result.get("data") or {}).get("stdout_lines", [])
+
+    return parse_psnr(lines) if metric == "psnr" else parse_ssim(lines)
+
+
+# ───────────────────────────────────────────────
+# 1. PROXY AND TEST (async)
+# ───────────────────────────────────────────────
+async def proxy_and_test_async(input_file, start_list, duration, recipes_json,
+                               pick=None, outdir="test_out", log=None, keep_proxy=False,
+                               executor=None, progress=None, video_only=True, cancel=None):
+    """
+    Async variant of pipeline.proxy_and_test.
+    All proxies, encodes and metrics are scheduled on one event loop and
+    limited only by the executor's concurrency (default: CPU count).
+    Each proxy's encodes start as soon as that proxy exists, and its
+    metrics as soon as each encode finishes. Ladder rungs share one
+    fan-out process per proxy (one decode, as in proxy_and_test).
+    progress(label, stats) receives live ffmpeg stats per job.
+    video_only: see pipeline.proxy_and_test.
+    """
+    executor = executor or AsyncExecutor()
+
+    pf = preflight(recipes_json, parse_list(pick, allow_none=True), ["psnr", "ssim"])
+    if not pf["ok"]:
+        return pf
+    caps, recipes_dict = pf["data"]
+
+    selected = select_recipes(recipes_dict, pick)["data"]
+    ladder = {rid: r for rid, r in selected.items() if r.get("scale") is not None}
+    if len(ladder) < 2:
+        ladder = {}
+    else:
+        missing = missing_filters(caps, ["split", "scale"])
+        if missing:
+            return {"ok": False, "error": f"FFmpeg build lacks filters: {missing}", "data": None}
+
+    input_file = Path(input_file)
+    outdir = Path(outdir)
+
+    if not input_file.is_file():
+        return {"ok": False, "error": f"Input not found: {input_file}"}
+
+    starts = parse_list(start_list)
+    if not starts:
+        return {"ok": False, "error": "At least one start value is required.", "data": None}
+
+    check = await asyncio.to_thread(validate_starts, input_file, starts, duration)
+    if not check["ok"]:
+        return {"ok": False, "error": check["error"], "data": None}
+
+    outdir.mkdir(parents=True, exist_ok=True)
+    parent, stem, suffix = parse_output_pattern(outdir / "proxy.mp4")
+
+    async def _measure(proxy_file, ref_size, recipe, res):
+        encoded = (res.get("data") or {}).get("output_file")
+        # ladder rungs are compared at the proxy resolution
+        enc_size = ref_size
+        if encoded and recipe.get("scale") is not None:
+            enc_size = await asyncio.to_thread(video_size, encoded)
+        scale_to = metric_scale(ref_size, enc_size)
+        psnr, ssim = await asyncio.gather(
+            calc_metric_async(executor, proxy_file, encoded, "psnr", scale_to, cancel),
+            calc_metric_async(executor, proxy_file, encoded, "ssim", scale_to, cancel),
+        )
+        return res, psnr, ssim, size_label(enc_size)
+
+    async def _encode_and_measure(proxy_file, ref_size, recipe_id, recipe, each_out):
+        res = await encode_single_async(
+            executor, proxy_file, recipe_id, recipe, each_out / f"{recipe_id}.mp4",
+            log=log, progress=progress, video_only=video_only, cancel=cancel
+        )
+        return await _measure(proxy_file, ref_size, recipe, res)
+
+    async def _ladder_and_measure(proxy_file, ref_size, each_out):
+        fan = await executor.run_blocking(
+            encode_fanout, proxy_file, recipes_dict=ladder, outdir=each_out, log=log,
+            cancel=cancel, timeout=executor.timeout, video_only=video_only
+        )
+        by_id = {(r.get("data") or {}).get("recipe_id"): r for r in fan.get("data") or []}
+        failed = {"ok": False, "error": fan.get("error"), "data": None}
+        return await asyncio.gather(*[
+            _measure(proxy_file, ref_size, recipe, by_id.get(rid, failed))
+            for rid, recipe in ladder.items()
+        ])
+
+    async def _test_proxy(idx, start):
+        proxy_file = parent / f"{stem}_{idx:02d}{suffix}"
+        pres = await proxy_single_async(executor, input_file, start, duration, proxy_file,
+                                        log=log, progress=progress, video_only=video_only,
+                                        cancel=cancel)
+        pres["data"] = pres.get("data") or {}
+        pres["data"]["index"] = idx
+
+        if not pres["ok"]:
+            return pres, None, []
+
+        size_original = get_size(proxy_file)
+        duration_original = await asyncio.to_thread(proxy_duration, proxy_file)
+        ref_size = await asyncio.to_thread(video_size, proxy_file)
+        each_out = outdir / f"proxy_{idx:02d}"
+        each_out.mkdir(parents=True, exist_ok=True)
+
+        try:
+            single = [rid for rid in selected if rid not in ladder]
+            jobs = [_encode_and_measure(proxy_file, ref_size, rid, selected[rid], each_out)
+                    for rid in single]
+            if ladder:
+                jobs.append(_ladder_and_measure(proxy_file, ref_size, each_out))
+            done = await asyncio.gather(*jobs)
+            if ladder:
+                done = done[:-1] + list(done[-1])
+            # back to recipe order
+            by_rid = dict(zip(single + list(ladder), done))
+            measured = [by_rid[rid] for rid in selected]
+        finally:
+            # remove the temporary proxy file after all tests for this proxy
+            if not keep_proxy:
+                try:
+                    Path(proxy_file).unlink()
+                except OSError:
+                    pass
+
+        results = [m[0] for m in measured]
+        all_ok = all(r["ok"] for r in results)
+        enc_res = {
+            "ok": all_ok,
+            "error": None if all_ok else "One or more encode operations failed.",
+            "data": results
+        }
+        rows = [summary_row(idx, size_original, r.get("data"), psnr, ssim, duration_original,
+                            resolution)
+                for r, psnr, ssim, resolution in measured]
+        return pres, enc_res, rows
+
+    per_proxy = await asyncio.gather(*[
+        _test_proxy(idx, start) for idx, start in enumerate(starts, start=1)
+    ])
+
+    proxy_list = [p[0] for p in per_proxy]
+    if not all(p["ok"] for p in proxy_list):
+        return {
+            "ok": False,
+            "error": "One or more proxies failed to be created.",
+            "data": proxy_list
+        }
+
+    summary_rows = [row for p in per_proxy for row in p[2]]
+
+    # Generate CSV (fail-safe)
+    try:
+        write_summary_csv(summary_rows, outdir)
+    except:
+        pass
+
+    return {
+        "ok": True,
+        "data": {
+            "input": str(input_file),
+            "proxies": proxy_list,
+            "results": [p[1] for p in per_proxy],
+            "output_folder": str(outdir),
+        }
+    }
+
+
+# ───────────────────────────────────────────────
+# 2. APPLY SINGLE (async)
+# ───────────────────────────────────────────────
+async def apply_single_async(input_file, recipe_id, recipes_json,
+                             output_file, log=None, executor=None, progress=None, cancel=None):
+    executor = executor or AsyncExecutor()
+
+    pf = preflight(recipes_json, [recipe_id])
+    if not pf["ok"]:
+        return pf
+    _, recipes = pf["data"]
+
+    input_file = Path(input_file)
+    if not input_file.is_file():
+        return {"ok": False, "error": f"Input not found: {input_file}"}
+
+    return await encode_single_async(
+        executor, input_file, recipe_id, recipes[recipe_id], output_file,
+        log=log, progress=progress, cancel=cancel
+    )
+
+
+# ───────────────────────────────────────────────
+# 3. APPLY MULTI (async)
+# ───────────────────────────────────────────────
+async def apply_multi_async(input_files, recipe_id, recipes_json,
+                            output_dir, log=None, executor=None, progress=None, cancel=None):
+    """
+    Async variant of pipeline.apply_multi: all files are encoded
+    concurrently, bounded by the executor. Result order follows input order.
+    """
+    executor = executor or AsyncExecutor()
+
+    pf = preflight(recipes_json, [recipe_id])
+    if not pf["ok"]:
+        return pf
+    _, recipes = pf["data"]
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    recipe = recipes[recipe_id]
+
+    async def _one(infile):
+        infile_path = Path(infile)
+        if not infile_path.is_file():
+            return {"ok": False, "error": f"Input not found: {infile_path}", "data": None}
+
+        out_file = output_dir / (infile_path.stem + "_" + recipe_id + ".mp4")
+        return await encode_single_async(
+            executor, infile_path, recipe_id, recipe, out_file,
+            log=log, progress=progress, cancel=cancel
+        )
+
+    # longest files take the executor slots first; results keep input order
+    input_files = list(input_files)
+    order = await asyncio.to_thread(sort_by_workload, input_files)
+    done = await asyncio.gather(*[_one(input_files[i]) for i in order])
+    results = [None] * len(input_files)
+    for i, res in zip(order, done):
+        results[i] = res
+
+    all_ok = all(r["ok"] for r in results)
+
+    return {
+        "ok": all_ok,
+        "data": list(results),
+        "error": None if all_ok else "Some files failed to process."
+    }
@@ -0,0 +1,164 @@
+import math
+from pathlib import Path
+
+from .mediainfo import probe_media
+from .summary_csv import read_summary_csv, encoded_size, source_size
+
+
+# relative half-width used when only one proxy sample exists
+SINGLE_SAMPLE_BAND = 0.25
+
+
+# ─────────────────────────────────────────────────────────────
+#  WEIGHTED STATS
+# ─────────────────────────────────────────────────────────────
+def _weighted_mean_band(values, weights):
+    """
+    Weighted mean and ~95% band (mean ± 2·s/√n_eff).
+    """
+    total_w = sum(weights)
+    mean = sum(v * w for v, w in zip(values, weights)) / total_w
+
+    if len(values) < 2:
+        half = abs(mean) * SINGLE_SAMPLE_BAND
+        return mean, mean - half, mean + half
+
+    var = sum(w * (v - mean) ** 2 for v, w in zip(values, weights)) / total_w
+    n_eff = total_w ** 2 / sum(w * w for w in weights)
+    half = 2 * math.sqrt(var) / math.sqrt(n_eff)
+    return mean, max(0.0, mean - half), mean + half
+
+
+def _complexity_weight(proxy_bitrate, full_bitrate):
+    """
+    Proxies whose source bitrate (a cheap complexity measure) is close to
+    the whole title's average weigh more than outliers (e.g. black intros).
+    """
+    if not proxy_bitrate or not full_bitrate:
+        return 1.0
+    return 1.0 / (1.0 + abs(math.log(proxy_bitrate / full_bitrate)))
+
+
+def _video_bytes(media):
+    """
+    Bytes of the input's video stream(s), from stream bitrates: the video
+    bitrate, else the size minus the other streams. None when unknown.
+    """
+    duration, size = media.get("duration"), media.get("size")
+    streams = media.get("streams") or []
+    if not duration or not size:
+        return None
+
+    video = [s.get("bit_rate") for s in streams if s.get("type") == "video"]
+    if video and all(video):
+        return min(size, int(sum(video) * duration / 8))
+
+    other = [s.get("bit_rate") for s in streams if s.get("type") != "video"]
+    if other and all(other):
+        return max(0, size - int(sum(other) * duration / 8))
+    return None if other else size
+
+
+# ─────────────────────────────────────────────────────────────
+#  PREDICTION
+# ─────────────────────────────────────────────────────────────
+def recipe_samples(rows, recipe_id):
+    """
+    Usable per-proxy samples of one recipe from summary rows.
+    """
+    samples = []
+    for r in rows:
+        if r.get("recipe_id") != recipe_id:
+            continue
+
+        dur = r.get("proxy_duration")
+        size_o, size_e = source_size(r), encoded_size(r)
+        t, frames = r.get("encode_time"), r.get("frames")
+        if not (dur and size_o and size_e and t and frames):
+            continue
+
+        samples.append({
+            "src_bitrate": size_o * 8 / dur,
+            "ratio": size_e / size_o,              # encoded / source video bitrate
+            "sec_per_frame": t / frames,
+        })
+    return samples
+
+
+def predict_apply(input_file, rows, recipe_id):
+    """
+    Projects proxy test results of one recipe onto a full input file.
+    rows: summary rows (read_summary_csv) from a proxy_and_test run.
+    Return data: estimated encode time (s) and output size (bytes), each
+    with a low/high band, plus the number of proxy samples used.
+    The size ratio applies to the input's video bytes; other streams are
+    copied by apply and added unchanged.
+    """
+    samples = recipe_samples(rows, recipe_id)
+    if not samples:
+        return {"ok": False, "error": f"No usable test results for recipe '{recipe_id}'.", "data": None}
+
+    info = probe_media(input_file)
+    if not info["ok"]:
+        return info
+    media = info["data"]
+
+    if not media["duration"] or not media["frames"]:
+        return {"ok": False, "error": f"Cannot read duration/frames of {input_file}", "data": None}
+
+    size = media["size"]
+    video = _video_bytes(media)
+    if video is None:
+        video = size        # stream sizes unknown: whole file as video
+    rest = size - video
+
+    full_bitrate = video * 8 / media["duration"]
+    weights = [_complexity_weight(s["src_bitrate"], full_bitrate) for s in samples]
+
+    ratio, ratio_lo, ratio_hi = _weighted_mean_band([s["ratio"] for s in samples], weights)
+    spf, spf_lo, spf_hi = _weighted_mean_band([s["sec_per_frame"] for s in samples], weights)
+
+    frames = media["frames"]
+
+    return {
+        "ok": True,
+        "error": None,
+        "data": {
+            "input": str(input_file),
+            "recipe_id": recipe_id,
+            "samples": len(samples),
+            "duration": media["duration"],
+            "frames": frames,
+            "size_bytes": int(video * ratio + rest),
+            "size_low": int(video * ratio_lo + rest),
+            "size_high": int(video * ratio_hi + rest),
+            "time_sec": round(frames * spf, 1),
+            "time_low": round(frames * spf_lo, 1),
+            "time_high": round(frames * spf_hi, 1),
+        }
+    }
+
+
+def predict_batch(input_files, summary_csv, recipe_id):
+    """
+    Estimates for a whole apply batch (per file + totals).
+    """
+    try:
+        rows = read_summary_csv(summary_csv)
+    except (OSError, ValueError) as e:
+        return {"ok": False, "error": f"Cannot read {summary_csv}: {e}", "data": None}
+
+    per_file = []
+    for f in input_files:
+        res = predict_apply(f, rows, recipe_id)
+        if not res["ok"]:
+            return res
+        per_file.append(res["data"])
+
+    totals = {
+        key: sum(p[key] for p in per_file)
+        for key in ("size_bytes", "size_low", "size_high", "time_sec", "time_low", "time_high")
+    }
+
+    return {"ok": True, "error": None, "data": {"files": per_file, "total": totals,
+                                               "summary": str(Path(summary_csv))}}
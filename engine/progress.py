@@ -0,0 +1,233 @@
+import re
+
+
+# ─────────────────────────────────────────────────────────────
+#  STATS LINE  ("frame=  120 fps= 48 q=28.0 size= 512kB time=00:00:04.00 ...")
+# ─────────────────────────────────────────────────────────────
+_STATS_FIELD_RE = re.compile(r"(\w+)=\s*(\S+)")
+
+# "bench: utime=1.234s stime=0.056s rtime=1.300s" / "bench: maxrss=51200KiB"  (-benchmark)
+_BENCH_TOTAL_RE = re.compile(r"(utime|stime|rtime|maxrss)=\s*([\d.]+)\s*(s|kB|KiB)?")
+
+# "[out#0/mp4 @ 0x..] video:120KiB audio:10KiB subtitle:0KiB ..."  (end of run;
+# ffmpeg < 7: one line without the prefix, summed over all outputs)
+_STREAM_SIZES_RE = re.compile(
+    r"video:\s*([\d.]+)\s*(?:KiB|kB)\s+audio:\s*([\d.]+)\s*(?:KiB|kB)\s+subtitle:\s*([\d.]+)"
+)
+_OUT_PREFIX_RE = re.compile(r"\[out#(\d+)/")
+
+# "bench: 1234 user 56 sys 1300 real encode_video 1.0"  (-benchmark_all, microseconds)
+_BENCH_STAGE_RE = re.compile(
+    r"^bench:\s*(\d+)\s+user\s+(\d+)\s+sys\s+(\d+)\s+real\s+(.+?)\s*$"
+)
+
+
+def time_to_seconds(value):
+    """
+    Converts ffmpeg time strings → seconds.
+    "00:00:04.00" → 4.0, "4.5" → 4.5, "N/A" → None.
+    """
+    if value is None:
+        return None
+
+    s = str(value).strip()
+    if not s or s == "N/A":
+        return None
+
+    try:
+        if ":" not in s:
+            return float(s)
+
+        total = 0.0
+        for part in s.split(":"):
+            total = total * 60 + float(part)
+        return total
+    except ValueError:
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(str(value).rstrip("x"))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_stats_line(line):
+    """
+    Parses one ffmpeg stats line.
+    Return: {"frame", "fps", "time_sec", "speed"} or None if not a stats line.
+    """
+    line = line.strip()
+    if not line.startswith("frame="):
+        return None
+
+    fields = dict(_STATS_FIELD_RE.findall(line))
+
+    frame = _to_float(fields.get("frame"))
+    return {
+        "frame": int(frame) if frame is not None else None,
+        "fps": _to_float(fields.get("fps")),
+        "time_sec": time_to_seconds(fields.get("time")),
+        "speed": _to_float(fields.get("speed")),
+    }
+
+
+def last_stats(lines):
+    """
+    Returns the last parsed stats line of a run (final frame count / fps), or None.
+    """
+    for line in reversed(lines or []):
+        stats = parse_stats_line(line)
+        if stats:
+            return stats
+    return None
+
+
+def parse_stream_sizes(lines, output_index=None):
+    """
+    Per-type payload sizes from ffmpeg's final report (bitstream only,
+    without container overhead).
+    output_index: one output of a multi-output run; needs ffmpeg >= 7
+    (per-output reports), otherwise None.
+    Return: {"video_kb", "audio_kb", "subtitle_kb"} or None.
+    """
+    for line in reversed(lines or []):
+        m = _STREAM_SIZES_RE.search(line)
+        if not m:
+            continue
+        out = _OUT_PREFIX_RE.search(line)
+        if output_index is not None and (out is None or int(out.group(1)) != output_index):
+            continue
+        video, audio, subtitle = (float(v) for v in m.groups())
+        return {"video_kb": video, "audio_kb": audio, "subtitle_kb": subtitle}
+    return None
+
+
+# ─────────────────────────────────────────────────────────────
+#  BENCHMARK LINES  (-benchmark_all)
+# ─────────────────────────────────────────────────────────────
+def parse_bench_stages(lines):
+    """
+    Sums -benchmark_all lines per stage label.
+    Values are reported by ffmpeg in microseconds and returned in seconds.
+    Return: {"encode_video 1.0": {"user": s, "sys": s, "real": s, "count": n}, ...}
+    """
+    stages = {}
+
+    for line in lines or []:
+        m = _BENCH_STAGE_RE.match(line.strip())
+        if not m:
+            continue
+
+        user, sys_, real, label = m.groups()
+        st = stages.setdefault(label, {"user": 0.0, "sys": 0.0, "real": 0.0, "count": 0})
+        st["user"] += int(user) / 1e6
+        st["sys"] += int(sys_) / 1e6
+        st["real"] += int(real) / 1e6
+        st["count"] += 1
+
+    for st in stages.values():
+        for key in ("user", "sys", "real"):
+            st[key] = round(st[key], 6)
+
+    return stages
+
+
+def output_encode_seconds(stages, output_index):
+    """
+    Real time spent encoding streams of one output file (index = output order).
+    Return: seconds or None when the output has no benchmark samples.
+    """
+    total = None
+    prefix = f"{output_index}."
+
+    for label, st in stages.items():
+        if not label.startswith("encode_"):
+            continue
+        parts = label.split()
+        if len(parts) == 2 and parts[1].startswith(prefix):
+            total = (total or 0.0) + st["real"]
+
+    return round(total, 6) if total is not None else None
+
+
+def parse_benchmark(lines):
+    """
+    Process totals printed by -benchmark at the end of a run.
+    Return: {"utime", "stime", "rtime" (seconds), "maxrss_kb"} or None.
+    """
+    found = {}
+    for line in lines or []:
+        line = line.strip()
+        if not line.startswith("bench:") or " user " in line:
+            continue
+        for key, val, _unit in _BENCH_TOTAL_RE.findall(line):
+            found[key] = float(val)
+
+    if not found:
+        return None
+
+    return {
+        "utime": found.get("utime"),
+        "stime": found.get("stime"),
+        "rtime": found.get("rtime"),
+        "maxrss_kb": int(found["maxrss"]) if "maxrss" in found else None,
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+#  PER-STAGE BREAKDOWN  (-benchmark -benchmark_all -stats_period)
+# ─────────────────────────────────────────────────────────────
+def _stage_of(label):
+    # "decode_video 0.0" → decode, "encode_video 1.0" / "flush_video 1.0" → encode
+    kind = label.split("_", 1)[0]
+    return "encode" if kind == "flush" else kind
+
+
+def interval_fps(lines, period):
+    """
+    Frames per second between consecutive stats lines printed every
+    `period` seconds (-stats_period). The closing line is printed when the
+    run ends, not on the period, so its interval is left out.
+    """
+    frames = [s["frame"] for s in map(parse_stats_line, lines or []) if s and s["frame"] is not None]
+    return [(b - a) / period for a, b in zip(frames[:-2], frames[1:-1])]
+
+
+def bench_breakdown(lines, output_index=None, stats_period=None):
+    """
+    Where the time of an instrumented run went.
+    decode_sec / encode_sec: real time in decoder / encoder calls
+    (encode_sec of one output when output_index is given, fan-out);
+    other_sec: the rest of rtime (startup, demux, filters, mux).
+    fps_min / fps_median: per -stats_period interval (stalls show up here,
+    not in the average fps).
+    Return: {"utime", "stime", "rtime", "maxrss_kb", "decode_sec",
+    "encode_sec", "other_sec", "fps_min", "fps_median"} (None when missing)
+    """
+    totals = parse_benchmark(lines) or {}
+    stages = parse_bench_stages(lines)
+
+    decode = sum(st["real"] for label, st in stages.items() if _stage_of(label) == "decode")
+    encode_all = sum(st["real"] for label, st in stages.items() if _stage_of(label) == "encode")
+    if output_index is None:
+        encode = encode_all
+    else:
+        encode = sum(st["real"] for label, st in stages.items()
+                     if _stage_of(label) == "encode" and label.split()[-1].startswith(f"{output_index}."))
+
+    rtime = totals.get("rtime")
+    fps = sorted(interval_fps(lines, stats_period)) if stats_period else []
+
+    return {
+        "utime": totals.get("utime"),
+        "stime": totals.get("stime"),
+        "rtime": rtime,
+        "maxrss_kb": totals.get("maxrss_kb"),
+        "decode_sec": round(decode, 6) if stages else None,
+        "encode_sec": round(encode, 6) if stages else None,
+        "other_sec": round(max(0.0, rtime - decode - encode_all), 6) if stages and rtime else None,
+        "fps_min": round(fps[0], 2) if fps else None,
+        "fps_median": round(fps[len(fps) // 2], 2) if fps else None,
+    }
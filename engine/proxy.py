@@ -1,12 +1,25 @@
 from pathlib import Path
 from .utils import ensure_folder, parse_list, parse_output_pattern
 from .run_command import run_command
+from .cancel import is_cancelled, cancelled_result, discard_partial
+from .mediainfo import validate_starts
+
+
+# drops every non-video stream (proxies and encodes of a test)
+VIDEO_ONLY_ARGS = ["-an", "-sn", "-dn"]
 
 
 # ─────────────────────────────────────────────────────────────
 #  PROXY (single)
 # ─────────────────────────────────────────────────────────────
-def proxy_single(input_file, start, duration, output_file, log=None):
+def prepare_proxy(input_file, start, duration, output_file, video_only=False):
+    """
+    Validates paths and builds the proxy command (shared by the sync and
+    async executors).
+    video_only: cut the first video stream only (test proxies: metrics and
+    test encodes ignore audio, subtitle and data tracks).
+    Return: {"ok": True, "data": cmd_list} or {"ok": False, "error": "..."}
+    """
     input_file = Path(input_file)
     output_file = Path(output_file)
 
@@ -18,7 +31,12 @@ def proxy_single(input_file, start, duration, output_file, log=None):
             "data": None
         }
 
-    # 2. Ensure output folder exists
+    # 2. Start inside the input (cached ffprobe info)
+    check = validate_starts(input_file, [start], duration)
+    if not check["ok"]:
+        return {"ok": False, "error": check["error"], "data": None}
+
+    # 3. Ensure output folder exists
     folder_ok = ensure_folder(output_file.parent)
     if not folder_ok["ok"]:
         return {
@@ -27,37 +45,59 @@ def proxy_single(input_file, start, duration, output_file, log=None):
             "data": None
         }
 
-    # 3. Build command
+    # 4. Build command
     cmd = [
         "ffmpeg", "-y",
         "-ss", str(start),
         "-i", str(input_file),
         "-t", str(duration),
-        "-c", "copy",
-        str(output_file)
     ]
+    if video_only:
+        cmd.extend(["-map", "0:v:0"] + VIDEO_ONLY_ARGS)
+    cmd.extend(["-c", "copy", str(output_file)])
 
-    desc = f"Create proxy: start={start}, duration={duration}"
-    result = run_command(cmd, desc, log_callback=log)
+    return {"ok": True, "data": cmd}
 
-    # 4. If failed → return as is
+
+def finish_proxy(result, output_file):
+    """
+    Adds output metadata to a run_command result.
+    """
+    # 5. If failed → drop partial output (cancel/timeout) and return as is
     if not result["ok"]:
+        discard_partial(result, output_file)
         return result
 
-    # 5. Calculate file size
+    output_file = Path(output_file)
+
+    # 6. Calculate file size
     size_kb = output_file.stat().st_size / 1024 if output_file.exists() else None
 
-    # 6. Return universal result
+    # 7. Return universal result
     result["data"]["output_file"] = str(output_file)
     result["data"]["size_kb"] = round(size_kb, 2) if size_kb else None
     return result
 
 
+def proxy_single(input_file, start, duration, output_file, log=None,
+                 cancel=None, timeout=None, video_only=False):
+    prep = prepare_proxy(input_file, start, duration, output_file, video_only)
+    if not prep["ok"]:
+        return prep
+
+    desc = f"Create proxy: start={start}, duration={duration}"
+    result = run_command(prep["data"], desc, log_callback=log,
+                         cancel=cancel, timeout=timeout)
+
+    return finish_proxy(result, output_file)
+
+
 
 # ─────────────────────────────────────────────────────────────
 #  PROXY (multi)
 # ─────────────────────────────────────────────────────────────
-def proxy_multi(input_file, starts_raw, duration, out_pattern, log=None):
+def proxy_multi(input_file, starts_raw, duration, out_pattern, log=None,
+                cancel=None, timeout=None, video_only=False):
     # 1. Parse start list
     starts = parse_list(starts_raw)
     if not starts:
@@ -67,22 +107,34 @@ def proxy_multi(input_file, starts_raw, duration, out_pattern, log=None):
             "data": None
         }
 
-    # 2. Parse pattern
+    # 2. Check every start before the first ffmpeg runs
+    check = validate_starts(input_file, starts, duration)
+    if not check["ok"]:
+        return {"ok": False, "error": check["error"], "data": None}
+
+    # 3. Parse pattern
     parent, stem, suffix = parse_output_pattern(out_pattern)
 
     results = []
 
-    # 3. Loop
+    # 4. Loop
     for idx, start in enumerate(starts, start=1):
         output_file = parent / f"{stem}_{idx:02d}{suffix}"
 
-        res = proxy_single(
-            input_file=input_file,
-            start=start,
-            duration=duration,
-            output_file=output_file,
-            log=log
-        )
+        # queued work is skipped once cancelled
+        if is_cancelled(cancel):
+            res = cancelled_result(f"proxy {idx}")
+        else:
+            res = proxy_single(
+                input_file=input_file,
+                start=start,
+                duration=duration,
+                output_file=output_file,
+                log=log,
+                cancel=cancel,
+                timeout=timeout,
+                video_only=video_only
+            )
 
         # Add index metadata
         res["data"] = res.get("data", {})
@@ -90,9 +142,12 @@ def proxy_multi(input_file, starts_raw, duration, out_pattern, log=None):
 
         results.append(res)
 
-    # 4. Combine ok / error status
+    # 5. Combine ok / error status
     all_ok = all(r["ok"] for r in results)
 
+    if is_cancelled(cancel):
+        return {"ok": False, "error": "Cancelled", "data": results}
+
     return {
         "ok": all_ok,
         "error": None if all_ok else "One or more proxies failed to be created.",
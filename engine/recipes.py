@@ -0,0 +1,208 @@
+import copy
+import hashlib
+import json
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+
+from .encode import recipe_args
+from .validator import validate_recipe
+
+
+# Recipe IDs starting with this prefix are templates: usable via
+# "extends" but never listed, validated on their own or encoded.
+TEMPLATE_PREFIX = "_"
+
+# resolved path → ((mtime_ns, size, capabilities signature), result)
+_CACHE = {}
+_LOCK = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────────
+#  COMPILED RECIPE
+# ─────────────────────────────────────────────────────────────
+@dataclass(frozen=True, eq=False)
+class CompiledRecipe(Mapping):
+    """
+    Immutable, fully resolved recipe.
+    Behaves like the recipe dict (read-only) and additionally carries
+    the precomputed ffmpeg video argv and a stable content hash.
+    """
+    recipe_id: str
+    config: Mapping
+    argv: tuple
+    recipe_hash: str
+
+    def __getitem__(self, key):
+        return self.config[key]
+
+    def __iter__(self):
+        return iter(self.config)
+
+    def __len__(self):
+        return len(self.config)
+
+    def to_dict(self):
+        return copy.deepcopy(dict(self.config))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    return value
+
+
+def compile_recipe(recipe_id, config):
+    """
+    Resolved recipe dict → CompiledRecipe.
+    The hash only depends on the encoding-relevant content, not on the ID.
+    """
+    argv = tuple(recipe_args(config))
+    canonical = json.dumps({"config": config, "argv": argv}, sort_keys=True)
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+    return CompiledRecipe(
+        recipe_id=recipe_id,
+        config=_freeze(copy.deepcopy(config)),
+        argv=argv,
+        recipe_hash=digest,
+    )
+
+
+# ─────────────────────────────────────────────────────────────
+#  EXTENDS / TEMPLATES
+# ─────────────────────────────────────────────────────────────
+def _merge(base, override):
+    merged = copy.deepcopy(base)
+    for key, val in override.items():
+        if key == "extends":
+            continue
+        if val is None:
+            # "key": null removes an inherited key
+            merged.pop(key, None)
+        elif key == "options" and isinstance(val, dict) and isinstance(merged.get(key), dict):
+            options = {**merged[key], **val}
+            merged[key] = {k: v for k, v in options.items() if v is not None}
+        else:
+            merged[key] = copy.deepcopy(val)
+    return merged
+
+
+def resolve_recipes(raw):
+    """
+    Resolves "extends" (a recipe/template ID or a list of them, applied
+    left to right, own keys last).
+    Return: {"ok": True, "data": {id: dict}} (templates included).
+    """
+    resolved = {}
+
+    def _resolve(rid, chain):
+        if rid in resolved:
+            return {"ok": True, "data": resolved[rid]}
+        if rid in chain:
+            return {"ok": False, "error": f"Recipe '{rid}': circular extends ({' → '.join(chain + [rid])})."}
+        if rid not in raw:
+            return {"ok": False, "error": f"Recipe '{chain[-1]}' extends unknown recipe '{rid}'."}
+
+        config = raw[rid]
+        if not isinstance(config, dict):
+            return {"ok": False, "error": f"Recipe '{rid}' is not a dictionary object."}
+
+        parents = config.get("extends") or []
+        if isinstance(parents, str):
+            parents = [parents]
+        if not isinstance(parents, list):
+            return {"ok": False, "error": f"Recipe '{rid}': extends must be an ID or a list of IDs."}
+
+        merged = {}
+        for parent in parents:
+            res = _resolve(parent, chain + [rid])
+            if not res["ok"]:
+                return res
+            merged = _merge(merged, res["data"])
+
+        merged = _merge(merged, config)
+        resolved[rid] = merged
+        return {"ok": True, "data": merged}
+
+    for rid in raw:
+        res = _resolve(rid, [])
+        if not res["ok"]:
+            return res
+
+    return {"ok": True, "data": resolved}
+
+
+# ─────────────────────────────────────────────────────────────
+#  LOAD (cached by mtime)
+# ─────────────────────────────────────────────────────────────
+def _caps_signature(capabilities):
+    if not capabilities:
+        return None
+    return (capabilities.get("binary"), capabilities.get("version"),
+            tuple(sorted(capabilities.get("encoders", {}))))
+
+
+def _load(path, capabilities):
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except Exception as e:
+        return {"ok": False, "error": f"Invalid JSON: {e}"}
+
+    # Basic structure must be a dict
+    if not isinstance(raw, dict):
+        return {"ok": False, "error": "recipes.json must be a dictionary {id: {...}}."}
+
+    res = resolve_recipes(raw)
+    if not res["ok"]:
+        return res
+
+    compiled = {}
+    for rid, config in res["data"].items():
+        if rid.startswith(TEMPLATE_PREFIX):
+            continue
+
+        v = validate_recipe(rid, config, capabilities)
+        if not v["ok"]:
+            return v
+
+        compiled[rid] = compile_recipe(rid, config)
+
+    return {"ok": True, "data": compiled}
+
+
+def load_and_validate_recipes(path, capabilities=None):
+    """
+    Loads, resolves, validates and compiles recipes.json.
+    The result is cached until the file's mtime/size changes, so every
+    pipeline entry, batch runner and the GUI share one compiled set.
+    Return: {"ok": True, "data": {id: CompiledRecipe}} or {"ok": False, "error": "..."}
+    """
+    path = Path(path)
+
+    if not path.is_file():
+        return {"ok": False, "error": f"recipes.json not found: {path}"}
+
+    try:
+        key = str(path.resolve())
+        st = path.stat()
+    except OSError as e:
+        return {"ok": False, "error": f"recipes.json not readable: {e}"}
+
+    stamp = (st.st_mtime_ns, st.st_size, _caps_signature(capabilities))
+
+    with _LOCK:
+        cached = _CACHE.get(key)
+        if cached and cached[0] == stamp:
+            res = cached[1]
+        else:
+            res = _load(path, capabilities)
+            _CACHE[key] = (stamp, res)
+
+    # copy the outer dict so callers may filter it freely
+    if res["ok"]:
+        return {"ok": True, "data": dict(res["data"])}
+    return dict(res)
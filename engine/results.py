@@ -0,0 +1,123 @@
+from pathlib import Path
+
+from .summary_csv import read_summary_csv, encoded_size, source_size
+
+
+# Columns of a loaded result row (tuple, in this order)
+COLUMNS = [
+    "run",
+    "proxy_index",
+    "recipe_id",
+    "resolution",
+    "size_kb",
+    "bitrate_kbps",
+    "ratio",
+    "encode_time",
+    "fps",
+    "psnr",
+    "ssim",
+]
+
+_COL = {name: i for i, name in enumerate(COLUMNS)}
+
+
+def summary_files(path):
+    """
+    A summary.csv, or the summary.csv files under a folder (a folder with
+    its own summary.csv is not searched further: sampling runs keep
+    per-round copies below the combined one).
+    """
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    if (path / "summary.csv").is_file():
+        return [path / "summary.csv"]
+    return sorted(path.rglob("summary.csv")) if path.is_dir() else []
+
+
+def _row(run, r):
+    size = encoded_size(r)
+    orig = source_size(r)
+    dur = r.get("proxy_duration")
+    t = r.get("encode_time")
+    frames = r.get("frames")
+    return (
+        run,
+        r.get("proxy_index"),
+        r.get("recipe_id"),
+        r.get("resolution"),
+        round(size / 1024, 1) if size else None,
+        round(size * 8 / dur / 1000, 1) if size and dur else None,
+        round(size / orig, 4) if size and orig else None,
+        t,
+        round(frames / t, 2) if frames and t else None,
+        r.get("psnr"),
+        r.get("ssim"),
+    )
+
+
+def load_results(path):
+    """
+    Loads every summary.csv at path into rows of COLUMNS (with derived
+    size in KB, bitrate, size ratio and fps).
+    Return data: {"rows": [tuple, ...], "files": [...], "recipes": [...]}
+    """
+    files = summary_files(path)
+    if not files:
+        return {"ok": False, "error": f"No summary.csv found at {path}", "data": None}
+
+    base = Path(path) if Path(path).is_dir() else Path(path).parent
+    rows = []
+    try:
+        for f in files:
+            run = str(f.parent.relative_to(base)) if f.parent != base else f.parent.name
+            rows.extend(_row(run, r) for r in read_summary_csv(f))
+    except (OSError, ValueError) as e:
+        return {"ok": False, "error": f"Cannot read results: {e}", "data": None}
+
+    recipes = sorted({r[_COL["recipe_id"]] for r in rows if r[_COL["recipe_id"]] is not None}, key=str)
+    return {
+        "ok": True,
+        "error": None,
+        "data": {"rows": rows, "files": [str(f) for f in files], "recipes": recipes},
+    }
+
+
+def query(rows, recipe=None, size_min=None, size_max=None, psnr_min=None, ssim_min=None,
+          sort_col=None, descending=False):
+    """
+    Filters and sorts without copying rows.
+    size_*: KB. Rows missing a filtered value are excluded; when sorting,
+    rows without a value go last in either direction.
+    Return: list of row indexes.
+    """
+    ri, si, pi, qi = _COL["recipe_id"], _COL["size_kb"], _COL["psnr"], _COL["ssim"]
+
+    def keep(r):
+        if recipe is not None and r[ri] != recipe:
+            return False
+        if size_min is not None and (r[si] is None or r[si] < size_min):
+            return False
+        if size_max is not None and (r[si] is None or r[si] > size_max):
+            return False
+        if psnr_min is not None and (r[pi] is None or r[pi] < psnr_min):
+            return False
+        if ssim_min is not None and (r[qi] is None or r[qi] < ssim_min):
+            return False
+        return True
+
+    filtered = recipe is not None or any(v is not None for v in (size_min, size_max, psnr_min, ssim_min))
+    idx = [i for i, r in enumerate(rows) if keep(r)] if filtered else list(range(len(rows)))
+
+    if sort_col is None:
+        return idx
+
+    c = _COL[sort_col]
+    present = [i for i in idx if rows[i][c] is not None]
+    missing = [i for i in idx if rows[i][c] is None]
+    # mixed types (e.g. numeric recipe IDs) compare as strings
+    try:
+        present.sort(key=lambda i: rows[i][c], reverse=descending)
+    except TypeError:
+        present.sort(key=lambda i: str(rows[i][c]), reverse=descending)
+    return present + missing
@@ -1,14 +1,23 @@
 import subprocess
+import threading
 import time
 import shlex
 
+from . import cancel as cancel_mod
+from .progress import parse_stats_line
+from .events import emit, PROGRESS_EVERY_SEC
 
-def run_command(cmd_list, desc="", log_callback=None):
+
+def run_command(cmd_list, desc="", log_callback=None, cancel=None, timeout=None,
+                progress_callback=None):
     """
     Main executor: runs ffmpeg, provides real-time logs for the GUI,
     measures execution time, and returns results in a universal format.
     Does not check ffmpeg. If ffmpeg is not available, Popen will raise
     an error and it is handled as a generic error.
+    cancel: optional CancelToken → cancel() terminates the process.
+    timeout: optional wall-clock limit in seconds → the process is killed.
+    progress_callback(stats_dict): called for every parsed ffmpeg stats line.
     """
 
     def _log(msg):
@@ -17,13 +26,35 @@ def run_command(cmd_list, desc="", log_callback=None):
 
     cmd_str = " ".join(shlex.quote(part) for part in cmd_list)
 
+    # ─ Cancelled before start → do not launch
+    if cancel_mod.is_cancelled(cancel):
+        _log(f"[INFO] Skipped (cancelled): {desc or cmd_str}")
+        emit("cmd_skipped", desc=desc, command=cmd_str)
+        return {
+            "ok": False,
+            "error": "Cancelled",
+            "data": {
+                "command": cmd_str,
+                "elapsed_sec": 0.0,
+                "returncode": None,
+                "stdout_lines": [],
+                "cancelled": True,
+            }
+        }
+
     # ─ Info log
     if desc:
         _log(f"[INFO] {desc}")
     _log(f"[CMD]  {cmd_str}")
 
+    emit("cmd_start", desc=desc, command=cmd_str)
+
     start_time = time.perf_counter()
     stdout_lines = []
+    next_snapshot = start_time + PROGRESS_EVERY_SEC
+    timed_out = threading.Event()
+    timer = None
+    process = None
 
     try:
         process = subprocess.Popen(
@@ -33,12 +64,39 @@ def run_command(cmd_list, desc="", log_callback=None):
             text=True,
             bufsize=1
         )
+        cancel_mod.track(process)
+        if cancel is not None:
+            cancel.register(process)
+
+        if timeout:
+            def _on_timeout():
+                timed_out.set()
+                try:
+                    process.kill()
+                except OSError:
+                    pass    # exited just as the timer fired
+
+            timer = threading.Timer(timeout, _on_timeout)
+            timer.daemon = True
+            timer.start()
 
         for line in process.stdout:
             line = line.rstrip()
             stdout_lines.append(line)
             _log(f"[FFMPEG] {line}")
 
+            if progress_callback:
+                stats = parse_stats_line(line)
+                if stats:
+                    progress_callback(stats)
+
+            # throttled progress snapshot for the event log
+            if line.startswith("frame=") and time.perf_counter() >= next_snapshot:
+                next_snapshot = time.perf_counter() + PROGRESS_EVERY_SEC
+                stats = parse_stats_line(line)
+                if stats:
+                    emit("progress", desc=desc, ffmpeg_pid=process.pid, **stats)
+
         process.wait()
         returncode = process.returncode
 
@@ -47,6 +105,8 @@ def run_command(cmd_list, desc="", log_callback=None):
         elapsed = time.perf_counter() - start_time
         msg = f"Error while running command: {e}"
         _log(f"[ERROR] {msg}")
+        emit("cmd_end", desc=desc, ok=False, error=msg, returncode=-1,
+             elapsed_sec=round(elapsed, 3))
         return {
             "ok": False,
             "error": msg,
@@ -58,17 +118,46 @@ def run_command(cmd_list, desc="", log_callback=None):
             }
         }
 
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if process is not None:
+            cancel_mod.untrack(process)
+            if cancel is not None:
+                cancel.unregister(process)
+
     # ─ Finished
     elapsed = time.perf_counter() - start_time
+    data = {
+        "command": cmd_str,
+        "elapsed_sec": round(elapsed, 6),
+        "returncode": returncode,
+        "stdout_lines": stdout_lines,
+    }
+
+    if timed_out.is_set():
+        msg = f"Timed out after {timeout} seconds"
+        _log(f"[ERROR] {msg}")
+        data["timed_out"] = True
+        emit("cmd_end", desc=desc, ok=False, error=msg, returncode=returncode,
+             elapsed_sec=round(elapsed, 3), timed_out=True)
+        return {"ok": False, "error": msg, "data": data}
+
+    if returncode != 0 and cancel_mod.is_cancelled(cancel):
+        _log("[INFO] Cancelled")
+        data["cancelled"] = True
+        emit("cmd_end", desc=desc, ok=False, error="Cancelled", returncode=returncode,
+             elapsed_sec=round(elapsed, 3), cancelled=True)
+        return {"ok": False, "error": "Cancelled", "data": data}
+
     _log(f"[INFO] Finished in {round(elapsed, 3)} seconds")
 
+    error = None if returncode == 0 else "Command returned returncode != 0"
+    emit("cmd_end", desc=desc, ok=returncode == 0, error=error, returncode=returncode,
+         elapsed_sec=round(elapsed, 3))
+
     return {
         "ok": (returncode == 0),
-        "error": None if returncode == 0 else "Command returned returncode != 0",
-        "data": {
-            "command": cmd_str,
-            "elapsed_sec": round(elapsed, 6),
-            "returncode": returncode,
-            "stdout_lines": stdout_lines,
-        }
+        "error": error,
+        "data": data
     }
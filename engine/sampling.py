@@ -0,0 +1,199 @@
+import random
+import zlib
+from pathlib import Path
+
+from .mediainfo import media_info
+from .pipeline import proxy_and_test
+from .summary_csv import SUMMARY_HEADER, encoded_size, write_summary_csv, write_sampling_csv
+from .cancel import is_cancelled
+from .events import logged_job
+
+
+# Stop once every recipe's 95% interval is at most this wide:
+# bitrate relative to its mean, PSNR in dB, SSIM absolute.
+DEFAULT_TOLERANCE = {"bitrate_kbps": 0.05, "psnr": 0.5, "ssim": 0.005}
+
+BOOTSTRAP_SAMPLES = 2000
+CONFIDENCE = 0.95
+
+
+# ─────────────────────────────────────────────────────────────
+#  POSITIONS
+# ─────────────────────────────────────────────────────────────
+def stratified_starts(total, n, clip_len, rng):
+    """
+    n start times: [0, total - clip_len] cut into n equal strata, one
+    uniformly random position in each (covers the whole title, unlike
+    plain random sampling which can cluster).
+    """
+    span = max(0.0, total - clip_len)
+    width = span / n
+    return [round(i * width + rng.random() * width, 3) for i in range(n)]
+
+
+# ─────────────────────────────────────────────────────────────
+#  STATISTICS
+# ─────────────────────────────────────────────────────────────
+def resample_indexes(n, rng, samples=BOOTSTRAP_SAMPLES, cache=None):
+    """
+    `samples` bootstrap resamples of range(n) as index lists.
+    cache: dict n → resamples, shared by every metric and recipe of one
+    round (drawing them is the expensive part of the bootstrap).
+    """
+    if cache is not None and n in cache:
+        return cache[n]
+    idx = [[rng.randrange(n) for _ in range(n)] for _ in range(samples)]
+    if cache is not None:
+        cache[n] = idx
+    return idx
+
+
+def bootstrap_ci(values, rng, samples=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE, cache=None):
+    """
+    Mean with a percentile-bootstrap confidence interval.
+    cache: see resample_indexes.
+    Return: {"mean", "low", "high"} or None without values.
+    """
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+
+    n = len(values)
+    mean = sum(values) / n
+    if n == 1:
+        return {"mean": mean, "low": None, "high": None}
+
+    means = sorted(
+        sum(map(values.__getitem__, idx)) / n
+        for idx in resample_indexes(n, rng, samples, cache)
+    )
+    tail = (1 - confidence) / 2
+    low = means[int(tail * (samples - 1))]
+    high = means[int((1 - tail) * (samples - 1))]
+    return {"mean": mean, "low": low, "high": high}
+
+
+def _width_ok(ci, metric, tolerance):
+    if ci is None or ci["low"] is None:
+        return False
+    width = ci["high"] - ci["low"]
+    if metric == "bitrate_kbps":
+        return ci["mean"] > 0 and width / ci["mean"] <= tolerance[metric]
+    return width <= tolerance[metric]
+
+
+def recipe_estimate(rows, rng, tolerance, min_clips=2, cache=None):
+    """
+    rows: summary dicts of one recipe (one per clip).
+    cache: bootstrap resamples to reuse (see resample_indexes).
+    Return: {"clips", "converged", "bitrate_kbps", "psnr", "ssim"} where
+    each metric is {"mean", "low", "high"}.
+    """
+    bitrates = [
+        encoded_size(r) * 8 / r["proxy_duration"] / 1000
+        for r in rows if encoded_size(r) and r.get("proxy_duration")
+    ]
+    est = {
+        "clips": len(rows),
+        "bitrate_kbps": bootstrap_ci(bitrates, rng, cache=cache),
+        "psnr": bootstrap_ci([r.get("psnr") for r in rows], rng, cache=cache),
+        "ssim": bootstrap_ci([r.get("ssim") for r in rows], rng, cache=cache),
+    }
+    est["converged"] = len(rows) >= min_clips and all(
+        _width_ok(est[m], m, tolerance) for m in tolerance
+    )
+    return est
+
+
+# ─────────────────────────────────────────────────────────────
+#  SAMPLED TEST RUN
+# ─────────────────────────────────────────────────────────────
+@logged_job("sampling")
+def sample_and_test(input_file, recipes_json, clip_len=5, initial=4, step=4, max_clips=32,
+                    tolerance=None, seed=None, pick=None, outdir="test_out", log=None,
+                    cancel=None, timeout=None, concurrency=None, fanout=False, keep_proxy=False,
+                    instrument=False):
+    """
+    Random-sampling test: runs proxy_and_test on `initial` stratified
+    random clips, then adds `step` more per round until every recipe's
+    bitrate/PSNR/SSIM confidence interval is within `tolerance`
+    (DEFAULT_TOLERANCE) or max_clips is reached.
+    seed: default derives from the input path, so re-runs pick the same clips.
+    instrument: per-stage timing columns, see proxy_and_test.
+    Writes summary.csv (all clips) and sampling.csv (estimates) to outdir.
+    """
+    tolerance = {**DEFAULT_TOLERANCE, **(tolerance or {})}
+    outdir = Path(outdir)
+
+    info = media_info(input_file)
+    if not info["ok"]:
+        return info
+    total = info["data"]["duration"]
+    if not total or total <= clip_len:
+        return {"ok": False, "error": f"Input too short for {clip_len}s clips.", "data": None}
+
+    if seed is None:
+        seed = zlib.crc32(str(Path(input_file).resolve()).encode("utf-8"))
+    rng = random.Random(seed)
+
+    all_rows = []
+    estimates = {}
+    n_round = 0
+    clips = 0
+
+    while clips < max_clips:
+        n = min(initial if n_round == 0 else step, max_clips - clips)
+        n_round += 1
+        starts = stratified_starts(total, n, clip_len, rng)
+
+        if log:
+            log(f"[SAMPLE] Round {n_round}: {n} clips at {starts}")
+
+        res = proxy_and_test(input_file, ",".join(str(s) for s in starts), clip_len,
+                             recipes_json, pick=pick, outdir=outdir / f"round_{n_round:02d}",
+                             log=log, keep_proxy=keep_proxy, fanout=fanout, cancel=cancel,
+                             timeout=timeout, concurrency=concurrency, instrument=instrument)
+        if not res["ok"]:
+            return res
+
+        # proxy indexes continue across rounds
+        for row in res["data"]["summary_rows"]:
+            all_rows.append([row[0] + clips] + list(row[1:]))
+        clips += n
+
+        by_recipe = {}
+        for row in all_rows:
+            d = dict(zip(SUMMARY_HEADER, row))
+            by_recipe.setdefault(d["recipe_id"], []).append(d)
+        cache = {}
+        estimates = {rid: recipe_estimate(rows, rng, tolerance, cache=cache)
+                     for rid, rows in by_recipe.items()}
+
+        open_recipes = [rid for rid, est in estimates.items() if not est["converged"]]
+        if log:
+            log(f"[SAMPLE] {clips} clips, not converged: {open_recipes or 'none'}")
+        if not open_recipes or is_cancelled(cancel):
+            break
+
+    try:
+        write_summary_csv(all_rows, outdir)
+        write_sampling_csv(estimates, outdir)
+    except OSError:
+        pass
+
+    if is_cancelled(cancel):
+        return {"ok": False, "error": "Cancelled", "data": None}
+
+    return {
+        "ok": True,
+        "error": None,
+        "data": {
+            "input": str(input_file),
+            "seed": seed,
+            "clips": clips,
+            "rounds": n_round,
+            "converged": all(e["converged"] for e in estimates.values()),
+            "estimates": estimates,
+            "output_folder": str(outdir),
+        }
+    }
@@ -0,0 +1,377 @@
+"""
+Local HTTP job service: runs proxy tests and applies for several users
+on one machine through a bounded job queue.
+
+  python -m engine.service --port 8766 --workers 2 --max-queued 16
+
+  POST   /jobs                 {"kind": "test"|"apply"|"apply_multi"|"auto_apply", "params": {...},
+                                "priority": 0}  → 202 {"id", ...}
+                                queue full      → 429 + Retry-After
+  GET    /jobs                 all known jobs
+  GET    /jobs/<id>            state, progress and (when finished) result
+  GET    /jobs/<id>/events     Server-Sent Events: log / progress / state
+  DELETE /jobs/<id>            cancel
+  GET    /status               queue counters
+
+Paths in params are paths on the service machine. Each job writes to
+its own folder below --workdir (reported as "output_folder").
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .jobs import JobQueue
+from .pipeline import proxy_and_test, apply_single, apply_multi
+from .autoselect import auto_apply
+from .progress import time_to_seconds
+
+
+SSE_KEEPALIVE_SEC = 15
+
+# result keys not returned over HTTP (can be huge)
+_DROP_KEYS = ("stdout_lines",)
+
+
+def _strip(value):
+    if isinstance(value, dict):
+        return {k: _strip(v) for k, v in value.items() if k not in _DROP_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_strip(v) for v in value]
+    return value
+
+
+# ─────────────────────────────────────────────────────────────
+#  JOB BUILDERS (request params → pipeline call)
+# ─────────────────────────────────────────────────────────────
+def _number(value):
+    # JSON booleans are ints in Python; they are not numbers here
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _timeout(value):
+    if value is None:
+        return None
+    if not _number(value) or value <= 0:
+        raise ValueError("timeout must be a number of seconds > 0")
+    return float(value)
+
+
+def _concurrency(value):
+    if value is None or value == "auto":
+        return value
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError('concurrency must be "auto" or an integer >= 1')
+    return value
+
+
+def _starts(value):
+    """
+    "0,60,120" or [0, 60, "2:00"] → "0,60,120" / "0,60,2:00"
+    """
+    if isinstance(value, list):
+        if not all(isinstance(v, str) or _number(v) for v in value):
+            raise ValueError("starts must be a list of start times")
+        value = ",".join(str(v) for v in value)
+    if not isinstance(value, str):
+        raise ValueError("starts must be a string or a list of start times")
+    parts = [p.strip() for p in value.split(",") if p.strip()]
+    if not parts:
+        raise ValueError("At least one start value is required.")
+    for part in parts:
+        sec = time_to_seconds(part)
+        if sec is None or sec < 0:
+            raise ValueError(f"Invalid start time: {part}")
+    return ",".join(parts)
+
+
+class Service:
+    """
+    Turns HTTP job requests into JobQueue jobs.
+    roots: if given, input paths must lie inside one of these folders.
+    """
+
+    def __init__(self, recipes_json, workdir, workers=2, max_queued=16,
+                 job_timeout=None, roots=None, log=None):
+        self.recipes_json = str(recipes_json)
+        self.workdir = Path(workdir)
+        self.job_timeout = job_timeout
+        self.roots = [Path(r).resolve() for r in roots or []]
+        self.queue = JobQueue(workers, max_queued, log)
+
+    def _input(self, path):
+        p = Path(str(path)).resolve()
+        if self.roots and not any(p.is_relative_to(r) for r in self.roots):
+            raise ValueError(f"Input outside allowed folders: {path}")
+        if not p.is_file():
+            raise ValueError(f"Input not found: {path}")
+        return str(p)
+
+    def _inputs(self, paths):
+        # a bare string would be iterated character by character
+        if not isinstance(paths, list) or not paths:
+            raise ValueError("inputs must be a non-empty list of paths")
+        return [self._input(p) for p in paths]
+
+    def _build(self, kind, params, outdir):
+        """
+        Return: (label, func(log, cancel)) — raises ValueError on bad params.
+        """
+        recipes = self.recipes_json
+
+        if kind == "test":
+            input_file = self._input(params["input"])
+            starts = _starts(params["starts"])
+            duration = params.get("duration", 5)
+            concurrency = _concurrency(params.get("concurrency"))
+
+            def func(log, cancel):
+                return proxy_and_test(input_file, starts, duration, recipes,
+                                      pick=params.get("pick"), outdir=outdir, log=log,
+                                      keep_proxy=bool(params.get("keep_proxy")),
+                                      fanout=bool(params.get("fanout")), cancel=cancel,
+                                      concurrency=concurrency,
+                                      instrument=bool(params.get("instrument")),
+                                      video_only=bool(params.get("video_only", True)))
+            return f"test {Path(input_file).name}", func
+
+        if kind == "apply":
+            input_file = self._input(params["input"])
+            recipe_id = params["recipe"]
+            output_file = str(Path(outdir) / f"{Path(input_file).stem}_{recipe_id}.mp4")
+
+            def func(log, cancel):
+                Path(outdir).mkdir(parents=True, exist_ok=True)
+                return apply_single(input_file, recipe_id, recipes, output_file,
+                                    log=log, cancel=cancel)
+            return f"apply {Path(input_file).name} ({recipe_id})", func
+
+        if kind == "apply_multi":
+            inputs = self._inputs(params["inputs"])
+            recipe_id = params["recipe"]
+            concurrency = _concurrency(params.get("concurrency"))
+
+            def func(log, cancel):
+                return apply_multi(inputs, recipe_id, recipes, outdir, log=log, cancel=cancel,
+                                   concurrency=concurrency)
+            return f"apply {len(inputs)} files ({recipe_id})", func
+
+        if kind == "auto_apply":
+            inputs = self._inputs(params["inputs"])
+            candidates = params["candidates"]
+            concurrency = _concurrency(params.get("concurrency"))
+            constraints = {k: params.get(k) for k in ("min_psnr", "min_ssim", "max_kbps", "max_ratio")}
+
+            def func(log, cancel):
+                return auto_apply(inputs, candidates, recipes, outdir, constraints,
+                                  objective=params.get("objective", "size"),
+                                  fallback=params.get("fallback"), log=log, cancel=cancel,
+                                  concurrency=concurrency)
+            return f"auto-apply {len(inputs)} files", func
+
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    def submit(self, request):
+        """
+        request: {"kind", "params", "priority"}
+        Return: {"ok", "error", "data": Job | {"retry_after"}}
+        """
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "request must be a JSON object", "data": None}
+        kind = request.get("kind")
+        params = request.get("params") or {}
+        if not isinstance(params, dict):
+            return {"ok": False, "error": "params must be a JSON object", "data": None}
+        try:
+            priority = int(request.get("priority", 0))
+        except (TypeError, ValueError):
+            return {"ok": False, "error": "priority must be an integer", "data": None}
+
+        # own output folder per job, known before the job exists
+        slot = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}"
+        outdir = str(self.workdir / slot)
+
+        try:
+            label, func = self._build(kind, params, outdir)
+            # wall-clock limit of the whole job
+            timeout = _timeout(params.get("timeout", self.job_timeout))
+        except KeyError as e:
+            return {"ok": False, "error": f"Missing parameter: {e.args[0]}", "data": None}
+        except ValueError as e:
+            return {"ok": False, "error": str(e), "data": None}
+
+        return self.queue.submit(kind, func, priority, label, {"output_folder": outdir},
+                                 timeout=timeout)
+
+    def job_info(self, job, with_result=False):
+        info = job.info()
+        if with_result and job.result is not None:
+            info["result"] = _strip(job.result)
+        return info
+
+
+# ─────────────────────────────────────────────────────────────
+#  HTTP API
+# ─────────────────────────────────────────────────────────────
+def _make_handler(service):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _json(self, code, payload=None, headers=None):
+            body = json.dumps(payload or {}).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, val in (headers or {}).items():
+                self.send_header(key, val)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def _job(self, job_id):
+            job = service.queue.get(job_id)
+            if job is None:
+                self._json(404, {"error": "job not found"})
+            return job
+
+        def _events(self, job):
+            """
+            SSE stream until the job is finished (resumes after Last-Event-ID).
+            """
+            try:
+                seq = int(self.headers.get("Last-Event-ID") or 0)
+            except ValueError:
+                seq = 0
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+            try:
+                while True:
+                    events, finished = job.events_after(seq, timeout=SSE_KEEPALIVE_SEC)
+                    if not events and not finished:
+                        self.wfile.write(b": keep-alive\n\n")
+                    for seq, kind, payload in events:
+                        self.wfile.write(
+                            f"id: {seq}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+                        )
+                    self.wfile.flush()
+                    if finished and not events:
+                        return
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+
+            if parts == ["status"]:
+                return self._json(200, service.queue.stats())
+
+            if parts == ["jobs"]:
+                return self._json(200, {"jobs": [service.job_info(j) for j in service.queue.jobs()]})
+
+            if len(parts) in (2, 3) and parts[0] == "jobs":
+                job = self._job(parts[1])
+                if job is None:
+                    return
+                if len(parts) == 2:
+                    return self._json(200, service.job_info(job, with_result=True))
+                if parts[2] == "events":
+                    return self._events(job)
+
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                return self._json(404, {"error": "not found"})
+
+            try:
+                request = self._body()
+            except ValueError:
+                return self._json(400, {"error": "invalid JSON"})
+
+            res = service.submit(request)
+            if res["ok"]:
+                job = res["data"]
+                return self._json(202, {
+                    "id": job.id,
+                    "status_url": f"/jobs/{job.id}",
+                    "events_url": f"/jobs/{job.id}/events",
+                }, {"Location": f"/jobs/{job.id}"})
+
+            if res["error"] == "Queue full":
+                retry = res["data"]["retry_after"]
+                return self._json(429, {"error": res["error"], "retry_after": retry},
+                                  {"Retry-After": str(retry)})
+
+            self._json(400, {"error": res["error"]})
+
+        def do_DELETE(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "jobs":
+                if not service.queue.cancel(parts[1]):
+                    return self._json(404, {"error": "job not found"})
+                return self._json(200, {"cancelled": parts[1]})
+            self._json(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(service, host="127.0.0.1", port=8766):
+    """
+    Starts the HTTP server in a background thread.
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.service")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--recipes", default="recipes.json")
+    ap.add_argument("--workdir", default="service_out", help="job output folders")
+    ap.add_argument("--workers", type=int, default=2, help="jobs running at once")
+    ap.add_argument("--max-queued", type=int, default=16, help="waiting jobs before 429")
+    ap.add_argument("--timeout", type=float, help="default per-job timeout (s)")
+    ap.add_argument("--root", action="append",
+                    help="only accept inputs inside this folder (repeatable)")
+    args = ap.parse_args(argv)
+
+    service = Service(args.recipes, args.workdir, args.workers, args.max_queued,
+                      args.timeout, args.root, log=print)
+    server = serve(service, args.host, args.port)
+    print(f"[SERVICE] Listening on http://{args.host}:{args.port}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("[SERVICE] Stopping...")
+        service.queue.close(cancel_running=True)
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+"""
+Streamed apply: the encoder writes fixed-length segments and every
+finished segment is measured (PSNR/SSIM against the same source range)
+while encoding continues. Running quality is logged / reported through
+on_quality; with min_ssim / min_psnr the encode stops as soon as the
+rolling mean of the last `window` segments drops below the threshold.
+
+  python -m engine.streamed in.mp4 --recipe x264-medium --out out.mp4 --min-ssim 0.95
+"""
+import argparse
+import csv
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+from .cancel import CancelToken, is_cancelled, cancelled_result
+from .encode import video_args, first_pass_for
+from .events import emit, logged_job
+from .metrics import METRIC_SCALER, parse_psnr, parse_ssim, video_size
+from .pipeline import preflight
+from .progress import last_stats
+from .run_command import run_command
+from .twopass import with_pass
+from .utils import ensure_folder
+
+
+DEFAULT_SEGMENT_SEC = 10
+DEFAULT_WINDOW = 3
+
+# how often the metrics worker looks for finished segments
+POLL_SEC = 0.5
+
+SEGMENT_LIST = "segments.csv"
+
+
+# ─────────────────────────────────────────────────────────────
+#  COMMANDS
+# ─────────────────────────────────────────────────────────────
+def build_segment_cmd(input_file, recipe, seg_dir, segment_sec, passlog=None, threads=None):
+    """
+    Encode → seg_00000.mp4, seg_00001.mp4, ... A keyframe is forced at every
+    segment boundary so segments are exactly segment_sec long; the segment
+    list gets a line per segment as soon as it is closed.
+    """
+    args = video_args(recipe, threads)
+    if passlog:
+        args = with_pass(args, recipe["codec"], 2, passlog)
+    if threads:
+        args += ["-threads", str(threads)]
+
+    return [
+        "ffmpeg", "-y", "-i", str(input_file), *args,
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_sec})",
+        "-c:a", "copy",
+        "-f", "segment", "-segment_time", str(segment_sec), "-segment_format", "mp4",
+        "-reset_timestamps", "1",
+        "-segment_list", str(Path(seg_dir) / SEGMENT_LIST), "-segment_list_type", "csv",
+        str(Path(seg_dir) / "seg_%05d.mp4"),
+    ]
+
+
+def build_segment_metric_cmd(input_file, segment, start, end, size=None):
+    """
+    PSNR and SSIM of one segment against source [start, end) in one decode.
+    size: (w, h) of the source → a ladder rung is scaled back to it first.
+    """
+    scale = f"scale={size[0]}:{size[1]}:flags={METRIC_SCALER}," if size else ""
+    graph = (f"[0:v]setpts=PTS-STARTPTS[ref];[1:v]{scale}setpts=PTS-STARTPTS[enc];"
+             "[enc]split[e1][e2];[ref]split[r1][r2];[e1][r1]psnr;[e2][r2]ssim")
+    return [
+        "ffmpeg", "-ss", f"{start:.6f}", "-t", f"{end - start:.6f}", "-i", str(input_file),
+        "-i", str(segment), "-lavfi", graph, "-f", "null", "-",
+    ]
+
+
+def build_concat_cmd(list_file, output_file):
+    return ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", str(list_file),
+            "-c", "copy", "-movflags", "+faststart", str(output_file)]
+
+
+def read_segment_list(path):
+    """
+    [(segment_path, start, end), ...] of the segments closed so far.
+    """
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+    except OSError:
+        return []
+
+    out = []
+    for row in rows:
+        if len(row) < 3:
+            continue  # line still being written
+        try:
+            out.append((Path(path).parent / row[0], float(row[1]), float(row[2])))
+        except ValueError:
+            continue
+    return out
+
+
+# ─────────────────────────────────────────────────────────────
+#  QUALITY
+# ─────────────────────────────────────────────────────────────
+class QualityTracker:
+    """
+    Per-segment results plus duration-weighted running means and the
+    rolling mean over the last `window` segments.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, min_ssim=None, min_psnr=None):
+        self.window = max(1, int(window))
+        self.min_ssim = min_ssim
+        self.min_psnr = min_psnr
+        self.segments = []
+
+    def _mean(self, segs, key):
+        pairs = [(s[key], s["end"] - s["start"]) for s in segs if s[key] is not None]
+        total = sum(w for _, w in pairs)
+        return round(sum(v * w for v, w in pairs) / total, 5) if total else None
+
+    def add(self, seg):
+        self.segments.append(seg)
+        return self.snapshot()
+
+    def snapshot(self):
+        recent = self.segments[-self.window:]
+        return {
+            "segments": len(self.segments),
+            "measured_sec": round(sum(s["end"] - s["start"] for s in self.segments), 3),
+            "psnr": self._mean(self.segments, "psnr"),
+            "ssim": self._mean(self.segments, "ssim"),
+            "rolling_psnr": self._mean(recent, "psnr"),
+            "rolling_ssim": self._mean(recent, "ssim"),
+            "last": self.segments[-1] if self.segments else None,
+        }
+
+    def failure(self):
+        """
+        Reason string when the rolling quality is below a threshold.
+        """
+        snap = self.snapshot()
+        if self.min_ssim is not None and snap["rolling_ssim"] is not None \
+                and snap["rolling_ssim"] < self.min_ssim:
+            return f"rolling SSIM {snap['rolling_ssim']} < {self.min_ssim}"
+        if self.min_psnr is not None and snap["rolling_psnr"] is not None \
+                and snap["rolling_psnr"] < self.min_psnr:
+            return f"rolling PSNR {snap['rolling_psnr']} < {self.min_psnr}"
+        return None
+
+
+def _metrics_worker(input_file, seg_dir, tracker, encoding_done, token, state,
+                    log=None, on_quality=None, cancel=None, timeout=None, size=None):
+    """
+    Measures segments as they are listed until the encode has finished
+    and every listed segment is done. Cancels `token` on a quality failure
+    (or when the caller's cancel fires).
+    """
+    list_file = Path(seg_dir) / SEGMENT_LIST
+    done = 0
+
+    while True:
+        if is_cancelled(cancel):
+            token.cancel()
+        if token.cancelled:
+            return
+
+        finished = encoding_done.is_set()
+        segments = read_segment_list(list_file)
+
+        for seg_path, start, end in segments[done:]:
+            cmd = build_segment_metric_cmd(input_file, seg_path, start, end, size)
+            res = run_command(cmd, cancel=token, timeout=timeout)
+            if token.cancelled:
+                return
+            lines = (res.get("data") or {}).get("stdout_lines", [])
+            seg = {"segment": done, "start": start, "end": end,
+                   "psnr": parse_psnr(lines), "ssim": parse_ssim(lines)}
+            snap = tracker.add(seg)
+            done += 1
+            emit("segment_quality", input=str(input_file), **seg)
+
+            if log:
+                log(f"[QUALITY] Segment {seg['segment']} ({start:.1f}-{end:.1f}s): "
+                    f"PSNR {seg['psnr']}, SSIM {seg['ssim']} | running PSNR {snap['psnr']}, "
+                    f"SSIM {snap['ssim']} | last {tracker.window}: PSNR {snap['rolling_psnr']}, "
+                    f"SSIM {snap['rolling_ssim']}")
+            if on_quality:
+                on_quality(snap)
+
+            reason = tracker.failure()
+            if reason:
+                state["abort"] = f"Quality below threshold after {snap['measured_sec']}s: {reason}"
+                if log:
+                    log(f"[ERROR] {state['abort']} — stopping encode")
+                token.cancel()
+                return
+
+        if finished and done >= len(read_segment_list(list_file)):
+            return
+        encoding_done.wait(POLL_SEC)
+
+
+# ─────────────────────────────────────────────────────────────
+#  STREAMED APPLY
+# ─────────────────────────────────────────────────────────────
+@logged_job("apply_streamed")
+def apply_streamed(input_file, recipe_id, recipes_json, output_file,
+                   segment_sec=DEFAULT_SEGMENT_SEC, min_ssim=None, min_psnr=None,
+                   window=DEFAULT_WINDOW, keep_segments=False, log=None, on_quality=None,
+                   cancel=None, timeout=None, threads=None, progress=None):
+    """
+    apply_single with quality measured while encoding (see module doc).
+    on_quality(snapshot): called after every measured segment with
+    {"segments", "measured_sec", "psnr", "ssim", "rolling_psnr", "rolling_ssim", "last"}.
+    Segments are joined into output_file (stream copy) at the end.
+    Return data: encode result + "quality" {... "per_segment": [...]}; an
+    early abort returns ok=False with the reason and the quality so far.
+    """
+    pf = preflight(recipes_json, [recipe_id], filters=("psnr", "ssim", "split"))
+    if not pf["ok"]:
+        return pf
+    recipe = pf["data"][1][recipe_id]
+
+    input_file = Path(input_file)
+    output_file = Path(output_file)
+    if not input_file.is_file():
+        return {"ok": False, "error": f"Input not found: {input_file}", "data": None}
+
+    folder_ok = ensure_folder(output_file.parent)
+    if not folder_ok["ok"]:
+        return {"ok": False, "error": f"Failed to create folder: {folder_ok['error']}", "data": None}
+
+    seg_dir = output_file.parent / f".{output_file.stem}_segments"
+    shutil.rmtree(seg_dir, ignore_errors=True)
+    seg_dir.mkdir(parents=True)
+
+    # stopped by the caller's cancel or by the metrics worker
+    token = CancelToken()
+    tracker = QualityTracker(window, min_ssim, min_psnr)
+    encoding_done = threading.Event()
+    state = {"abort": None}
+
+    try:
+        fp = first_pass_for(input_file, recipe, log, cancel, timeout, threads)
+        if not fp["ok"]:
+            return fp
+        first_pass = fp["data"]
+
+        # ladder recipes: segments are compared at the source resolution
+        size = video_size(input_file) if recipe.get("scale") is not None else None
+        worker = threading.Thread(
+            target=_metrics_worker, name="segment-metrics", daemon=True,
+            args=(input_file, seg_dir, tracker, encoding_done, token, state,
+                  log, on_quality, cancel, timeout, size),
+        )
+        worker.start()
+
+        cmd = build_segment_cmd(input_file, recipe, seg_dir, segment_sec,
+                                passlog=first_pass["prefix"] if first_pass else None,
+                                threads=threads)
+        desc = f"Streamed encode using recipe '{recipe_id}' ({segment_sec}s segments)"
+        result = run_command(cmd, desc, log_callback=log, cancel=token, timeout=timeout,
+                             progress_callback=progress)
+        encoding_done.set()
+        worker.join()
+
+        quality = {**tracker.snapshot(), "per_segment": tracker.segments}
+        quality.pop("last")
+
+        if state["abort"]:
+            emit("quality_abort", recipe_id=recipe_id, input=str(input_file),
+                 reason=state["abort"], measured_sec=quality["measured_sec"])
+            return {"ok": False, "error": state["abort"],
+                    "data": {"aborted": True, "quality": quality, "recipe_id": recipe_id}}
+        if is_cancelled(cancel):
+            return cancelled_result(desc)
+        if not result["ok"]:
+            return result
+
+        # join segments
+        segments = read_segment_list(seg_dir / SEGMENT_LIST)
+        list_file = seg_dir / "concat.txt"
+        list_file.write_text(
+            "".join("file '" + str(p).replace("'", "'\\''") + "'\n" for p, _, _ in segments),
+            encoding="utf-8",
+        )
+        joined = run_command(build_concat_cmd(list_file, output_file),
+                             f"Join {len(segments)} segments", log_callback=log,
+                             cancel=cancel, timeout=timeout)
+        if not joined["ok"]:
+            return joined
+
+        size_kb = output_file.stat().st_size / 1024 if output_file.exists() else None
+        stats = last_stats(result["data"].get("stdout_lines"))
+        result["data"].update({
+            "output_file": str(output_file),
+            "size_kb": round(size_kb, 2) if size_kb else None,
+            "recipe_id": recipe_id,
+            "frames": stats["frame"] if stats else None,
+            "aborted": False,
+            "quality": quality,
+        })
+        if first_pass:
+            result["data"]["first_pass"] = first_pass["key"]
+            result["data"]["first_pass_sec"] = first_pass["elapsed_sec"]
+
+        emit("encode", recipe_id=recipe_id, ok=True, output=str(output_file),
+             frames=result["data"]["frames"], elapsed_sec=result["data"]["elapsed_sec"],
+             size_kb=result["data"]["size_kb"], psnr=quality["psnr"], ssim=quality["ssim"],
+             streamed=True)
+        return result
+    finally:
+        encoding_done.set()
+        if not keep_segments:
+            shutil.rmtree(seg_dir, ignore_errors=True)
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.streamed")
+    ap.add_argument("input")
+    ap.add_argument("--recipe", required=True)
+    ap.add_argument("--recipes", default="recipes.json")
+    ap.add_argument("--out", required=True, help="output file")
+    ap.add_argument("--segment", type=float, default=DEFAULT_SEGMENT_SEC, help="segment length (s)")
+    ap.add_argument("--min-ssim", type=float)
+    ap.add_argument("--min-psnr", type=float)
+    ap.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                    help="segments in the rolling mean")
+    ap.add_argument("--keep-segments", action="store_true")
+    ap.add_argument("--timeout", type=float)
+    args = ap.parse_args(argv)
+
+    res = apply_streamed(args.input, args.recipe, args.recipes, args.out,
+                         segment_sec=args.segment, min_ssim=args.min_ssim,
+                         min_psnr=args.min_psnr, window=args.window,
+                         keep_segments=args.keep_segments, log=print, timeout=args.timeout)
+    if not res["ok"]:
+        print(f"ERROR: {res['error']}")
+        return 1
+    q = res["data"]["quality"]
+    print(f"OK: {res['data']['output_file']}  PSNR {q['psnr']}  SSIM {q['ssim']} "
+          f"({q['segments']} segments)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
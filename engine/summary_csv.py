@@ -1,21 +1,50 @@
 import csv
 from pathlib import Path
 
+
+SUMMARY_HEADER = [
+    "proxy_index",
+    "recipe_id",
+    "size_original",
+    "size_encoded",
+    "encode_time",
+    "psnr",
+    "ssim",
+    "proxy_duration",
+    "frames",
+    "resolution",
+    # instrumented runs only (progress.bench_breakdown), empty otherwise
+    "utime",
+    "stime",
+    "rtime",
+    "maxrss_kb",
+    "decode_sec",
+    "encode_stage_sec",
+    "other_sec",
+    "fps_min",
+    # appended last so older readers' column positions still hold
+    "size_video",
+]
+
+# bench_breakdown keys → SUMMARY_HEADER columns
+BENCH_COLUMNS = {
+    "utime": "utime",
+    "stime": "stime",
+    "rtime": "rtime",
+    "maxrss_kb": "maxrss_kb",
+    "decode_sec": "decode_sec",
+    "encode_sec": "encode_stage_sec",
+    "other_sec": "other_sec",
+    "fps_min": "fps_min",
+}
+
+
 def write_summary_csv(rows, outdir):
     outdir = Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
     csv_path = outdir / "summary.csv"
-
-    header = [
-        "proxy_index",
-        "recipe_id",
-        "size_original",
-        "size_encoded",
-        "encode_time",
-        "psnr",
-        "ssim"
-    ]
+    header = SUMMARY_HEADER
 
     with csv_path.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
@@ -23,3 +52,128 @@ def write_summary_csv(rows, outdir):
         w.writerows(rows)
 
     return csv_path
+
+
+def _cell(value):
+    if value in ("", None):
+        return None
+    try:
+        f = float(value)
+        return int(f) if f.is_integer() and "." not in value else f
+    except ValueError:
+        return value
+
+
+def read_summary_csv(path):
+    """
+    summary.csv → list of dicts (numbers converted, empty cells → None).
+    """
+    path = Path(path)
+    with path.open("r", newline="", encoding="utf-8") as f:
+        return [{k: _cell(v) for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def encoded_size(row):
+    """
+    Encoded video bytes of a summary row: the video bitstream (size_video)
+    when known, else the whole encoded file.
+    """
+    return row.get("size_video") or row.get("size_encoded")
+
+
+def source_size(row):
+    """
+    Proxy bytes matching encoded_size(): the proxy minus what the encode
+    carried besides video (stream-copied audio, container), when known.
+    """
+    orig, enc, video = row.get("size_original"), row.get("size_encoded"), row.get("size_video")
+    if orig and enc and video and orig > enc - video:
+        return orig - (enc - video)
+    return orig
+
+
+SAMPLING_HEADER = [
+    "recipe_id", "clips", "converged",
+    "bitrate_kbps", "bitrate_low", "bitrate_high",
+    "psnr", "psnr_low", "psnr_high",
+    "ssim", "ssim_low", "ssim_high",
+]
+
+
+def write_sampling_csv(estimates, outdir):
+    """
+    estimates: {recipe_id: sampling.recipe_estimate() data} → sampling.csv
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    csv_path = outdir / "sampling.csv"
+    with csv_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(SAMPLING_HEADER)
+        for rid, est in estimates.items():
+            row = [rid, est["clips"], est["converged"]]
+            for metric in ("bitrate_kbps", "psnr", "ssim"):
+                m = est[metric] or {}
+                row.extend([None if v is None else round(v, 5)
+                            for v in (m.get("mean"), m.get("low"), m.get("high"))])
+            w.writerow(row)
+
+    return csv_path
+
+
+BENCH_HEADER = [
+    "recipe_id", "encodes",
+    "utime", "stime", "rtime", "maxrss_kb",
+    "decode_sec", "encode_stage_sec", "other_sec",
+    "decode_share", "encode_share", "other_share", "fps_min",
+]
+
+
+def bench_by_recipe(rows):
+    """
+    Instrumented summary rows (SUMMARY_HEADER lists) → per-recipe totals.
+    Times are summed over the recipe's encodes, maxrss_kb / fps_min are the
+    worst encode, *_share is the stage's part of rtime.
+    Return: {recipe_id: {BENCH_HEADER[1:] keys}}; rows without data are skipped.
+    """
+    out = {}
+    for row in rows:
+        d = dict(zip(SUMMARY_HEADER, row))
+        if d.get("rtime") is None:
+            continue
+        a = out.setdefault(d["recipe_id"], {"encodes": 0, "utime": 0.0, "stime": 0.0, "rtime": 0.0,
+                                            "maxrss_kb": None, "decode_sec": 0.0,
+                                            "encode_stage_sec": 0.0, "other_sec": 0.0, "fps_min": None})
+        a["encodes"] += 1
+        for key in ("utime", "stime", "rtime", "decode_sec", "encode_stage_sec", "other_sec"):
+            a[key] += d.get(key) or 0.0
+        if d.get("maxrss_kb") is not None:
+            a["maxrss_kb"] = max(a["maxrss_kb"] or 0, d["maxrss_kb"])
+        if d.get("fps_min") is not None:
+            a["fps_min"] = d["fps_min"] if a["fps_min"] is None else min(a["fps_min"], d["fps_min"])
+
+    for a in out.values():
+        for stage in ("decode", "encode", "other"):
+            sec = a["encode_stage_sec" if stage == "encode" else f"{stage}_sec"]
+            a[f"{stage}_share"] = round(sec / a["rtime"], 4) if a["rtime"] else None
+        for key in ("utime", "stime", "rtime", "decode_sec", "encode_stage_sec", "other_sec"):
+            a[key] = round(a[key], 6)
+    return out
+
+
+def write_bench_csv(totals, outdir):
+    """
+    totals: bench_by_recipe() → bench.csv
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    csv_path = outdir / "bench.csv"
+    with csv_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(BENCH_HEADER)
+        for rid, t in totals.items():
+            w.writerow([rid] + [t[k] for k in BENCH_HEADER[1:]])
+
+    return csv_path
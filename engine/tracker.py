@@ -0,0 +1,318 @@
+"""
+Encoder regression tracking across ffmpeg builds.
+
+  python -m engine.tracker run                  # record the current build
+  python -m engine.tracker list
+  python -m engine.tracker diff [OLD] [NEW]     # default: last two recorded builds
+
+A fixed recipe set is encoded on fixed reference proxies (cut from the
+cached benchmark sources, so every build sees the same frames). fps,
+size and PSNR/SSIM are stored per build, keyed by ffmpeg version +
+configuration from the capability probe. diff flags changes beyond the
+tolerances; exit code 1 when a build got slower, bigger or worse.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from . import tuning
+from .benchmark import CASES, CLIP_LEN, generate_source
+from .capabilities import CACHE_DIR
+from .encode import encode_single
+from .metrics import calc_psnr, calc_ssim
+from .pipeline import preflight
+from .proxy import proxy_single
+
+
+# Recorded builds: {build_key: record}
+TRACKER_FILE = CACHE_DIR / "tracker.json"
+
+# recipes encoded by default (those the build supports)
+TRACK_RECIPES = ("x264-medium", "x265-balanced", "vp9-balanced")
+
+# fps/size relative, PSNR in dB, SSIM absolute
+DEFAULT_TOLERANCE = {"fps": 0.05, "size": 0.02, "psnr": 0.2, "ssim": 0.002}
+
+# direction of "worse" per metric
+_LOWER_IS_WORSE = {"fps": True, "size": False, "psnr": True, "ssim": True}
+_RELATIVE = ("fps", "size")
+
+
+# ─────────────────────────────────────────────────────────────
+#  BUILDS
+# ─────────────────────────────────────────────────────────────
+def build_key(caps):
+    """
+    Short stable ID of an ffmpeg build (version + configure flags).
+    """
+    text = f"{caps.get('version')}|{caps.get('configuration')}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def load_records(path=TRACKER_FILE):
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_record(record, path=TRACKER_FILE):
+    records = load_records(path)
+    records[record["build"]] = record
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(records, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+# ─────────────────────────────────────────────────────────────
+#  RUN
+# ─────────────────────────────────────────────────────────────
+def reference_proxies(workdir, log=None):
+    """
+    One CLIP_LEN clip from the middle of every benchmark source.
+    Return data: {case_name: proxy_path}
+    """
+    proxies = {}
+    for case in CASES:
+        src = generate_source(case, log)
+        if not src["ok"]:
+            return src
+        out = Path(workdir) / f"{case['name']}.mp4"
+        res = proxy_single(src["data"], case["duration"] / 2, CLIP_LEN, out, log=log)
+        if not res["ok"]:
+            return res
+        proxies[case["name"]] = str(out)
+    return {"ok": True, "error": None, "data": proxies}
+
+
+def measure(proxy, recipe_id, recipe, output_file, repeat=1, log=None, cancel=None, timeout=None):
+    """
+    Encodes a proxy `repeat` times. Return data: {fps, size, psnr, ssim}
+    (median fps; size/quality of the last run, they do not vary).
+    """
+    fps = []
+    res = None
+    for _ in range(max(1, repeat)):
+        res = encode_single(proxy, recipe_id, recipe, output_file, log=log,
+                            cancel=cancel, timeout=timeout)
+        if not res["ok"]:
+            return res
+        d = res["data"]
+        wall = d["elapsed_sec"] + (d.get("first_pass_sec") or 0)
+        if d["frames"] and wall:
+            fps.append(d["frames"] / wall)
+
+    fps.sort()
+    data = {
+        "fps": round(fps[len(fps) // 2], 3) if fps else None,
+        "size": Path(output_file).stat().st_size,
+        "psnr": calc_psnr(proxy, output_file, cancel=cancel, timeout=timeout),
+        "ssim": calc_ssim(proxy, output_file, cancel=cancel, timeout=timeout),
+    }
+    Path(output_file).unlink(missing_ok=True)
+    return {"ok": True, "error": None, "data": data}
+
+
+def track(recipes_json="recipes.json", pick=None, repeat=3, db=TRACKER_FILE, log=None,
+          cancel=None, timeout=None):
+    """
+    Runs the recipe set on the reference proxies with the current ffmpeg
+    and stores the record under its build key.
+    Return data: record {"build", "version", "configuration", ..., "results"}
+    results: {recipe_id: {proxy_name: {fps, size, psnr, ssim}}}
+    """
+    pf = preflight(recipes_json)
+    if not pf["ok"]:
+        return pf
+    caps, recipes = pf["data"]
+
+    if pick:
+        recipe_ids = [r.strip() for r in pick.split(",") if r.strip()]
+        missing = [r for r in recipe_ids if r not in recipes]
+        if missing:
+            return {"ok": False, "error": f"Recipe ID not found: {missing}", "data": None}
+    else:
+        encoders = caps.get("encoders") or {}
+        recipe_ids = [r for r in TRACK_RECIPES
+                      if r in recipes and (not encoders or recipes[r]["codec"] in encoders)]
+
+    workdir = Path(tempfile.mkdtemp(prefix="ffsandbox-tracker-"))
+    try:
+        refs = reference_proxies(workdir, log)
+        if not refs["ok"]:
+            return refs
+
+        results = {}
+        for rid in recipe_ids:
+            results[rid] = {}
+            for name, proxy in refs["data"].items():
+                res = measure(proxy, rid, recipes[rid], workdir / f"{rid}_{name}.mp4",
+                              repeat, log, cancel, timeout)
+                if not res["ok"]:
+                    return {"ok": False, "error": f"{rid} on {name}: {res['error']}", "data": None}
+                results[rid][name] = res["data"]
+                if log:
+                    m = res["data"]
+                    log(f"[TRACK] {rid} {name}: {m['fps']} fps, {m['size']} B, "
+                        f"PSNR {m['psnr']}, SSIM {m['ssim']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    record = {
+        "build": build_key(caps),
+        "version": caps.get("version"),
+        "configuration": caps.get("configuration"),
+        "binary": caps.get("binary"),
+        "host": socket.gethostname(),
+        "cpu_count": os.cpu_count(),
+        "recorded": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results,
+    }
+    try:
+        save_record(record, db)
+    except OSError as e:
+        return {"ok": False, "error": f"Cannot save record: {e}", "data": record}
+
+    return {"ok": True, "error": None, "data": record}
+
+
+# ─────────────────────────────────────────────────────────────
+#  DIFF
+# ─────────────────────────────────────────────────────────────
+def _change(metric, old, new):
+    if old is None or new is None:
+        return None
+    if metric in _RELATIVE:
+        return (new - old) / old if old else None
+    return new - old
+
+
+def diff_records(old, new, tolerance=None):
+    """
+    Compares two build records on the recipe/proxy pairs both contain.
+    Return: {"rows": [...], "regressions": n, "improvements": n}
+    Each row: recipe_id, proxy, metric, old, new, change, status
+    ("regression" / "improvement"); only changes beyond tolerance are listed.
+    """
+    tolerance = {**DEFAULT_TOLERANCE, **(tolerance or {})}
+    rows = []
+
+    for rid, proxies in new["results"].items():
+        for name, cur in proxies.items():
+            prev = old["results"].get(rid, {}).get(name)
+            if not prev:
+                continue
+            for metric, tol in tolerance.items():
+                change = _change(metric, prev.get(metric), cur.get(metric))
+                if change is None or abs(change) <= tol:
+                    continue
+                worse = (change < 0) if _LOWER_IS_WORSE[metric] else (change > 0)
+                rows.append({
+                    "recipe_id": rid, "proxy": name, "metric": metric,
+                    "old": prev[metric], "new": cur[metric], "change": round(change, 4),
+                    "status": "regression" if worse else "improvement",
+                })
+
+    return {
+        "old": old["build"],
+        "new": new["build"],
+        "rows": rows,
+        "regressions": sum(r["status"] == "regression" for r in rows),
+        "improvements": sum(r["status"] == "improvement" for r in rows),
+    }
+
+
+def format_diff(report, old, new):
+    lines = [
+        f"OLD {old['build']}  ffmpeg {old['version']}  ({old['recorded']}, {old['host']})",
+        f"NEW {new['build']}  ffmpeg {new['version']}  ({new['recorded']}, {new['host']})",
+    ]
+    if old["host"] != new["host"] or old.get("cpu_count") != new.get("cpu_count"):
+        lines.append("[WARN] Recorded on different machines: fps is not comparable.")
+    if old["configuration"] != new["configuration"]:
+        lines.append("Configuration changed.")
+
+    for r in report["rows"]:
+        if r["metric"] in _RELATIVE:
+            change = f"{r['change']:+.1%}"
+        else:
+            change = f"{r['change']:+.4g}"
+        lines.append(f"  {r['status'].upper():12} {r['recipe_id']:16} {r['proxy']:24} "
+                     f"{r['metric']:5} {r['old']} → {r['new']} ({change})")
+
+    lines.append(f"{report['regressions']} regression(s), {report['improvements']} improvement(s)")
+    return "\n".join(lines)
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.tracker")
+    ap.add_argument("--db", default=str(TRACKER_FILE), help="records file")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="record the current ffmpeg build")
+    p_run.add_argument("--recipes", default="recipes.json")
+    p_run.add_argument("--pick", help=f"recipe IDs (default: {','.join(TRACK_RECIPES)})")
+    p_run.add_argument("--repeat", type=int, default=3, help="encodes per pair (median fps)")
+
+    sub.add_parser("list", help="recorded builds")
+
+    p_diff = sub.add_parser("diff", help="compare two builds")
+    p_diff.add_argument("old", nargs="?", help="build key (default: second newest)")
+    p_diff.add_argument("new", nargs="?", help="build key (default: newest)")
+    for metric, tol in DEFAULT_TOLERANCE.items():
+        p_diff.add_argument(f"--tol-{metric}", type=float, default=tol)
+    p_diff.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "run":
+        # builds are compared untuned (profiles would mask encoder changes)
+        tuning.ENABLED = False
+        res = track(args.recipes, args.pick, args.repeat, args.db, log=print)
+        if not res["ok"]:
+            print(f"ERROR: {res['error']}")
+            return 1
+        print(f"Recorded build {res['data']['build']} (ffmpeg {res['data']['version']})")
+        return 0
+
+    records = load_records(args.db)
+    by_time = sorted(records.values(), key=lambda r: r["recorded"])
+
+    if args.cmd == "list":
+        for r in by_time:
+            print(f"{r['build']}  ffmpeg {str(r['version']):12} {r['recorded']}  {r['host']}  "
+                  f"{', '.join(r['results'])}")
+        return 0
+
+    if args.old and args.new:
+        keys = [args.old, args.new]
+    elif args.old:
+        keys = [args.old, by_time[-1]["build"] if by_time else None]
+    else:
+        keys = [r["build"] for r in by_time[-2:]]
+    missing = [k for k in keys if k not in records]
+    if len(keys) < 2 or missing:
+        print(f"ERROR: need two recorded builds (unknown: {missing or 'none recorded'})")
+        return 1
+
+    old, new = records[keys[0]], records[keys[1]]
+    tolerance = {m: getattr(args, f"tol_{m}") for m in DEFAULT_TOLERANCE}
+    report = diff_records(old, new, tolerance)
+    print(json.dumps(report, indent=2) if args.json else format_diff(report, old, new))
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
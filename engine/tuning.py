@@ -0,0 +1,105 @@
+import json
+import os
+import socket
+import threading
+
+from .capabilities import CACHE_DIR
+from .utils import merge_x265_params
+
+
+# Per-host threading profiles written by `python -m engine.autotune`
+PROFILE_FILE = CACHE_DIR / "autotune.json"
+
+# set FFSANDBOX_NO_TUNING=1 to ignore saved profiles
+ENABLED = not os.environ.get("FFSANDBOX_NO_TUNING")
+
+_LOCK = threading.Lock()
+_LOADED = {"mtime": None, "data": {}}
+
+
+def host_key():
+    """
+    Profiles only apply on the machine (and core count) they were tuned on.
+    """
+    return f"{socket.gethostname()}|{os.cpu_count() or 1}"
+
+
+def settings_args(settings, threads=None):
+    """
+    Tuning settings → ffmpeg argv additions.
+    {"threads": 8, "row-mt": 1, "x265-params": "pools=8"} → [...]
+    threads: set by the caller (adaptive concurrency) → profile threads skipped.
+    Returns (extra args, x265-params string or None).
+    """
+    args = []
+    for key, val in settings.items():
+        if key == "x265-params" or (key == "threads" and threads):
+            continue
+        args.extend(["-" + key, str(val)])
+    return args, settings.get("x265-params")
+
+
+def apply_settings(argv, settings, threads=None):
+    extra, x265 = settings_args(settings, threads)
+    argv = list(argv) + extra
+    if x265:
+        argv = merge_x265_params(argv, x265)
+    return argv
+
+
+# ─────────────────────────────────────────────────────────────
+#  PROFILE FILE
+# ─────────────────────────────────────────────────────────────
+def load_profiles():
+    """
+    {host_key: {recipe_hash: entry}} (re-read when the file changes).
+    """
+    try:
+        mtime = PROFILE_FILE.stat().st_mtime_ns
+    except OSError:
+        return {}
+
+    with _LOCK:
+        if _LOADED["mtime"] != mtime:
+            try:
+                _LOADED["data"] = json.loads(PROFILE_FILE.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                _LOADED["data"] = {}
+            _LOADED["mtime"] = mtime
+        return _LOADED["data"]
+
+
+def save_profile(entries):
+    """
+    entries: {recipe_hash: entry} for this host (merged into the file).
+    """
+    profiles = dict(load_profiles())
+    host = dict(profiles.get(host_key(), {}))
+    host.update(entries)
+    profiles[host_key()] = host
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = PROFILE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(profiles, indent=2), encoding="utf-8")
+    tmp.replace(PROFILE_FILE)
+
+
+def profile_for(recipe):
+    """
+    Saved entry for a compiled recipe on this host, or None.
+    Keyed by recipe_hash, so editing a recipe drops its tuning.
+    """
+    recipe_hash = getattr(recipe, "recipe_hash", None)
+    if not ENABLED or recipe_hash is None:
+        return None
+    return load_profiles().get(host_key(), {}).get(recipe_hash)
+
+
+def tuned_args(recipe, argv, threads=None):
+    """
+    Recipe argv with this host's tuned threading settings (if any).
+    """
+    entry = profile_for(recipe)
+    if not entry:
+        return list(argv)
+    return apply_settings(argv, entry["settings"], threads)
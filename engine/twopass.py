@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from .capabilities import CACHE_DIR
+from .run_command import run_command
+from .utils import merge_x265_params
+from .events import emit
+
+
+# Pass-1 stats files, one folder per first-pass key
+PASSLOG_DIR = CACHE_DIR / "passlogs"
+
+# stats of inputs not touched for this long are removed
+PASSLOG_MAX_AGE_SEC = 7 * 24 * 3600
+
+# output-only flags (container, metadata, audio) → dropped from pass 1, which
+# writes no file. Rate control stays: pass-1 stats depend on the target rate.
+OUTPUT_FLAGS = {"-f", "-movflags", "-metadata", "-c:a", "-b:a", "-ac", "-ar"}
+
+# first-pass key → lock (one pass 1 per key at a time, others wait and reuse)
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def is_two_pass(recipe):
+    return recipe.get("passes") == 2
+
+
+# ─────────────────────────────────────────────────────────────
+#  ARGV HELPERS
+# ─────────────────────────────────────────────────────────────
+def first_pass_argv(argv):
+    """
+    Recipe argv without the output-only flags.
+    Recipes that differ only in those share this argv and therefore one
+    first pass; a different bitrate means a different first pass.
+    """
+    out = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg in OUTPUT_FLAGS:
+            skip = True
+            continue
+        out.append(arg)
+    return out
+
+
+def with_pass(argv, codec, pass_no, prefix):
+    """
+    Adds the codec's pass flags to a recipe argv.
+    x264 / vp9: -pass N -passlogfile prefix
+    x265: pass=N:stats=prefix.log merged into -x265-params
+    """
+    argv = list(argv)
+
+    if codec != "libx265":
+        return argv + ["-pass", str(pass_no), "-passlogfile", str(prefix)]
+
+    return merge_x265_params(argv, f"pass={pass_no}:stats={prefix}.log")
+
+
+def first_pass_key(input_file, codec, argv):
+    """
+    Stable key of (input file identity, codec, first-pass argv).
+    """
+    st = Path(input_file).stat()
+    ident = [os.path.realpath(input_file), st.st_mtime_ns, st.st_size, codec,
+             first_pass_argv(argv)]
+    return hashlib.sha256(json.dumps(ident).encode("utf-8")).hexdigest()[:16]
+
+
+# ─────────────────────────────────────────────────────────────
+#  CACHE
+# ─────────────────────────────────────────────────────────────
+def _lock_for(key):
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(key, threading.Lock())
+
+
+def prune_passlogs(max_age=PASSLOG_MAX_AGE_SEC):
+    """
+    Removes stats folders not used for max_age seconds (proxies are
+    temporary, their stats are never reused once the proxy is gone).
+    """
+    if not PASSLOG_DIR.is_dir():
+        return
+    limit = time.time() - max_age
+    for d in PASSLOG_DIR.iterdir():
+        try:
+            if d.is_dir() and d.stat().st_mtime < limit:
+                shutil.rmtree(d, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def ensure_first_pass(input_file, codec, argv, log=None, cancel=None, timeout=None,
+                      threads=None):
+    """
+    Runs pass 1 for (input, first-pass argv) unless its stats are already
+    cached. Concurrent callers with the same key wait for one run.
+    Return data: {"key", "prefix", "cached", "elapsed_sec"}
+    """
+    key = first_pass_key(input_file, codec, argv)
+    folder = PASSLOG_DIR / key
+    prefix = folder / "pass"
+    marker = folder / "done.json"
+
+    with _lock_for(key):
+        if marker.is_file():
+            os.utime(folder)
+            if log:
+                log(f"[INFO] Reusing first pass {key} for {Path(input_file).name}")
+            emit("cache", cache="first_pass", hit=True, key=key)
+            return {
+                "ok": True,
+                "error": None,
+                "data": {"key": key, "prefix": str(prefix), "cached": True, "elapsed_sec": 0.0}
+            }
+
+        try:
+            folder.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            return {"ok": False, "error": f"Failed to create folder: {e}", "data": None}
+
+        cmd = ["ffmpeg", "-y", "-i", str(input_file)]
+        cmd.extend(with_pass(first_pass_argv(argv), codec, 1, prefix))
+        if threads:
+            cmd.extend(["-threads", str(threads)])
+        cmd.extend(["-an", "-f", "null", "-"])
+
+        result = run_command(cmd, f"First pass ({codec}, {key})", log_callback=log,
+                             cancel=cancel, timeout=timeout)
+        if not result["ok"]:
+            shutil.rmtree(folder, ignore_errors=True)
+            return result
+
+        elapsed = result["data"]["elapsed_sec"]
+        marker.write_text(json.dumps({
+            "input": str(input_file),
+            "codec": codec,
+            "argv": first_pass_argv(argv),
+            "elapsed_sec": elapsed,
+        }), encoding="utf-8")
+
+    prune_passlogs()
+    emit("cache", cache="first_pass", hit=False, key=key, elapsed_sec=elapsed)
+
+    return {
+        "ok": True,
+        "error": None,
+        "data": {"key": key, "prefix": str(prefix), "cached": False, "elapsed_sec": elapsed}
+    }
@@ -46,3 +46,45 @@ def parse_output_pattern(pattern):
     suffix = p.suffix if p.suffix else ".mp4"
 
     return parent, stem, suffix
+
+
+
+def merge_x265_params(argv, params):
+    """
+    Appends "k=v:k=v" to the -x265-params value of an ffmpeg argv (adding
+    the option if missing); ffmpeg only honours one -x265-params.
+    """
+    argv = list(argv)
+    if "-x265-params" in argv:
+        i = argv.index("-x265-params") + 1
+        argv[i] = f"{argv[i]}:{params}"
+        return argv
+    return argv + ["-x265-params", params]
+
+
+
+def parse_scale(value):
+    """
+    Ladder rung size → (width, height) for the scale filter.
+    720 → (-2, 720) (width keeps the aspect ratio, rounded to even),
+    "1280x720" / "1280:720" → (1280, 720); -1/-2 allowed on one side.
+    Invalid → None.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return (-2, value) if value > 0 else None
+    if not isinstance(value, str):
+        return None
+
+    parts = value.lower().replace("x", ":").split(":")
+    if len(parts) != 2:
+        return None
+    try:
+        w, h = int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+
+    if not all(v > 0 or v in (-1, -2) for v in (w, h)) or (w < 0 and h < 0):
+        return None
+    return w, h
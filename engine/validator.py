@@ -1,5 +1,5 @@
-import json
-from pathlib import Path
+from .utils import parse_scale
+
 
 VALID_CODECS = ["libx264", "libx265", "libvpx-vp9"]
 
@@ -10,67 +10,126 @@ PRESETS = {
 
 VP9_DEADLINES = ["good", "best", "realtime"]
 
-
-def load_and_validate_recipes(path):
-    path = Path(path)
-
-    if not path.is_file():
-        return {"ok": False, "error": f"recipes.json not found: {path}"}
-
-    # Load JSON
-    try:
-        recipes = json.load(open(path, "r", encoding="utf-8"))
-    except Exception as e:
-        return {"ok": False, "error": f"Invalid JSON: {e}"}
-
-    # Basic structure must be a dict
-    if not isinstance(recipes, dict):
-        return {"ok": False, "error": "recipes.json must be a dictionary {id: {...}}."}
-
-    # Validate each recipe
-    for rname, config in recipes.items():
-        if not isinstance(config, dict):
-            return {"ok": False, "error": f"Recipe '{rname}' is not a dictionary object."}
-
-        # 'codec' is required
-        if "codec" not in config:
-            return {"ok": False, "error": f"Recipe '{rname}' does not contain 'codec'."}
-
-        codec = config["codec"]
-        if codec not in VALID_CODECS:
-            return {"ok": False, "error": f"Recipe '{rname}': codec '{codec}' is not valid."}
-
-        # CRF (optional but common)
-        if "crf" in config:
-            if not isinstance(config["crf"], int):
-                return {"ok": False, "error": f"Recipe '{rname}': crf must be an integer."}
-
-            crf = config["crf"]
-            if codec in ["libx264", "libx265"] and not (0 <= crf <= 51):
-                return {"ok": False, "error": f"Recipe '{rname}': crf {crf} is out of range 0–51."}
-
-            if codec == "libvpx-vp9" and not (0 <= crf <= 63):
-                return {"ok": False, "error": f"Recipe '{rname}': crf {crf} is out of range 0–63."}
-
-        # Preset (x264/x265 only)
-        if "preset" in config:
-            preset = config["preset"]
-            if codec not in PRESETS:
-                return {"ok": False, "error": f"Recipe '{rname}': preset not supported for codec {codec}."}
-
-            if preset not in PRESETS[codec]:
-                return {"ok": False, "error": f"Recipe '{rname}': preset '{preset}' is not valid for {codec}."}
-
-        # Deadline (VP9 only)
-        if "deadline" in config:
-            if codec != "libvpx-vp9":
-                return {"ok": False, "error": f"Recipe '{rname}': deadline is only for codec libvpx-vp9."}
-            if config["deadline"] not in VP9_DEADLINES:
-                return {"ok": False, "error": f"Recipe '{rname}': deadline '{config['deadline']}' is not valid."}
-
-        # bitrate (optional)
-        if "b:v" in config:
-            if not isinstance(config["b:v"], str):
-                return {"ok": False, "error": f"Recipe '{rname}': b:v must be a string, e.g. '0' or '2000k'."}
-
-    return {"ok": True, "data": recipes}
+TWO_PASS_CODECS = ["libx264", "libx265", "libvpx-vp9"]
+
+# scale filter flags accepted for ladder recipes
+SCALERS = ["fast_bilinear", "bilinear", "bicubic", "neighbor", "area", "bicublin",
+           "gauss", "sinc", "lanczos", "spline"]
+
+
+def validate_recipe(rname, config, capabilities=None):
+    """
+    Validates one (already resolved) recipe.
+    capabilities (optional, from capabilities.get_capabilities()):
+    also accept any video encoder present in the local ffmpeg build.
+    Return: {"ok": True} or {"ok": False, "error": "..."}
+    """
+    build_encoders = (capabilities or {}).get("encoders", {})
+
+    if not isinstance(config, dict):
+        return {"ok": False, "error": f"Recipe '{rname}' is not a dictionary object."}
+
+    # 'codec' is required
+    if "codec" not in config:
+        return {"ok": False, "error": f"Recipe '{rname}' does not contain 'codec'."}
+
+    codec = config["codec"]
+    if codec not in VALID_CODECS and build_encoders.get(codec) != "video":
+        return {"ok": False, "error": f"Recipe '{rname}': codec '{codec}' is not valid."}
+
+    # CRF (optional but common)
+    if "crf" in config:
+        if not isinstance(config["crf"], int):
+            return {"ok": False, "error": f"Recipe '{rname}': crf must be an integer."}
+
+        crf = config["crf"]
+        if codec in ["libx264", "libx265"] and not (0 <= crf <= 51):
+            return {"ok": False, "error": f"Recipe '{rname}': crf {crf} is out of range 0–51."}
+
+        if codec == "libvpx-vp9" and not (0 <= crf <= 63):
+            return {"ok": False, "error": f"Recipe '{rname}': crf {crf} is out of range 0–63."}
+
+    # Preset (x264/x265 only)
+    if "preset" in config:
+        preset = config["preset"]
+        if codec not in PRESETS:
+            return {"ok": False, "error": f"Recipe '{rname}': preset not supported for codec {codec}."}
+
+        if preset not in PRESETS[codec]:
+            return {"ok": False, "error": f"Recipe '{rname}': preset '{preset}' is not valid for {codec}."}
+
+    # Deadline (VP9 only)
+    if "deadline" in config:
+        if codec != "libvpx-vp9":
+            return {"ok": False, "error": f"Recipe '{rname}': deadline is only for codec libvpx-vp9."}
+        if config["deadline"] not in VP9_DEADLINES:
+            return {"ok": False, "error": f"Recipe '{rname}': deadline '{config['deadline']}' is not valid."}
+
+    # bitrate (optional)
+    if "b:v" in config:
+        if not isinstance(config["b:v"], str):
+            return {"ok": False, "error": f"Recipe '{rname}': b:v must be a string, e.g. '0' or '2000k'."}
+
+    # rate caps (optional)
+    for key in ("maxrate", "bufsize"):
+        if key in config and not isinstance(config[key], str):
+            return {"ok": False, "error": f"Recipe '{rname}': {key} must be a string, e.g. '3000k'."}
+
+    # two-pass ABR (optional): "passes": 2 with a target "b:v"
+    if "passes" in config:
+        passes = config["passes"]
+        if passes not in (1, 2) or isinstance(passes, bool):
+            return {"ok": False, "error": f"Recipe '{rname}': passes must be 1 or 2."}
+
+        if passes == 2:
+            if codec not in TWO_PASS_CODECS:
+                return {"ok": False, "error": f"Recipe '{rname}': two-pass not supported for codec {codec}."}
+            if str(config.get("b:v", "0")) in ("0", ""):
+                return {"ok": False, "error": f"Recipe '{rname}': two-pass needs a target b:v, e.g. '2000k'."}
+            if "crf" in config and codec != "libvpx-vp9":
+                return {"ok": False, "error": f"Recipe '{rname}': two-pass {codec} uses b:v, not crf."}
+
+    # resolution ladder rung (optional): "scale": 720 / "1280x720", "scaler": "lanczos"
+    if "scale" in config and parse_scale(config["scale"]) is None:
+        return {"ok": False, "error": f"Recipe '{rname}': scale must be a height (e.g. 720) or 'WxH' (e.g. '1280x720')."}
+
+    if "scaler" in config:
+        if "scale" not in config:
+            return {"ok": False, "error": f"Recipe '{rname}': scaler needs a scale."}
+        if config["scaler"] not in SCALERS:
+            return {"ok": False, "error": f"Recipe '{rname}': scaler '{config['scaler']}' is not valid."}
+
+    # pass-through encoder options (optional): {"tune": "film", ...}
+    if "options" in config:
+        options = config["options"]
+        if not isinstance(options, dict):
+            return {"ok": False, "error": f"Recipe '{rname}': options must be a dictionary."}
+
+        for key, val in options.items():
+            if not key or not isinstance(val, (str, int, float)) or isinstance(val, bool):
+                return {"ok": False, "error": f"Recipe '{rname}': option '{key}' must have a string or number value."}
+
+    return {"ok": True}
+
+
+def check_recipes_supported(recipes, capabilities, recipe_ids=None):
+    """
+    Rejects recipes whose encoder is missing from the local ffmpeg build.
+    capabilities: data dict from capabilities.get_capabilities().
+    recipe_ids: only check these (None → all).
+    """
+    encoders = capabilities.get("encoders", {})
+    ids = list(recipes) if recipe_ids is None else recipe_ids
+
+    unsupported = [
+        f"{rid} ({recipes[rid]['codec']})"
+        for rid in ids
+        if rid in recipes and recipes[rid].get("codec") not in encoders
+    ]
+    if unsupported:
+        return {
+            "ok": False,
+            "error": f"Encoder not available in this FFmpeg build: {', '.join(unsupported)}"
+        }
+
+    return {"ok": True}
@@ -0,0 +1,362 @@
+import argparse
+import json
+import shutil
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from .pipeline import preflight, apply_file
+from .adaptive import make_controller
+from .cancel import CancelToken, timed_out_result
+
+
+# files picked up from the watch folder (same as the GUI's file dialogs)
+VIDEO_EXTS = {".mp4", ".mkv", ".mov", ".avi"}
+
+# seconds between status log lines / status file writes
+STATUS_INTERVAL = 60
+
+
+def _unique_target(folder, name):
+    """
+    folder/name, or folder/stem_N.ext if that already exists.
+    """
+    target = Path(folder) / name
+    n = 1
+    while target.exists():
+        target = Path(folder) / f"{Path(name).stem}_{n}{Path(name).suffix}"
+        n += 1
+    return target
+
+
+# ─────────────────────────────────────────────────────────────
+#  WATCHER
+# ─────────────────────────────────────────────────────────────
+class FolderWatcher:
+    """
+    Long-running apply of one recipe to every video dropped into input_dir.
+
+    A file is queued once its size and mtime have not changed for
+    settle_sec (the writer is done with it). Queued files run through the
+    same per-file apply and concurrency controller as apply_multi.
+    Finished inputs are moved to done_dir, failed ones to failed_dir
+    (with a .log file holding the error); outputs go to output_dir.
+    """
+
+    def __init__(self, input_dir, recipe_id, recipes_json, output_dir,
+                 done_dir=None, failed_dir=None, concurrency=1, poll_interval=5.0,
+                 settle_sec=10.0, timeout=None, log=None, status_file=None):
+        self.input_dir = Path(input_dir)
+        self.recipe_id = recipe_id
+        self.recipes_json = recipes_json
+        self.output_dir = Path(output_dir)
+        self.done_dir = Path(done_dir) if done_dir else self.input_dir / "done"
+        self.failed_dir = Path(failed_dir) if failed_dir else self.input_dir / "failed"
+        self.poll_interval = poll_interval
+        self.settle_sec = settle_sec
+        self.timeout = timeout
+        self.log = log
+        self.status_file = Path(status_file) if status_file else None
+
+        self.controller = make_controller(concurrency, log)
+        self.cancel = CancelToken()
+
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._pending = {}          # path → (size, mtime_ns, unchanged since)
+        self._queue = deque()       # stable files waiting for a slot
+        self._running = {}          # path → thread
+        self._started = None
+        self._counters = {"done": 0, "failed": 0, "bytes_done": 0, "encode_sec": 0.0}
+
+    def _log(self, msg):
+        if self.log:
+            self.log(msg)
+
+    # ─ counters
+    def stats(self):
+        """
+        Snapshot: queue depth, running jobs, totals and throughput.
+        """
+        with self._cond:
+            c = dict(self._counters)
+            queued, running = len(self._queue), len(self._running)
+            waiting = len(self._pending)
+
+        uptime = time.monotonic() - self._started if self._started else 0.0
+        hours = uptime / 3600 or None
+
+        return {
+            "recipe_id": self.recipe_id,
+            "uptime_sec": round(uptime, 1),
+            "settling": waiting,
+            "queued": queued,
+            "running": running,
+            "jobs": self.controller.jobs,
+            "done": c["done"],
+            "failed": c["failed"],
+            "bytes_done": c["bytes_done"],
+            "encode_sec": round(c["encode_sec"], 1),
+            "files_per_hour": round(c["done"] / hours, 2) if hours else None,
+            "mb_per_min": round(c["bytes_done"] / 1e6 / (uptime / 60), 2) if uptime else None,
+        }
+
+    def _report(self):
+        s = self.stats()
+        self._log(f"[WATCH] queued={s['queued']} running={s['running']} settling={s['settling']} "
+                  f"done={s['done']} failed={s['failed']} files/h={s['files_per_hour']} "
+                  f"MB/min={s['mb_per_min']}")
+        if self.status_file:
+            try:
+                self.status_file.write_text(json.dumps(s, indent=2), encoding="utf-8")
+            except OSError as e:
+                self._log(f"[ERROR] Cannot write status file: {e}")
+
+    # ─ scanning
+    def _scan(self):
+        """
+        Moves files whose size/mtime stayed unchanged for settle_sec into the queue.
+        """
+        now = time.monotonic()
+        seen = set()
+
+        try:
+            entries = list(self.input_dir.iterdir())
+        except OSError as e:
+            self._log(f"[ERROR] Cannot list {self.input_dir}: {e}")
+            return
+
+        for path in entries:
+            if path.name.startswith(".") or path.suffix.lower() not in VIDEO_EXTS:
+                continue
+            try:
+                if not path.is_file():
+                    continue
+                st = path.stat()
+            except OSError:
+                continue
+
+            seen.add(path)
+            with self._cond:
+                if path in self._running or path in self._queue:
+                    continue
+
+                sig = (st.st_size, st.st_mtime_ns)
+                prev = self._pending.get(path)
+                if prev is None or prev[:2] != sig:
+                    self._pending[path] = (*sig, now)
+                    continue
+
+                if st.st_size == 0 or now - prev[2] < self.settle_sec:
+                    continue
+
+            # still locked by the writer (Windows) → try again next poll
+            try:
+                with open(path, "rb"):
+                    pass
+            except OSError:
+                continue
+
+            with self._cond:
+                self._pending.pop(path, None)
+                self._queue.append(path)
+            self._log(f"[WATCH] Queued {path.name}")
+
+        with self._cond:
+            for gone in set(self._pending) - seen:
+                self._pending.pop(gone, None)
+
+    # ─ jobs
+    def _move(self, path, folder):
+        try:
+            folder.mkdir(parents=True, exist_ok=True)
+            target = _unique_target(folder, path.name)
+            shutil.move(str(path), str(target))
+            return target
+        except OSError as e:
+            self._log(f"[ERROR] Cannot move {path.name} to {folder}: {e}")
+            return None
+
+    def _finish(self, path, res, size):
+        if self.cancel.cancelled:
+            # left in place → picked up again on the next start
+            return
+
+        if res["ok"]:
+            self._move(path, self.done_dir)
+            with self._cond:
+                self._counters["done"] += 1
+                self._counters["bytes_done"] += size
+                self._counters["encode_sec"] += (res.get("data") or {}).get("elapsed_sec") or 0.0
+            self._log(f"[WATCH] Done {path.name}")
+            return
+
+        target = self._move(path, self.failed_dir)
+        if target is not None:
+            try:
+                target.with_name(target.name + ".log").write_text(
+                    f"{res.get('error')}\n", encoding="utf-8"
+                )
+            except OSError:
+                pass
+        with self._cond:
+            self._counters["failed"] += 1
+        self._log(f"[WATCH] Failed {path.name}: {res.get('error')}")
+
+    def _worker(self, path, recipe):
+        key = str(path)
+
+        def _progress(stats):
+            self.controller.report_fps(key, stats.get("fps"))
+
+        try:
+            size = path.stat().st_size
+        except OSError:
+            size = 0
+
+        # own token per file: the deadline stops this file only
+        cancel = self.cancel.child()
+        timer = cancel.cancel_after(self.timeout) if self.timeout else None
+        try:
+            res = apply_file(path, self.recipe_id, recipe, self.output_dir, log=self.log,
+                             cancel=cancel, threads=self.controller.threads_per_job(),
+                             progress=_progress)
+        except Exception as e:
+            res = {"ok": False, "error": f"Job error: {e}", "data": None}
+        finally:
+            if timer:
+                timer.cancel()
+            self.controller.job_finished(key)
+        if cancel.timed_out:
+            res = timed_out_result(self.timeout)
+
+        self._finish(path, res, size)
+
+        with self._cond:
+            self._running.pop(path, None)
+            self._cond.notify_all()
+
+    def _dispatch(self):
+        with self._cond:
+            if not self._queue or len(self._running) >= self.controller.jobs:
+                return
+
+        # recipes.json may change while watching (cached until it does)
+        pf = preflight(self.recipes_json, [self.recipe_id])
+        if not pf["ok"]:
+            self._log(f"[ERROR] {pf['error']} (files stay queued)")
+            return
+        recipe = pf["data"][1][self.recipe_id]
+
+        with self._cond:
+            while self._queue and len(self._running) < self.controller.jobs:
+                path = self._queue.popleft()
+                t = threading.Thread(target=self._worker, args=(path, recipe), daemon=True)
+                self._running[path] = t
+                t.start()
+
+    # ─ control
+    @property
+    def stopping(self):
+        return self._stop.is_set()
+
+    def stop(self, cancel_running=False):
+        """
+        Stops scanning; running jobs finish (or are killed with cancel_running).
+        """
+        self._stop.set()
+        if cancel_running:
+            self.cancel.cancel()
+        with self._cond:
+            self._cond.notify_all()
+
+    def run(self):
+        """
+        Blocks until stop(). Return: {"ok", "error", "data": final stats}
+        """
+        pf = preflight(self.recipes_json, [self.recipe_id])
+        if not pf["ok"]:
+            return pf
+
+        if not self.input_dir.is_dir():
+            return {"ok": False, "error": f"Watch folder not found: {self.input_dir}", "data": None}
+
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            return {"ok": False, "error": f"Failed to create folder: {e}", "data": None}
+
+        self._started = time.monotonic()
+        last_report = self._started
+        self._log(f"[WATCH] Watching {self.input_dir} → {self.output_dir} (recipe '{self.recipe_id}')")
+
+        while not self._stop.is_set():
+            self._scan()
+            self._dispatch()
+            self.controller.tick()
+
+            if time.monotonic() - last_report >= STATUS_INTERVAL:
+                last_report = time.monotonic()
+                self._report()
+
+            self._stop.wait(self.poll_interval)
+
+        # drain: wait for running jobs (killed already if cancelled)
+        with self._cond:
+            while self._running:
+                self._cond.wait(timeout=0.5)
+
+        self._report()
+        return {"ok": True, "error": None, "data": self.stats()}
+
+
+# ─────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m engine.watch")
+    ap.add_argument("input_dir", help="folder to watch")
+    ap.add_argument("--recipe", required=True)
+    ap.add_argument("--recipes", default="recipes.json")
+    ap.add_argument("--outdir", default="output")
+    ap.add_argument("--done", help="finished inputs (default: <input_dir>/done)")
+    ap.add_argument("--failed", help="failed inputs (default: <input_dir>/failed)")
+    ap.add_argument("--jobs", default="1", help="concurrent encodes, or 'auto'")
+    ap.add_argument("--poll", type=float, default=5.0, help="seconds between scans")
+    ap.add_argument("--settle", type=float, default=10.0,
+                    help="seconds a file must stay unchanged before it is queued")
+    ap.add_argument("--timeout", type=float, help="wall-clock limit per input file (s)")
+    ap.add_argument("--status-file", help="JSON file updated with queue/throughput counters")
+    args = ap.parse_args(argv)
+
+    concurrency = args.jobs if args.jobs == "auto" else int(args.jobs)
+
+    watcher = FolderWatcher(
+        args.input_dir, args.recipe, args.recipes, args.outdir,
+        done_dir=args.done, failed_dir=args.failed, concurrency=concurrency,
+        poll_interval=args.poll, settle_sec=args.settle, timeout=args.timeout,
+        log=print, status_file=args.status_file
+    )
+
+    # first Ctrl-C / SIGTERM: finish running files; second: kill them
+    def _on_signal(signum, frame):
+        if watcher.stopping:
+            print("[WATCH] Cancelling running jobs...")
+            watcher.stop(cancel_running=True)
+        else:
+            print("[WATCH] Stopping after running jobs (again to cancel them)...")
+            watcher.stop()
+
+    signal.signal(signal.SIGINT, _on_signal)
+    signal.signal(signal.SIGTERM, _on_signal)
+
+    res = watcher.run()
+    print("OK" if res["ok"] else f"ERROR: {res['error']}")
+    return 0 if res["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import threading
 import queue
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
@@ -7,14 +8,32 @@ import webbrowser
 import os
 
 from engine.pipeline import proxy_and_test, apply_single, apply_multi
-from engine.validator import load_and_validate_recipes
+from engine.predict import predict_batch
+from engine.sampling import sample_and_test
+from engine.streamed import apply_streamed
+from engine.autoselect import auto_apply, OBJECTIVES
+from engine.results import COLUMNS as RESULT_COLUMNS, load_results, query as query_results
+from engine.recipes import load_and_validate_recipes
 from engine.ffmpeg_check import check_ffmpeg
+from engine.cancel import kill_all
+from engine.jobs import JobQueue, QUEUED, RUNNING, FINISHED_STATES
 
 BASE_DIR = Path(__file__).resolve().parent
 # IMPORTANT: recipes.json is loaded from the current working directory
 # (for the .exe this is the folder where the executable resides)
 RECIPES_PATH = Path.cwd() / "recipes.json"
 
+# Job queue: tests run before queued applies; running jobs share a budget
+# of slots (one slot = one concurrent encode, default: CPU count)
+PRIORITY_TEST = 10
+PRIORITY_APPLY = 0
+JOB_WORKERS = 4
+JOB_MAX_QUEUED = 64
+
+# job kinds stopped by each tab's Cancel button
+TEST_KINDS = ("test",)
+APPLY_KINDS = ("apply", "apply_multi", "auto_apply")
+
 
 # ============================================================
 #  MAIN APPLICATION
@@ -28,19 +47,25 @@ class MainApp(tk.Tk):
         self.minsize(900, 650)
 
         self.ffmpeg_ok = False
-        self.busy = False
         self.default_status_bg = "#666666"
         self.banner_after_id = None
 
+        self.job_queue = JobQueue(JOB_WORKERS, JOB_MAX_QUEUED, budget=os.cpu_count() or 2)
+        self.jobs_hidden = set()    # finished jobs cleared from the Jobs tab
+
         self.log_queue = queue.Queue()
         self.status_queue = queue.Queue()
+        self.results_queue = queue.Queue()
+        self.ui_queue = queue.Queue()       # callables from worker threads, run on the Tk thread
 
         self.recipes = {}
         self.recipe_ids = []
 
         self._build_ui()
         self._initial_env_check()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
         self.after(100, self._poll_queues)
+        self.after(500, self._poll_jobs)
 
     # ============================================================
     #  TIME PARSER (NEW FIXED VERSION)
@@ -95,11 +120,16 @@ class MainApp(tk.Tk):
 
         self.tab_test_outer = ttk.Frame(self.notebook)
         self.tab_apply = ttk.Frame(self.notebook)
+        self.tab_results = ttk.Frame(self.notebook)
+        self.tab_jobs = ttk.Frame(self.notebook)
         self.tab_settings = ttk.Frame(self.notebook)
 
         self.notebook.add(self.tab_test_outer, text="Test")
         self.notebook.add(self.tab_apply, text="Apply")
+        self.notebook.add(self.tab_results, text="Results")
+        self.notebook.add(self.tab_jobs, text="Jobs")
         self.notebook.add(self.tab_settings, text="Settings")
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
 
         # ------------------ STATUS BANNER ------------------
         self.banner_container = tk.Frame(self, bg=self.default_status_bg)
@@ -162,6 +192,8 @@ class MainApp(tk.Tk):
         # Build tabs
         self._build_tab_test()
         self._build_tab_apply()
+        self._build_tab_results()
+        self._build_tab_jobs()
         self._build_tab_settings()
 
     # ============================================================
@@ -208,6 +240,39 @@ class MainApp(tk.Tk):
             variable=self.keep_proxy_var
         ).pack(anchor="w", pady=(0, 12))
 
+        # Shared decode (fan-out) Checkbox
+        self.fanout_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            left,
+            text="Shared decode (one ffmpeg for all recipes)",
+            variable=self.fanout_var
+        ).pack(anchor="w", pady=(0, 12))
+
+        # Per-stage timing (ffmpeg -benchmark / -benchmark_all)
+        self.instrument_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            left,
+            text="Per-stage timing (decode / encode / other → bench.csv)",
+            variable=self.instrument_var
+        ).pack(anchor="w", pady=(0, 12))
+
+        # Random sampling (replaces the start list)
+        self.sampling_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            left,
+            text="Random sampling (ignore start times)",
+            variable=self.sampling_var
+        ).pack(anchor="w")
+
+        sampling_row = ttk.Frame(left)
+        sampling_row.pack(anchor="w", pady=(2, 12))
+        ttk.Label(sampling_row, text="Max clips:").pack(side="left")
+        self.sampling_max_var = tk.StringVar(value="32")
+        ttk.Entry(sampling_row, textvariable=self.sampling_max_var, width=5).pack(side="left", padx=(4, 10))
+        ttk.Label(sampling_row, text="Bitrate ±%:").pack(side="left")
+        self.sampling_tol_var = tk.StringVar(value="5")
+        ttk.Entry(sampling_row, textvariable=self.sampling_tol_var, width=5).pack(side="left", padx=(4, 0))
+
         ttk.Label(left, text="Start time (seconds or hh:mm:ss):").pack(anchor="w")
 
         self.start_entries_frame = ttk.Frame(left)
@@ -260,6 +325,10 @@ class MainApp(tk.Tk):
         self.btn_run_test = ttk.Button(btn_row, text="Run Test", command=self._on_run_test)
         self.btn_run_test.pack(side="left", expand=True, fill="x")
 
+        self.btn_test_cancel = ttk.Button(btn_row, text="Cancel", command=lambda: self._on_cancel(TEST_KINDS))
+        self.btn_test_cancel.pack(side="left", padx=(8, 0))
+        self.btn_test_cancel.config(state="disabled")
+
         self.btn_test_open = ttk.Button(btn_row, text="Open Folder", command=self._on_test_open_folder)
         self.btn_test_open.pack(side="right", padx=(8, 0))
         self.btn_test_open.config(state="disabled")
@@ -291,30 +360,37 @@ class MainApp(tk.Tk):
     #  RUN TEST
     # ============================================================
     def _on_run_test(self):
-        if self.busy:
-            return
-
         input_file = self.test_input_var.get().strip()
         if not input_file:
             messagebox.showerror("Error", "No input video selected.")
             return
 
-        raw_starts = [e.get().strip() for e in self.start_entries if e.get().strip()]
-        if not raw_starts:
-            messagebox.showerror("Error", "At least one start value is required.")
-            return
+        sampling = self.sampling_var.get()
+        duration = self.test_duration_var.get().strip()
 
-        converted = []
-        for val in raw_starts:
+        if sampling:
             try:
-                converted.append(str(self._time_to_seconds(val)))
-            except:
-                messagebox.showerror("Error", f"Invalid time format: {val}")
+                max_clips = int(self.sampling_max_var.get())
+                tolerance = float(self.sampling_tol_var.get()) / 100
+                clip_len = float(duration)
+            except ValueError:
+                messagebox.showerror("Error", "Max clips, tolerance and duration must be numbers.")
+                return
+        else:
+            raw_starts = [e.get().strip() for e in self.start_entries if e.get().strip()]
+            if not raw_starts:
+                messagebox.showerror("Error", "At least one start value is required.")
                 return
 
-        start_list = ",".join(converted)
+            converted = []
+            for val in raw_starts:
+                try:
+                    converted.append(str(self._time_to_seconds(val)))
+                except:
+                    messagebox.showerror("Error", f"Invalid time format: {val}")
+                    return
 
-        duration = self.test_duration_var.get().strip()
+            start_list = ",".join(converted)
 
         recipes = [rid for rid, var in self.test_recipe_vars.items() if var.get()]
         if not recipes:
@@ -324,30 +400,73 @@ class MainApp(tk.Tk):
         pick = ",".join(recipes)
         outdir = self.test_outdir_var.get().strip()
 
-        self._set_busy(True)
-        self._push_status("info", "Running Test...")
+        timeout = self._job_timeout()
+        if timeout is False:
+            return
 
-        def worker():
-            res = proxy_and_test(
-                input_file=input_file,
-                start_list=start_list,
-                duration=duration,
-                recipes_json=str(RECIPES_PATH),
-                pick=pick,
-                outdir=outdir,
-                log=self._log_callback,
-                keep_proxy=self.keep_proxy_var.get()
-            )
-            if not res.get("ok"):
+        concurrency = self._concurrency()
+        fanout = self.fanout_var.get()
+        keep_proxy = self.keep_proxy_var.get()
+        instrument = self.instrument_var.get()
+
+        def run(log, cancel):
+            if sampling:
+                res = sample_and_test(
+                    input_file=input_file,
+                    recipes_json=str(RECIPES_PATH),
+                    clip_len=clip_len,
+                    max_clips=max_clips,
+                    tolerance={"bitrate_kbps": tolerance},
+                    pick=pick,
+                    outdir=outdir,
+                    log=log,
+                    cancel=cancel,
+                    concurrency=concurrency,
+                    fanout=fanout,
+                    keep_proxy=keep_proxy,
+                    instrument=instrument
+                )
+            else:
+                res = proxy_and_test(
+                    input_file=input_file,
+                    start_list=start_list,
+                    duration=duration,
+                    recipes_json=str(RECIPES_PATH),
+                    pick=pick,
+                    outdir=outdir,
+                    log=log,
+                    keep_proxy=keep_proxy,
+                    fanout=fanout,
+                    cancel=cancel,
+                    concurrency=concurrency,
+                    instrument=instrument
+                )
+            if cancel.timed_out:
+                self._push_status("error", f"Test timed out after {timeout:g}s.")
+                self._push_ui(self._set_enabled, self.btn_test_open, False)
+            elif cancel.cancelled:
+                self._push_status("info", "Test cancelled.")
+                self._push_ui(self._set_enabled, self.btn_test_open, False)
+            elif not res.get("ok"):
                 self._push_status("error", res.get("error"))
-                self.btn_test_open.config(state="disabled")
+                self._push_ui(self._set_enabled, self.btn_test_open, False)
+            elif sampling:
+                d = res["data"]
+                state = "converged" if d["converged"] else "not converged (max clips)"
+                self._push_status("ok", f"Sampling completed: {d['clips']} clips, {state}.")
+                self._push_ui(self._set_enabled, self.btn_test_open, True)
             else:
                 self._push_status("ok", "Test completed.")
-                self.btn_test_open.config(state="normal")
+                self._push_ui(self._set_enabled, self.btn_test_open, True)
 
-            self._set_busy(False)
+            if res.get("ok"):
+                # loaded when the Results tab is opened; set on the Tk thread
+                self._push_ui(setattr, self, "results_pending", outdir)
 
-        threading.Thread(target=worker, daemon=True).start()
+            return res
+
+        self._submit_job("test", f"Test {Path(input_file).name} ({len(recipes)} recipes)", run,
+                         PRIORITY_TEST, self._job_cost(concurrency), outdir, timeout)
 
     def _on_test_open_folder(self):
         self._open_folder(self.test_outdir_var.get().strip())
@@ -401,10 +520,86 @@ class MainApp(tk.Tk):
         self.btn_apply = ttk.Button(btn_row, text="Apply", command=self._on_apply)
         self.btn_apply.pack(side="left", expand=True, fill="x")
 
+        self.btn_apply_cancel = ttk.Button(btn_row, text="Cancel", command=lambda: self._on_cancel(APPLY_KINDS))
+        self.btn_apply_cancel.pack(side="left", padx=(8, 0))
+        self.btn_apply_cancel.config(state="disabled")
+
         self.btn_apply_open = ttk.Button(btn_row, text="Open Folder", command=self._on_apply_open_folder)
         self.btn_apply_open.pack(side="right", padx=(8, 0))
         self.btn_apply_open.config(state="disabled")
 
+        # ESTIMATE (from the Test tab's summary.csv)
+        est_row = ttk.Frame(f)
+        est_row.grid(row=5, column=0, columnspan=2, sticky="ew", padx=16, pady=(0, 12))
+
+        ttk.Button(est_row, text="Estimate", command=self._on_estimate_apply).pack(side="left")
+        self.apply_estimate_var = tk.StringVar(value="Run a test with the recipe, then Estimate.")
+        ttk.Label(est_row, textvariable=self.apply_estimate_var).pack(side="left", padx=(8, 0))
+
+        # STREAMED (single file: quality measured per segment while encoding)
+        qc_row = ttk.Frame(f)
+        qc_row.grid(row=6, column=0, columnspan=2, sticky="ew", padx=16, pady=(0, 12))
+
+        self.apply_streamed_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            qc_row,
+            text="Check quality while encoding (single file)",
+            variable=self.apply_streamed_var
+        ).pack(side="left")
+        ttk.Label(qc_row, text="Stop if SSIM below:").pack(side="left", padx=(12, 0))
+        self.apply_min_ssim_var = tk.StringVar(value="")
+        ttk.Entry(qc_row, textvariable=self.apply_min_ssim_var, width=7).pack(side="left", padx=(4, 0))
+
+        # AUTO (short test per file, smallest/fastest recipe meeting the target)
+        auto_row = ttk.Frame(f)
+        auto_row.grid(row=7, column=0, columnspan=2, sticky="ew", padx=16, pady=(0, 12))
+
+        self.apply_auto_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            auto_row,
+            text="Auto-pick recipe per file (from recipes checked on the Test tab)",
+            variable=self.apply_auto_var,
+            command=self._update_buttons_state
+        ).pack(side="left")
+        ttk.Label(auto_row, text="SSIM ≥").pack(side="left", padx=(12, 0))
+        self.apply_auto_ssim_var = tk.StringVar(value="0.97")
+        ttk.Entry(auto_row, textvariable=self.apply_auto_ssim_var, width=7).pack(side="left", padx=(4, 10))
+        self.apply_auto_objective_var = tk.StringVar(value=OBJECTIVES[0])
+        ttk.Combobox(
+            auto_row, textvariable=self.apply_auto_objective_var, values=OBJECTIVES,
+            state="readonly", width=7
+        ).pack(side="left")
+
+    def _on_estimate_apply(self):
+        files = list(self.apply_listbox.get(0, tk.END))
+        recipe_id = self.apply_recipe_var.get().strip()
+        if not files or not recipe_id:
+            messagebox.showerror("Error", "Select input files and one recipe first.")
+            return
+
+        summary = Path(self.test_outdir_var.get().strip()) / "summary.csv"
+        if not summary.is_file():
+            messagebox.showerror("Error", f"No test results found: {summary}")
+            return
+
+        self.apply_estimate_var.set("Estimating...")
+
+        def worker():
+            res = predict_batch(files, summary, recipe_id)
+            if not res["ok"]:
+                self._push_ui(self.apply_estimate_var.set, f"Estimate failed: {res['error']}")
+                return
+
+            t = res["data"]["total"]
+            mb = 1024 * 1024
+            self._push_ui(
+                self.apply_estimate_var.set,
+                f"≈ {t['time_sec'] / 60:.1f} min ({t['time_low'] / 60:.1f}–{t['time_high'] / 60:.1f}), "
+                f"≈ {t['size_bytes'] / mb:.1f} MB ({t['size_low'] / mb:.1f}–{t['size_high'] / mb:.1f})"
+            )
+
+        threading.Thread(target=worker, daemon=True).start()
+
     def _on_add_apply_files(self):
         paths = filedialog.askopenfilenames(
             filetypes=[("Video Files", "*.mp4 *.mkv *.mov *.avi"), ("All Files", "*.*")]
@@ -427,23 +622,34 @@ class MainApp(tk.Tk):
             self.apply_outdir_var.set(p)
 
     def _on_apply(self):
-        if self.busy:
-            return
-
         files = list(self.apply_listbox.get(0, tk.END))
         if not files:
             messagebox.showerror("Error", "At least one input file is required.")
             return
 
+        outdir = self.apply_outdir_var.get().strip()
+
+        if self.apply_auto_var.get():
+            self._on_auto_apply(files, outdir)
+            return
+
         recipe_id = self.apply_recipe_var.get().strip()
         if not recipe_id:
             messagebox.showerror("Error", "Select one recipe.")
             return
 
-        outdir = self.apply_outdir_var.get().strip()
+        timeout = self._job_timeout()
+        if timeout is False:
+            return
 
-        self._set_busy(True)
-        self._push_status("info", "Running Apply...")
+        streamed = self.apply_streamed_var.get() and len(files) == 1
+        min_ssim = None
+        if streamed and self.apply_min_ssim_var.get().strip():
+            try:
+                min_ssim = float(self.apply_min_ssim_var.get())
+            except ValueError:
+                messagebox.showerror("Error", "Minimum SSIM must be a number (e.g. 0.95).")
+                return
 
         # Single file
         if len(files) == 1:
@@ -451,49 +657,474 @@ class MainApp(tk.Tk):
             Path(outdir).mkdir(parents=True, exist_ok=True)
             outfile = str(Path(outdir) / f"{infile.stem}_{recipe_id}.mp4")
 
-            def worker_single():
-                res = apply_single(
-                    input_file=str(infile),
-                    recipe_id=recipe_id,
-                    recipes_json=str(RECIPES_PATH),
-                    output_file=outfile,
-                    log=self._log_callback
+            def on_quality(q):
+                self._push_status(
+                    "info",
+                    f"Encoding... {q['measured_sec']:.0f}s checked: SSIM {q['ssim']} "
+                    f"(recent {q['rolling_ssim']}), PSNR {q['psnr']}"
                 )
 
-                if not res.get("ok"):
+            def run_single(log, cancel):
+                if streamed:
+                    res = apply_streamed(
+                        input_file=str(infile),
+                        recipe_id=recipe_id,
+                        recipes_json=str(RECIPES_PATH),
+                        output_file=outfile,
+                        min_ssim=min_ssim,
+                        log=log,
+                        on_quality=on_quality,
+                        cancel=cancel
+                    )
+                else:
+                    res = apply_single(
+                        input_file=str(infile),
+                        recipe_id=recipe_id,
+                        recipes_json=str(RECIPES_PATH),
+                        output_file=outfile,
+                        log=log,
+                        cancel=cancel
+                    )
+
+                if cancel.timed_out:
+                    self._push_status("error", f"Apply timed out after {timeout:g}s: {infile.name}.")
+                elif cancel.cancelled:
+                    self._push_status("info", f"Apply cancelled: {infile.name}.")
+                elif not res.get("ok"):
                     self._push_status("error", res.get("error"))
                 else:
-                    self._push_status("ok", "Apply completed.")
-                    self.btn_apply_open.config(state="normal")
+                    self._push_status("ok", f"Apply completed: {infile.name}.")
+                    self._push_ui(self._set_enabled, self.btn_apply_open, True)
 
-                self._set_busy(False)
+                return res
 
-            threading.Thread(target=worker_single, daemon=True).start()
+            self._submit_job("apply", f"Apply {infile.name} → {recipe_id}", run_single, PRIORITY_APPLY,
+                             outdir=outdir, timeout=timeout)
 
         # Multi-file batch
         else:
-            def worker_multi():
+            concurrency = self._concurrency()
+
+            def run_multi(log, cancel):
                 res = apply_multi(
                     input_files=files,
                     recipe_id=recipe_id,
                     recipes_json=str(RECIPES_PATH),
                     output_dir=outdir,
-                    log=self._log_callback,
+                    log=log,
+                    cancel=cancel,
+                    concurrency=concurrency
                 )
 
-                if not res.get("ok"):
+                if cancel.timed_out:
+                    self._push_status("error", f"Batch apply timed out after {timeout:g}s.")
+                elif cancel.cancelled:
+                    self._push_status("info", "Batch apply cancelled.")
+                elif not res.get("ok"):
                     self._push_status("error", res.get("error"))
                 else:
                     self._push_status("ok", "Batch apply completed.")
-                    self.btn_apply_open.config(state="normal")
+                    self._push_ui(self._set_enabled, self.btn_apply_open, True)
 
-                self._set_busy(False)
+                return res
 
-            threading.Thread(target=worker_multi, daemon=True).start()
+            self._submit_job("apply_multi", f"Batch apply {len(files)} files → {recipe_id}", run_multi,
+                             PRIORITY_APPLY, self._job_cost(concurrency), outdir, timeout)
+
+    def _on_auto_apply(self, files, outdir):
+        candidates = [rid for rid, var in self.test_recipe_vars.items() if var.get()]
+        if not candidates:
+            messagebox.showerror("Error", "Check the candidate recipes on the Test tab.")
+            return
+
+        try:
+            min_ssim = float(self.apply_auto_ssim_var.get()) if self.apply_auto_ssim_var.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Error", "Target SSIM must be a number (e.g. 0.97).")
+            return
+
+        timeout = self._job_timeout()
+        if timeout is False:
+            return
+
+        objective = self.apply_auto_objective_var.get()
+        concurrency = self._concurrency()
+
+        def run(log, cancel):
+            res = auto_apply(
+                input_files=files,
+                candidates=candidates,
+                recipes_json=str(RECIPES_PATH),
+                output_dir=outdir,
+                constraints={"min_ssim": min_ssim},
+                objective=objective,
+                log=log,
+                cancel=cancel,
+                concurrency=concurrency
+            )
+
+            if cancel.timed_out:
+                self._push_status("error", f"Auto apply timed out after {timeout:g}s.")
+            elif cancel.cancelled:
+                self._push_status("info", "Auto apply cancelled.")
+            elif not res.get("ok"):
+                self._push_status("error", f"{res.get('error')} (see autoselect_log.jsonl)")
+            else:
+                chosen = [r["data"]["decision"]["chosen"] for r in res["data"]]
+                self._push_status("ok", f"Auto apply completed: {', '.join(chosen)}.")
+                self._push_ui(self._set_enabled, self.btn_apply_open, True)
+
+            return res
+
+        self._submit_job("auto_apply", f"Auto apply {len(files)} files ({len(candidates)} candidates)",
+                         run, PRIORITY_APPLY, self._job_cost(concurrency), outdir, timeout)
 
     def _on_apply_open_folder(self):
         self._open_folder(self.apply_outdir_var.get().strip())
 
+    # ============================================================
+    #  RESULTS TAB (virtual table: only visible rows are Treeview items)
+    # ============================================================
+    def _build_tab_results(self):
+        f = self.tab_results
+        f.columnconfigure(0, weight=1)
+        f.rowconfigure(2, weight=1)
+
+        self.results_rows = []
+        self.results_view = []
+        self.results_offset = 0
+        self.results_visible = 20
+        self.results_load_gen = 0
+        self.results_query_gen = 0
+        self.results_loading = False
+        self.results_requery = False    # filter/sort changed while a load was running
+        self.results_sort = (None, False)
+        self.results_pending = None
+
+        # SOURCE
+        src = ttk.Frame(f)
+        src.grid(row=0, column=0, sticky="ew", padx=16, pady=(12, 4))
+        src.columnconfigure(1, weight=1)
+
+        ttk.Label(src, text="Summary / folder:").grid(row=0, column=0, sticky="w")
+        self.results_path_var = tk.StringVar(value=self.test_outdir_var.get())
+        ttk.Entry(src, textvariable=self.results_path_var).grid(row=0, column=1, sticky="ew", padx=6)
+        ttk.Button(src, text="File...", command=self._on_browse_results_file).grid(row=0, column=2)
+        ttk.Button(src, text="Folder...", command=self._on_browse_results_dir).grid(row=0, column=3, padx=6)
+        ttk.Button(src, text="Load", command=self._on_results_load).grid(row=0, column=4)
+
+        # FILTERS
+        flt = ttk.Frame(f)
+        flt.grid(row=1, column=0, sticky="ew", padx=16, pady=4)
+
+        ttk.Label(flt, text="Recipe:").pack(side="left")
+        self.results_recipe_var = tk.StringVar(value="All")
+        self.results_recipe_box = ttk.Combobox(
+            flt, textvariable=self.results_recipe_var, values=["All"], state="readonly", width=16
+        )
+        self.results_recipe_box.pack(side="left", padx=(4, 10))
+        self.results_recipe_box.bind("<<ComboboxSelected>>", lambda e: self._on_results_query())
+
+        self.results_filter_vars = {}
+        for key, label in (("size_min", "Size KB ≥"), ("size_max", "≤"),
+                           ("psnr_min", "PSNR ≥"), ("ssim_min", "SSIM ≥")):
+            ttk.Label(flt, text=label).pack(side="left")
+            var = tk.StringVar()
+            entry = ttk.Entry(flt, textvariable=var, width=8)
+            entry.pack(side="left", padx=(4, 10))
+            entry.bind("<Return>", lambda e: self._on_results_query())
+            self.results_filter_vars[key] = var
+
+        ttk.Button(flt, text="Filter", command=self._on_results_query).pack(side="left")
+        ttk.Button(flt, text="Reset", command=self._on_results_reset).pack(side="left", padx=6)
+
+        self.results_count_var = tk.StringVar(value="No results loaded.")
+        ttk.Label(flt, textvariable=self.results_count_var).pack(side="right")
+
+        # TABLE
+        table = ttk.Frame(f)
+        table.grid(row=2, column=0, sticky="nsew", padx=16, pady=(4, 12))
+        table.rowconfigure(0, weight=1)
+        table.columnconfigure(0, weight=1)
+
+        self.results_tree = ttk.Treeview(table, columns=RESULT_COLUMNS, show="headings", selectmode="browse")
+        self.results_tree.grid(row=0, column=0, sticky="nsew")
+        for col in RESULT_COLUMNS:
+            self.results_tree.heading(col, text=col, command=lambda c=col: self._on_results_sort(c))
+            self.results_tree.column(col, width=80 if col != "run" else 120, anchor="e" if col not in ("run", "recipe_id", "resolution") else "w")
+
+        self.results_scroll = ttk.Scrollbar(table, orient="vertical", command=self._on_results_yview)
+        self.results_scroll.grid(row=0, column=1, sticky="ns")
+
+        self.results_tree.bind("<Configure>", self._on_results_resize)
+        self.results_tree.bind("<MouseWheel>", self._on_results_wheel)
+        self.results_tree.bind("<Button-4>", self._on_results_wheel)
+        self.results_tree.bind("<Button-5>", self._on_results_wheel)
+
+    def _on_tab_changed(self, event=None):
+        if self.notebook.select() == str(self.tab_results) and self.results_pending:
+            self.results_path_var.set(self.results_pending)
+            self.results_pending = None
+            self._on_results_load()
+
+    def _on_browse_results_file(self):
+        p = filedialog.askopenfilename(filetypes=[("Summary CSV", "*.csv"), ("All Files", "*.*")])
+        if p:
+            self.results_path_var.set(p)
+            self._on_results_load()
+
+    def _on_browse_results_dir(self):
+        p = filedialog.askdirectory()
+        if p:
+            self.results_path_var.set(p)
+            self._on_results_load()
+
+    def _results_filters(self):
+        """
+        Filter entries → query() kwargs, or None after an error message.
+        """
+        kwargs = {}
+        for key, var in self.results_filter_vars.items():
+            raw = var.get().strip()
+            if not raw:
+                kwargs[key] = None
+                continue
+            try:
+                kwargs[key] = float(raw)
+            except ValueError:
+                messagebox.showerror("Error", f"Filter value must be a number: {raw}")
+                return None
+
+        recipe = self.results_recipe_var.get()
+        kwargs["recipe"] = None if recipe == "All" else recipe
+        kwargs["sort_col"], kwargs["descending"] = self.results_sort
+        return kwargs
+
+    def _on_results_load(self):
+        path = self.results_path_var.get().strip()
+        if not path:
+            return
+        kwargs = self._results_filters()
+        if kwargs is None:
+            return
+
+        self.results_load_gen += 1
+        self.results_query_gen += 1     # filters still running on the old rows are dropped
+        gen = self.results_load_gen
+        self.results_loading = True
+        self.results_requery = False
+        self.results_count_var.set("Loading...")
+
+        def worker():
+            res = load_results(path)
+            if not res["ok"]:
+                self.results_queue.put((gen, res, None))
+                return
+            view = query_results(res["data"]["rows"], **kwargs)
+            self.results_queue.put((gen, res, view))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_results_query(self):
+        kwargs = self._results_filters()
+        if kwargs is None:
+            return
+
+        if self.results_loading:
+            # re-run on the new rows once the load finishes
+            self.results_requery = True
+            return
+
+        self.results_query_gen += 1
+        gen = self.results_query_gen
+        rows = self.results_rows
+        self.results_count_var.set("Filtering...")
+
+        def worker():
+            self.results_queue.put((gen, None, query_results(rows, **kwargs)))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_results_reset(self):
+        for var in self.results_filter_vars.values():
+            var.set("")
+        self.results_recipe_var.set("All")
+        self.results_sort = (None, False)
+        self._on_results_query()
+
+    def _on_results_sort(self, col):
+        cur, desc = self.results_sort
+        self.results_sort = (col, not desc if cur == col else False)
+        for c in RESULT_COLUMNS:
+            arrow = (" ▼" if self.results_sort[1] else " ▲") if c == col else ""
+            self.results_tree.heading(c, text=c + arrow)
+        self._on_results_query()
+
+    def _on_results_ready(self, gen, loaded, view):
+        # an older load/filter finished after a newer one was started
+        if loaded is not None:
+            if gen != self.results_load_gen:
+                return
+            self.results_loading = False
+            requery, self.results_requery = self.results_requery, False
+            if not loaded["ok"]:
+                self.results_count_var.set(loaded["error"])
+                return
+            self.results_rows = loaded["data"]["rows"]
+            self.results_recipe_box.config(values=["All"] + loaded["data"]["recipes"])
+            if self.results_recipe_var.get() not in ["All"] + loaded["data"]["recipes"]:
+                self.results_recipe_var.set("All")
+            if requery:
+                self._on_results_query()
+                return
+        elif gen != self.results_query_gen:
+            return
+
+        self.results_view = view
+        self.results_offset = 0
+        self.results_count_var.set(f"{len(view):,} of {len(self.results_rows):,} rows")
+        self._render_results()
+
+    def _render_results(self):
+        view = self.results_view
+        total = len(view)
+        visible = self.results_visible
+        self.results_offset = max(0, min(self.results_offset, total - visible))
+        start = self.results_offset
+
+        tree = self.results_tree
+        tree.delete(*tree.get_children())
+        for i in view[start:start + visible]:
+            tree.insert("", "end", values=["" if v is None else v for v in self.results_rows[i]])
+
+        if total:
+            self.results_scroll.set(start / total, min(1.0, (start + visible) / total))
+        else:
+            self.results_scroll.set(0.0, 1.0)
+
+    def _on_results_yview(self, *args):
+        total = len(self.results_view)
+        if args[0] == "moveto":
+            self.results_offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self.results_visible
+            self.results_offset += step
+        self._render_results()
+
+    def _on_results_wheel(self, event):
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
+        else:
+            step = -3 if event.delta > 0 else 3
+        self.results_offset += step
+        self._render_results()
+        return "break"
+
+    def _on_results_resize(self, event):
+        row_h = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible = max(1, (event.height - 25) // row_h)
+        if visible != self.results_visible:
+            self.results_visible = visible
+            self._render_results()
+
+    # ============================================================
+    #  JOBS TAB (queued, running and finished jobs of both tabs)
+    # ============================================================
+    def _build_tab_jobs(self):
+        f = self.tab_jobs
+        f.columnconfigure(0, weight=1)
+        f.rowconfigure(1, weight=1)
+
+        top = ttk.Frame(f)
+        top.grid(row=0, column=0, sticky="ew", padx=16, pady=(12, 4))
+
+        self.jobs_summary_var = tk.StringVar(value="No jobs.")
+        ttk.Label(top, textvariable=self.jobs_summary_var).pack(side="left")
+        ttk.Button(top, text="Clear Finished", command=self._on_jobs_clear).pack(side="right")
+        ttk.Button(top, text="Cancel Selected", command=self._on_jobs_cancel).pack(side="right", padx=6)
+
+        table = ttk.Frame(f)
+        table.grid(row=1, column=0, sticky="nsew", padx=16, pady=(4, 12))
+        table.rowconfigure(0, weight=1)
+        table.columnconfigure(0, weight=1)
+
+        columns = ("job", "state", "priority", "cost", "step", "progress", "elapsed")
+        self.jobs_tree = ttk.Treeview(table, columns=columns, show="headings", selectmode="extended")
+        self.jobs_tree.grid(row=0, column=0, sticky="nsew")
+        widths = {"job": 220, "state": 70, "priority": 60, "cost": 50, "step": 260, "progress": 170, "elapsed": 70}
+        for col in columns:
+            self.jobs_tree.heading(col, text=col)
+            self.jobs_tree.column(col, width=widths[col], anchor="e" if col in ("priority", "cost", "elapsed") else "w")
+
+        scroll = ttk.Scrollbar(table, orient="vertical", command=self.jobs_tree.yview)
+        scroll.grid(row=0, column=1, sticky="ns")
+        self.jobs_tree.configure(yscrollcommand=scroll.set)
+
+    def _job_row(self, job, now):
+        p = job.progress or {}
+        progress = ""
+        if job.state == RUNNING and p.get("frame") is not None:
+            progress = f"frame {p['frame']}"
+            if p.get("fps"):
+                progress += f" · {p['fps']:g} fps"
+            if p.get("speed"):
+                progress += f" · {p['speed']:g}x"
+        elif job.state in FINISHED_STATES and job.result and not job.result.get("ok"):
+            progress = job.result.get("error") or ""
+
+        if job.started:
+            elapsed = f"{(job.finished or now) - job.started:.0f}s"
+        else:
+            elapsed = f"wait {now - job.created:.0f}s"
+        return (job.label, job.state, job.priority, job.cost, job.step or "", progress, elapsed)
+
+    def _poll_jobs(self):
+        """
+        Refreshes the Jobs table: running first, then queued in start
+        order, then finished (most recent first).
+        """
+        now = time.time()
+        jobs = [j for j in self.job_queue.jobs() if j.id not in self.jobs_hidden]
+        rank = {RUNNING: 0, QUEUED: 1}
+        jobs.sort(key=lambda j: (rank.get(j.state, 2),
+                                 -j.priority if j.state == QUEUED else 0,
+                                 j.created if j.state == QUEUED else -(j.finished or j.started or 0)))
+
+        ids = [j.id for j in jobs]
+        stale = set(self.jobs_tree.get_children()) - set(ids)
+        if stale:
+            self.jobs_tree.delete(*stale)
+        for index, job in enumerate(jobs):
+            values = self._job_row(job, now)
+            if self.jobs_tree.exists(job.id):
+                self.jobs_tree.item(job.id, values=values)
+                self.jobs_tree.move(job.id, "", index)
+            else:
+                self.jobs_tree.insert("", index, iid=job.id, values=values)
+
+        st = self.job_queue.stats()
+        if jobs or st["running"] or st["queued"]:
+            self.jobs_summary_var.set(
+                f"{st['running']} running ({st['used']}/{st['budget']} slots), {st['queued']} queued, "
+                f"{st['done']} done, {st['failed']} failed, {st['cancelled']} cancelled"
+            )
+        else:
+            self.jobs_summary_var.set("No jobs.")
+
+        self._update_buttons_state()
+        self.after(500, self._poll_jobs)
+
+    def _on_jobs_cancel(self):
+        for job_id in self.jobs_tree.selection():
+            self.job_queue.cancel(job_id)
+
+    def _on_jobs_clear(self):
+        self.jobs_hidden.update(j.id for j in self.job_queue.jobs() if j.state in FINISHED_STATES)
+
     # ============================================================
     #  SETTINGS TAB
     # ============================================================
@@ -534,20 +1165,46 @@ class MainApp(tk.Tk):
         ttk.Button(env, text="Check FFmpeg", command=self._on_check_ffmpeg).pack(side="left", padx=8, pady=8)
         ttk.Button(env, text="Reload Recipes", command=self._on_reload_recipes).pack(side="left", padx=8, pady=8)
 
+        jobs = ttk.LabelFrame(f, text="Jobs")
+        jobs.pack(fill="x", padx=16, pady=(0, 20))
+
+        ttk.Label(jobs, text="Timeout per job (seconds, 0 = none):").pack(side="left", padx=8, pady=8)
+        self.job_timeout_var = tk.StringVar(value="0")
+        ttk.Entry(jobs, textvariable=self.job_timeout_var, width=10).pack(side="left", padx=8, pady=8)
+
+        ttk.Label(jobs, text="Concurrent encodes:").pack(side="left", padx=(16, 8), pady=8)
+        self.concurrency_var = tk.StringVar(value="1")
+        ttk.Combobox(
+            jobs,
+            textvariable=self.concurrency_var,
+            values=["1", "2", "4", "8", "auto"],
+            width=6
+        ).pack(side="left", padx=8, pady=8)
+
+        ttk.Label(jobs, text="Job budget (slots):").pack(side="left", padx=(16, 8), pady=8)
+        self.job_budget_var = tk.StringVar(value=str(self.job_queue.budget))
+        ttk.Combobox(
+            jobs,
+            textvariable=self.job_budget_var,
+            values=["1", "2", "4", "8", "16", str(self.job_queue.budget)],
+            width=6
+        ).pack(side="left", padx=8, pady=8)
+
     # ============================================================
     #  ENVIRONMENT CHECK
     # ============================================================
     def _initial_env_check(self):
         self._load_recipes()
         self._refresh_recipe_widgets()
-        self._on_check_ffmpeg(update_status_only=True)
+        self._on_check_ffmpeg(update_status_only=True, refresh=False)
         self._update_buttons_state()
 
-    def _on_check_ffmpeg(self, update_status_only=False):
-        res = check_ffmpeg()
+    def _on_check_ffmpeg(self, update_status_only=False, refresh=True):
+        res = check_ffmpeg(refresh=refresh)
         if res.get("ok"):
             self.ffmpeg_ok = True
-            self._push_status("ok", "FFmpeg OK (found in PATH).")
+            version = res.get("version") or "unknown version"
+            self._push_status("ok", f"FFmpeg OK ({version}, found in PATH).")
         else:
             self.ffmpeg_ok = False
             self._push_status("error", res.get("error"))
@@ -619,6 +1276,12 @@ class MainApp(tk.Tk):
     def _push_status(self, kind: str, msg: str):
         self.status_queue.put((kind, msg))
 
+    def _push_ui(self, func, *args):
+        self.ui_queue.put((func, args))
+
+    def _set_enabled(self, widget, enabled):
+        widget.config(state="normal" if enabled else "disabled")
+
     def _poll_queues(self):
         while True:
             try:
@@ -634,6 +1297,20 @@ class MainApp(tk.Tk):
                 break
             self._set_status(kind, msg)
 
+        while True:
+            try:
+                item = self.results_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._on_results_ready(*item)
+
+        while True:
+            try:
+                func, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+
         self.after(100, self._poll_queues)
 
     def _append_log(self, msg: str):
@@ -674,24 +1351,102 @@ class MainApp(tk.Tk):
     # ============================================================
     #  STATE CONTROL
     # ============================================================
-    def _set_busy(self, state: bool):
-        self.busy = state
+    def _job_budget(self):
+        """
+        Slots shared by running jobs (invalid input keeps the current budget).
+        """
+        raw = self.job_budget_var.get().strip()
+        return int(raw) if raw.isdigit() and int(raw) > 0 else self.job_queue.budget
+
+    def _job_cost(self, concurrency):
+        """
+        Slots a job holds: its concurrent encodes ("auto" → half the budget).
+        """
+        if concurrency == "auto":
+            return max(1, self._job_budget() // 2)
+        return concurrency
+
+    def _submit_job(self, kind, label, func, priority, cost=1, outdir=None, timeout=None):
+        """
+        Queues func(log, cancel); its log goes to the log panel and the job
+        (progress and current step for the Jobs tab). Jobs writing to the
+        same outdir run one after another. timeout: wall-clock limit of
+        the whole job (seconds from its start).
+        """
+        self.job_queue.set_budget(self._job_budget())
+
+        def run(log, cancel):
+            def both(msg):
+                log(msg)
+                self._log_callback(msg)
+            return func(both, cancel)
+
+        key = os.path.normcase(str(Path(outdir).resolve())) if outdir else None
+        res = self.job_queue.submit(kind, run, priority, label, cost=cost, key=key, timeout=timeout)
+        if not res["ok"]:
+            messagebox.showerror("Error", f"{res['error']}: retry in about {res['data']['retry_after']}s.")
+            return None
+
+        self._push_status("info", f"Queued: {label}")
         self._update_buttons_state()
+        return res["data"]
+
+    def _active_jobs(self, kinds):
+        return [j for j in self.job_queue.jobs() if j.kind in kinds and j.state in (QUEUED, RUNNING)]
+
+    def _job_timeout(self):
+        """
+        Returns the per-job timeout in seconds (None = no limit),
+        or False after showing an error for invalid input.
+        """
+        raw = self.job_timeout_var.get().strip() or "0"
+        try:
+            value = float(raw)
+        except ValueError:
+            messagebox.showerror("Error", f"Invalid timeout: {raw}")
+            return False
+        return value if value > 0 else None
+
+    def _concurrency(self):
+        """
+        "auto" or a positive int (invalid input falls back to 1).
+        """
+        raw = self.concurrency_var.get().strip().lower()
+        if raw == "auto":
+            return "auto"
+        return int(raw) if raw.isdigit() and int(raw) > 0 else 1
+
+    def _on_cancel(self, kinds):
+        jobs = self._active_jobs(kinds)
+        for job in jobs:
+            self.job_queue.cancel(job.id)
+        if jobs:
+            self._push_status("info", f"Cancelling {len(jobs)} job(s)...")
+
+    def _on_close(self):
+        # stop running ffmpeg children so no encoder outlives the GUI
+        self.job_queue.close(cancel_running=True)
+        kill_all()
+        self.destroy()
 
     def _update_buttons_state(self):
         any_recipe_test = any(v.get() for v in self.test_recipe_vars.values())
-        if self.ffmpeg_ok and any_recipe_test and not self.busy:
+        if self.ffmpeg_ok and any_recipe_test:
             self.btn_run_test.config(state="normal")
         else:
             self.btn_run_test.config(state="disabled")
 
         has_files = self.apply_listbox.size() > 0
-        has_recipe_apply = bool(self.apply_recipe_var.get())
-        if self.ffmpeg_ok and has_files and has_recipe_apply and not self.busy:
+        has_recipe_apply = bool(self.apply_recipe_var.get()) or \
+            (self.apply_auto_var.get() and any_recipe_test)
+        if self.ffmpeg_ok and has_files and has_recipe_apply:
             self.btn_apply.config(state="normal")
         else:
             self.btn_apply.config(state="disabled")
 
+        self.btn_test_cancel.config(state="normal" if self._active_jobs(TEST_KINDS) else "disabled")
+        self.btn_apply_cancel.config(state="normal" if self._active_jobs(APPLY_KINDS) else "disabled")
+
     # ============================================================
     #  UTILITY
     # ============================================================